@@ -2,13 +2,16 @@ import sys
 import os
 import json
 import glob
+import asyncio
+import threading
+from datetime import datetime
 from fastapi import FastAPI, Request, HTTPException, Query, Path
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Literal, List
 from yourtube import Database, Video, Transcriber
 from yourtube.utils import (
     get_download_dir, 
@@ -20,8 +23,14 @@ from yourtube.utils import (
     get_uvicorn_log_config
 )
 from yourtube.monitor import YoutubeMonitor
-from yourtube.main import process_video_pipeline
+from yourtube.main import build_pipeline_stages
 from yourtube.async_worker import video_queue
+from yourtube.jobs import JobStore
+from yourtube.progress import progress_bus
+from yourtube.policy import TranscriptionPolicy
+from yourtube.repository import AsyncVideoRepository
+from yourtube.artifacts import ARTIFACT_NAMES, producer_version
+from yourtube.semantic import load_semantic_search
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -29,8 +38,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 logger = create_logger("API", log_path='logs/api.log')
 logger.info('API startup')
 
-video_queue.start_worker(process_video_pipeline, logger=logger) # Start the video processing worker
-
 # global variables setup: database, monitor, transcriber, config, video_queue
 DOWNLOAD_DIR = get_download_dir()
 DB_PATH = get_db_path()
@@ -38,9 +45,39 @@ logger.info(f"Download Directory: {DOWNLOAD_DIR}")
 logger.info(f"Database Path: {DB_PATH}")
 
 config = load_config() #check if config.json exists, if not create it from template
-db = Database(db_path=DB_PATH)
-monitor = YoutubeMonitor(config=config)
+# creates and migrates the schema, used by the worker and sync code
+db = Database(db_path=DB_PATH, store_blobs=(config or {}).get("storage", {}).get("compress_artifacts", False))
+repository = AsyncVideoRepository(db_path=DB_PATH)  # non-blocking queries for the endpoints
+monitor = YoutubeMonitor(config=config, database=db)
 transcriber = Transcriber(config=config)
+semantic_index, embedder = load_semantic_search(config)  # (None, None) unless semantic_search.enabled
+
+job_store = JobStore(db)
+if (config or {}).get("worker", {}).get("mode", "local") == "enqueue":
+    # standalone `yourtube-worker` processes drain the shared job queue, this process only enqueues and reports status
+    video_queue.attach(job_store, logger=logger)
+else:
+    # Whisper size per job under the current load, re-transcriptions are queued whenever the pipeline is idle
+    policy = TranscriptionPolicy(config, queue=video_queue, logger=create_logger("Policy", log_path='logs/policy.log'),
+                                 job_store=job_store)
+    # Start the video processing pipeline, resuming jobs left over from the last run
+    video_queue.start_worker(
+        stages=build_pipeline_stages(config),
+        logger=logger,
+        job_store=job_store,
+        context={'config': config, 'database': db, 'monitor': monitor, 'transcriber': transcriber, 'policy': policy,
+                 'semantic_index': semantic_index, 'embedder': embedder},
+        channel_weights=(config or {}).get("worker", {}).get("channel_weights"),
+        on_idle=policy.queue_upgrade
+    )
+    if (config or {}).get("transcribe", {}).get("warm_up", False):
+        # load Whisper in the background so the first video doesn't wait for it, see /ready
+        threading.Thread(
+            target=transcriber.warm_up,
+            args=((config or {}).get("transcribe", {}).get("size", "base"),),
+            name="warm-up",
+            daemon=True
+        ).start()
 
 
 # FastAPI app setup
@@ -55,6 +92,12 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+@app.middleware("http")
+async def database_session(request: Request, call_next):
+    """Give every request a database session of its own, closed once the response is ready"""
+    with db.request_session():
+        return await call_next(request)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="api/static"), name="static")
 
@@ -117,11 +160,14 @@ class ProcessVideoResponse(BaseModel):
 
 class VideoStatusResponse(BaseModel):
     status: str
+    stage: Optional[str] = None
+    position: Optional[int] = None
+    estimated_start: Optional[datetime] = None
     
     @classmethod
-    def from_status(cls, status):
-        """Create a VideoStatusResponse from a status string"""
-        return cls(status=status or 'unknown')
+    def from_status(cls, status, stage=None, position=None, estimated_start=None):
+        """Create a VideoStatusResponse from a status string, the current pipeline stage and the queue position"""
+        return cls(status=status or 'unknown', stage=stage, position=position, estimated_start=estimated_start)
 
 class DeleteVideoResponse(BaseModel):
     success: bool
@@ -131,12 +177,22 @@ class DeleteVideoResponse(BaseModel):
         """Create a DeleteVideoResponse from a success boolean"""
         return cls(success=success)
 
+class CancelVideoResponse(BaseModel):
+    success: bool
+    status: Optional[str] = None
+
+    @classmethod
+    def from_success(cls, success, status=None):
+        """Create a CancelVideoResponse from a success boolean and the resulting status"""
+        return cls(success=success, status=status)
+
 class ProcessVideoRequest(BaseModel):
     url: str
     force: bool = True
     transcribe: bool = True
     process: bool = True
     summarize: bool = True
+    priority: Literal["interactive", "scheduled", "backfill"] = "interactive"
 
 class NotesRequest(BaseModel):
     notes: str
@@ -145,6 +201,106 @@ class ContentSection(BaseModel):
     content: str = ""
     error: str = ""
 
+class VideoListItem(BaseModel):
+    video_id: str
+    title: str
+    channel: Optional[str] = None
+    channel_id: Optional[str] = None
+    upload_date: Optional[str] = None
+    process_date: Optional[str] = None
+    language: Optional[str] = None
+    transcript: Optional[bool] = False
+    summary: Optional[bool] = False
+
+class VideoPageResponse(BaseModel):
+    videos: List[VideoListItem]
+    next_cursor: Optional[str] = None
+
+    @classmethod
+    def from_page(cls, rows, next_cursor):
+        """Create a VideoPageResponse from the rows of a page of the video list"""
+        videos = [
+            VideoListItem(**{key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()})
+            for row in rows
+        ]
+        return cls(videos=videos, next_cursor=next_cursor)
+
+class SearchHit(BaseModel):
+    video_id: str
+    title: Optional[str] = None
+    kind: str
+    language: Optional[str] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    timestamp: Optional[str] = None
+    url: str
+    snippet: str
+    score: Optional[float] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHit]
+
+    @classmethod
+    def from_hits(cls, query, hits):
+        """Create a SearchResponse from search hits, with a link to the moment of each hit"""
+        results = []
+        for hit in hits:
+            start = int(hit['start']) if hit['start'] is not None else None
+            timestamp = f"{start // 3600:02d}:{start % 3600 // 60:02d}:{start % 60:02d}" if start is not None else None
+            url = f"https://www.youtube.com/watch?v={hit['video_id']}" + (f"&t={start}s" if start is not None else "")
+            results.append(SearchHit(**hit, timestamp=timestamp, url=url))
+        return cls(query=query, hits=results)
+
+class SemanticHit(BaseModel):
+    video_id: str
+    title: Optional[str] = None
+    language: Optional[str] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    timestamp: Optional[str] = None
+    url: str
+    text: str
+    score: float
+
+class SemanticSearchResponse(BaseModel):
+    query: str
+    hits: List[SemanticHit]
+
+    @classmethod
+    def from_hits(cls, query, hits):
+        """Create a SemanticSearchResponse from semantic search hits, with a link to the moment of each hit"""
+        results = []
+        for hit in hits:
+            start = int(hit['start']) if hit['start'] is not None else None
+            timestamp = f"{start // 3600:02d}:{start % 3600 // 60:02d}:{start % 60:02d}" if start is not None else None
+            url = f"https://www.youtube.com/watch?v={hit['video_id']}" + (f"&t={start}s" if start is not None else "")
+            results.append(SemanticHit(**hit, timestamp=timestamp, url=url))
+        return cls(query=query, hits=results)
+
+class ChannelStatsItem(BaseModel):
+    channel_id: str
+    channel: Optional[str] = None
+    video_count: int
+    transcribed_count: int
+    summarized_count: int
+    last_upload: Optional[str] = None
+    last_processed: Optional[str] = None
+    total_duration: float
+    pending_jobs: int
+
+class ChannelStatsResponse(BaseModel):
+    channels: List[ChannelStatsItem]
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Create a ChannelStatsResponse from rows of channel_stats"""
+        channels = [
+            ChannelStatsItem(**{key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()})
+            for row in rows
+        ]
+        return cls(channels=channels)
+
 class VideoContentResponse(BaseModel):
     transcript: ContentSection
     summary: ContentSection
@@ -188,59 +344,112 @@ def scan_downloads_folder(downloads_path):
     
     # Find all .info.json files in the downloads folder
     json_files = glob.glob(os.path.join(downloads_path, "*.info.json"))
-    
-    for json_file in json_files:
+    video_ids = [os.path.basename(json_file).replace('.info.json', '') for json_file in json_files]
+
+    # Check which videos are already in the database with one query
+    existing_ids = {video_id for (video_id,) in db.session.query(Video.video_id).filter(Video.video_id.in_(video_ids))}
+
+    videos = []
+    for json_file, video_id in zip(json_files, video_ids):
         try:
-            # Extract video_id from filename
-            video_id = os.path.basename(json_file).replace('.info.json', '')
-            
-            # Check if video exists in database
-            existing_video = db.get_video(video_id=video_id)
-            
-            if existing_video:
-                # Update existing video
-                video = monitor.download(video_id)
-                if video:
-                    db.update_video(video)
+            video = monitor.download(video_id)
+            if video:
+                # re-index the files of the video and take its flags from them
+                db.record_artifacts(video_id, video.language, ARTIFACT_NAMES, producer=producer_version("refresh"))
+                video.update(artifacts=db.get_artifacts(video_id))
+                videos.append(video)
+                if video_id in existing_ids:
                     stats['updated_videos'] += 1
-            else:
-                # Add new video
-                video = monitor.download(video_id)
-                if video:
-                    db.add_video(video)
+                else:
                     stats['new_videos'] += 1
                     
         except Exception as e:
             error_msg = f"Error processing {json_file}: {str(e)}"
             stats['errors'].append(error_msg)
             print(error_msg)
+
+    # Write the whole library in one transaction
+    try:
+        db.upsert_videos(videos)
+    except Exception as e:
+        stats['new_videos'] = stats['updated_videos'] = 0
+        stats['errors'].append(str(e))
+        print(e)
     
     return stats
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, sort: str = Query("process_date", description="Sort videos by process_date or upload_date")):
-    if sort == 'upload_date':
-        videos = db.session.query(Video).order_by(Video.upload_date.desc()).all()
-    else:  # processed_date
-        videos = db.session.query(Video).order_by(Video.process_date.desc()).all()
-    
-    return templates.TemplateResponse("index.html", {"request": request, "videos": videos})
+    # only the first page, the page loads the rest from /video-list as it scrolls
+    videos, next_cursor = await repository.list_page(sort=sort)
+
+    return templates.TemplateResponse("index.html", {"request": request, "videos": videos, "sort": sort, "next_cursor": next_cursor})
 
 @app.get("/videos", response_class=HTMLResponse)
 async def get_videos(request: Request, sort: str = Query("process_date", description="Sort videos by process_date or upload_date")):
-    if sort == 'upload_date':
-        videos = db.session.query(Video).order_by(Video.upload_date.desc()).all()
-    else:
-        videos = db.session.query(Video).order_by(Video.process_date.desc()).all()
-        
-    return templates.TemplateResponse("index.html", {"request": request, "videos": videos})
+    videos, next_cursor = await repository.list_page(sort=sort)
+
+    return templates.TemplateResponse("index.html", {"request": request, "videos": videos, "sort": sort, "next_cursor": next_cursor})
+
+@app.get("/video-list", response_model=VideoPageResponse)
+async def video_list(
+        sort: Literal["process_date", "upload_date"] = Query("process_date", description="Sort videos by process_date or upload_date, newest first"),
+        limit: int = Query(50, ge=1, le=200, description="Videos per page"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        channel_id: Optional[str] = Query(None, description="Only videos of this channel"),
+        language: Optional[str] = Query(None, description="Only videos in this language"),
+        status: Optional[Literal["summarized", "transcribed", "untranscribed"]] = Query(None, description="Only videos in this state")
+    ):
+    """One page of the video list with the columns the list shows, continued with `cursor`"""
+    try:
+        rows, next_cursor = await repository.list_page(
+            sort=sort, limit=limit, cursor=cursor, channel_id=channel_id, language=language, status=status
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return VideoPageResponse.from_page(rows, next_cursor)
+
+@app.get("/search", response_model=SearchResponse)
+async def search_library(
+        q: str = Query(..., min_length=1, description="Words or \"quoted phrases\" that must all appear"),
+        limit: int = Query(20, ge=1, le=100, description="Maximum number of hits"),
+        kind: Optional[List[Literal["transcript", "processed", "summary"]]] = Query(None, description="Only search these texts"),
+        video_id: Optional[str] = Query(None, description="Only search the texts of this video"),
+        language: Optional[str] = Query(None, description="Only search texts in this language")
+    ):
+    """Full-text search over transcripts, processed texts and summaries, best hits first"""
+    hits = await repository.search(q, limit=limit, kinds=kind, video_id=video_id, language=language)
+    return SearchResponse.from_hits(q, hits)
+
+@app.get("/semantic-search", response_model=SemanticSearchResponse)
+async def semantic_search(
+        q: str = Query(..., min_length=1, description="Question or description of what is said"),
+        limit: int = Query(10, ge=1, le=100, description="Maximum number of hits"),
+        nprobe: Optional[int] = Query(None, ge=1, description="Clusters to search, all vectors if not given")
+    ):
+    """Transcript windows closest in meaning to a query, best first"""
+    if semantic_index is None:
+        raise HTTPException(status_code=503, detail="Semantic search is not enabled, see semantic_search in config.json")
+    try:
+        vector = (await asyncio.to_thread(embedder.encode, [q]))[0]
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    nprobe = nprobe or (config or {}).get("semantic_search", {}).get("nprobe")
+    hits = await repository.semantic_search(semantic_index, vector, limit=limit, nprobe=nprobe)
+    return SemanticSearchResponse.from_hits(q, hits)
+
+@app.get("/channel-stats", response_model=ChannelStatsResponse)
+async def channel_stats(channel_id: Optional[str] = Query(None, description="Only this channel")):
+    """Video counts, latest dates, audio duration and pending jobs of every channel, newest upload first"""
+    return ChannelStatsResponse.from_rows(await repository.channel_stats(channel_id=channel_id))
 
 @app.get("/refresh-library", response_class=RedirectResponse)
 async def refresh_library():
     downloads_path = DOWNLOAD_DIR
     
     try:
-        stats = scan_downloads_folder(downloads_path)
+        # downloads and writes the whole library, off the event loop
+        stats = await asyncio.to_thread(scan_downloads_folder, downloads_path)
         
         # Create success message
         success_msg = f"Library refreshed! Found {stats['new_videos']} new videos, updated {stats['updated_videos']} existing videos."
@@ -263,7 +472,7 @@ async def refresh_library():
 @app.get("/video/{video_id}", response_model=VideoResponse)
 async def video_detail(video_id: str = Path(..., description="The ID of the video to retrieve")):
     """Get details for a specific video"""
-    video = db.get_video(video_id=video_id)
+    video = await repository.get_video(video_id=video_id)
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
@@ -273,7 +482,7 @@ async def video_detail(video_id: str = Path(..., description="The ID of the vide
 @app.get("/transcript/{video_id}", response_model=Dict[str, str])
 async def view_transcript(video_id: str = Path(..., description="The ID of the video to retrieve transcript for")):
     try:
-        video = db.get_video(video_id=video_id)
+        video = await repository.get_video(video_id=video_id)
         
         if not video:
             logger.error(f"Video not found in database: {video_id}")
@@ -283,22 +492,14 @@ async def view_transcript(video_id: str = Path(..., description="The ID of the v
             logger.error(f"Language not set for video: {video_id}")
             raise HTTPException(status_code=400, detail="Video language not set")
             
-        transcript_path = get_file_path(video_id, 'transcript', video.language)
-        logger.info(f"Checking transcript at path: {transcript_path}")
-        
-        if not transcript_path:
-            logger.error(f"Invalid transcript path for video: {video_id}")
-            return {"content": ""}  # Return empty content instead of error
-            
-        if not os.path.exists(transcript_path):
-            logger.error(f"Transcript file not found: {transcript_path}")
-            return {"content": ""}  # Return empty content instead of error
-        
         try:
-            with open(transcript_path, 'r', encoding='utf-8') as f:
-                transcript_text = f.read()
+            # stored copy in the database if there is one, else the file
+            transcript_text = await repository.read_artifact(video_id, 'transcript', video.language)
+            if transcript_text is None:
+                logger.error(f"Transcript not found for video: {video_id}")
+                return {"content": ""}  # Return empty content instead of error
             if not transcript_text.strip():
-                logger.error(f"Empty transcript file: {transcript_path}")
+                logger.error(f"Empty transcript for video: {video_id}")
                 return {"content": ""}  # Return empty content
             return {"content": transcript_text}
         except Exception as e:
@@ -311,7 +512,7 @@ async def view_transcript(video_id: str = Path(..., description="The ID of the v
 @app.get("/summary/{video_id}", response_model=Dict[str, str])
 async def view_summary(video_id: str = Path(..., description="The ID of the video to retrieve summary for")):
     try:
-        video = db.get_video(video_id=video_id)
+        video = await repository.get_video(video_id=video_id)
         
         if not video:
             logger.error(f"Video not found in database: {video_id}")
@@ -321,22 +522,13 @@ async def view_summary(video_id: str = Path(..., description="The ID of the vide
             logger.error(f"Language not set for video: {video_id}")
             raise HTTPException(status_code=400, detail="Video language not set")
             
-        summary_path = get_file_path(video_id, 'summary', video.language)
-        logger.info(f"Checking summary at path: {summary_path}")
-        
-        if not summary_path:
-            logger.error(f"Invalid summary path for video: {video_id}")
-            return {"content": ""}  # Return empty content instead of error
-            
-        if not os.path.exists(summary_path):
-            logger.error(f"Summary file not found: {summary_path}")
-            return {"content": ""}  # Return empty content instead of error
-        
         try:
-            with open(summary_path, 'r', encoding='utf-8') as f:
-                summary_text = f.read()
+            summary_text = await repository.read_artifact(video_id, 'summary', video.language)
+            if summary_text is None:
+                logger.error(f"Summary not found for video: {video_id}")
+                return {"content": ""}  # Return empty content instead of error
             if not summary_text.strip():
-                logger.error(f"Empty summary file: {summary_path}")
+                logger.error(f"Empty summary for video: {video_id}")
                 return {"content": ""}  # Return empty content
             return {"content": summary_text}
         except Exception as e:
@@ -360,7 +552,7 @@ async def save_notes(video_id: str = Path(..., description="The ID of the video
 async def test_paths(video_id: str = Path(..., description="The ID of the video to test paths for")):
     """Debug endpoint to check file paths"""
     try:
-        video = db.get_video(video_id=video_id)
+        video = await repository.get_video(video_id=video_id)
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
             
@@ -378,33 +570,27 @@ async def test_paths(video_id: str = Path(..., description="The ID of the video
 @app.get("/video-content/{video_id}", response_model=VideoContentResponse)
 async def video_content(video_id: str = Path(..., description="The ID of the video to retrieve content for")):
     try:
-        video = db.get_video(video_id=video_id)
+        video = await repository.get_video(video_id=video_id)
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
 
         # Get transcript
         transcript_text = ""
         transcript_error = ""
-        transcript_path = get_file_path(video_id, 'transcript', video.language)
-        if os.path.exists(transcript_path):
-            try:
-                with open(transcript_path, 'r', encoding='utf-8') as f:
-                    transcript_text = f.read()
-            except Exception as e:
-                logger.error(f"Error reading transcript: {str(e)}")
-                transcript_error = str(e)
+        try:
+            transcript_text = await repository.read_artifact(video_id, 'transcript', video.language) or ""
+        except Exception as e:
+            logger.error(f"Error reading transcript: {str(e)}")
+            transcript_error = str(e)
 
         # Get summary
         summary_text = ""
         summary_error = ""
-        summary_path = get_file_path(video_id, 'summary', video.language)
-        if os.path.exists(summary_path):
-            try:
-                with open(summary_path, 'r', encoding='utf-8') as f:
-                    summary_text = f.read()
-            except Exception as e:
-                logger.error(f"Error reading summary: {str(e)}")
-                summary_error = str(e)
+        try:
+            summary_text = await repository.read_artifact(video_id, 'summary', video.language) or ""
+        except Exception as e:
+            logger.error(f"Error reading summary: {str(e)}")
+            summary_error = str(e)
 
         return VideoContentResponse.from_content(
             transcript_text=transcript_text,
@@ -438,8 +624,8 @@ async def process_video(request: ProcessVideoRequest):
         if not video_id:
             raise HTTPException(status_code=400, detail="Invalid YouTube URL")
         
-        # Check if video is already in queue or being processed
-        status = video_queue.get_status(video_id)
+        # Check if video is already in queue or being processed, the queue reads the job store off the event loop
+        status = await asyncio.to_thread(video_queue.get_status, video_id)
         if status in ['queued', 'processing']:
             return ProcessVideoResponse.from_dict({
                 'success': True,
@@ -450,21 +636,34 @@ async def process_video(request: ProcessVideoRequest):
                 'upload_date': ''
             })
         
-        # Get basic video info before adding to queue
-        video_info = monitor.get_video_info(video_id)
+        # Turn new videos away while the backlog is over the configured limits
+        worker_config = (config or {}).get("worker", {})
+        retry_after = await asyncio.to_thread(
+            video_queue.check_admission,
+            max_queue_depth=worker_config.get("max_queue_depth"),
+            max_wait_seconds=worker_config.get("max_wait_seconds")
+        )
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many videos in the queue, please retry in {retry_after} seconds",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        # Get basic video info before adding to queue, off the event loop
+        video_info = await monitor.get_video_info_async(video_id)
         
-        # Add video to processing queue
-        video_queue.add_task(
-            config=config,
+        # Add video to processing queue, the shared config/database/monitor/transcriber come from the worker context
+        await asyncio.to_thread(
+            video_queue.add_task,
             url=url,
-            database=db,
-            monitor=monitor,
-            transcriber=transcriber,
             force=request.force,
             transcribe=request.transcribe,
             process=request.process,
             summarize=request.summarize,
             video_id=video_id,
+            priority=request.priority,
+            channel_id=video_info.get('channel_id'),
             is_last=False
         )
 
@@ -477,25 +676,91 @@ async def process_video(request: ProcessVideoRequest):
             'channel': video_info.get('channel', 'Loading...'),
             'upload_date': video_info.get('upload_date', '')
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/video-status/{video_id}", response_model=VideoStatusResponse)
 async def video_status(video_id: str = Path(..., description="The ID of the video to check status for")):
-    status = video_queue.get_status(video_id)
-    return VideoStatusResponse.from_status(status)
+    def read_status():
+        return VideoStatusResponse.from_status(
+            video_queue.get_status(video_id),
+            stage=video_queue.get_stage(video_id),
+            position=video_queue.get_position(video_id),
+            estimated_start=video_queue.get_estimated_start(video_id)
+        )
+    return await asyncio.to_thread(read_status)
+
+@app.post("/cancel-video/{video_id}", response_model=CancelVideoResponse)
+async def cancel_video(video_id: str = Path(..., description="The ID of the video to cancel")):
+    """Cancel a queued video, or stop a running one at the next safe point of its stage"""
+    success = await asyncio.to_thread(video_queue.cancel, video_id)
+    return CancelVideoResponse.from_success(success, status=await asyncio.to_thread(video_queue.get_status, video_id))
+
+@app.get("/ready")
+async def get_readiness():
+    """
+    Whether the API is ready to transcribe without delay: the model warm-up finished, or
+    there is none because it is disabled or because standalone workers do the processing.
+    Answers 503 while the model is still loading, with the warm-up state and timings.
+    """
+    status = dict(transcriber.warm_up_status)
+    warming_up = video_queue.running and (config or {}).get("transcribe", {}).get("warm_up", False)
+    ready = not warming_up or status['state'] == 'ready'
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={'ready': ready, 'model_loaded': transcriber.model is not None, 'warm_up': status}
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Per-stage metrics of the processing pipeline, including the tasks that overran their time budget"""
+    return {"stages": video_queue.get_metrics()}
+
+@app.get("/events")
+async def progress_events(request: Request):
+    """
+    Server-sent events with the status, stage and progress of every video being processed,
+    so the page follows all its pending videos over one connection instead of polling each.
+    """
+    async def stream():
+        # the stream outlives the session the middleware gave the request, it gets one of its own
+        with db.request_session():
+            queue = progress_bus.subscribe()
+            try:
+                while not await request.is_disconnected():
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=5)
+                    except asyncio.TimeoutError:
+                        if not video_queue.running:
+                            # standalone workers run in other processes, follow their jobs in the job store
+                            for state in progress_bus.snapshot():
+                                if state.get('status') not in ('queued', 'processing'):
+                                    continue
+                                status = await asyncio.to_thread(video_queue.get_status, state['video_id'])
+                                if status and status != state['status']:
+                                    progress_bus.publish(state['video_id'], status=status, stage=None)
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"data: {json.dumps(event)}\n\n"
+            finally:
+                progress_bus.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.delete("/delete-video/{video_id}", response_model=DeleteVideoResponse)
 async def delete_video(video_id: str = Path(..., description="The ID of the video to delete")):
     try:
-        # Use the database's delete_video method
-        success = db.delete_video(video_id=video_id)
+        success = await repository.delete_video(video_id)
         
         if success:
             return DeleteVideoResponse.from_success(True)
         else:
             raise HTTPException(status_code=404, detail="Video not found")
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -525,8 +790,9 @@ async def save_config(request: Request):
         # Validate JSON before saving
         try:
             new_config = json.loads(config_content)
-            # Update the global config variable
-            config = new_config
+            # Update the global config in place, so the worker, monitor and transcriber see it too
+            config.clear()
+            config.update(new_config)
         except json.JSONDecodeError as e:
             raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
         
@@ -543,7 +809,7 @@ async def save_config(request: Request):
 @app.get("/script/{video_id}", response_model=Dict[str, str])
 async def view_script(video_id: str = Path(..., description="The ID of the video to retrieve script for")):
     try:
-        video = db.get_video(video_id=video_id)
+        video = await repository.get_video(video_id=video_id)
         
         if not video:
             logger.error(f"Video not found in database: {video_id}")
@@ -553,19 +819,14 @@ async def view_script(video_id: str = Path(..., description="The ID of the video
             logger.error(f"Language not set for video: {video_id}")
             raise HTTPException(status_code=400, detail="Video language not set")
             
-        # Construct the path to the processed.txt file
-        script_path = os.path.join(DOWNLOAD_DIR, f"{video_id}.{video.language}.processed.txt")
-        logger.info(f"Checking script at path: {script_path}")
-        
-        if not os.path.exists(script_path):
-            logger.error(f"Script file not found: {script_path}")
-            return {"content": ""}  # Return empty content instead of error
-        
         try:
-            with open(script_path, 'r', encoding='utf-8') as f:
-                script_text = f.read()
+            # the processed.txt text
+            script_text = await repository.read_artifact(video_id, 'processed', video.language)
+            if script_text is None:
+                logger.error(f"Script not found for video: {video_id}")
+                return {"content": ""}  # Return empty content instead of error
             if not script_text.strip():
-                logger.error(f"Empty script file: {script_path}")
+                logger.error(f"Empty script for video: {video_id}")
                 return {"content": ""}  # Return empty content
             return {"content": script_text}
         except Exception as e:
@@ -591,6 +852,7 @@ def main():
         uvicorn.run(app, host="0.0.0.0", port=5001, reload=False, log_config=get_uvicorn_log_config())
     finally:
         video_queue.stop_worker()
+        asyncio.run(repository.dispose())
 
 if __name__ == '__main__':
     main()
@@ -268,6 +268,12 @@ async function processVideo() {
             })
         });
 
+        if (response.status === 429) {
+            // The queue is full, the server tells when to try again
+            const retryAfter = response.headers.get('Retry-After');
+            showFlashMessage(`The processing queue is full, please try again in ${retryAfter} seconds.`, 'warning');
+            return;
+        }
         if (!response.ok) {
             throw new Error(`Error processing video: ${response.status} ${response.statusText}`);
         }
@@ -288,8 +294,8 @@ async function processVideo() {
             };
             addProcessingVideo(videoId, url, videoInfo);
             
-            // Start polling for status updates
-            startStatusPolling(videoId);
+            // Follow status updates pushed by the server
+            watchVideoProgress(videoId);
             
             // Clear the input field
             urlInput.value = '';
@@ -342,6 +348,7 @@ function addProcessingVideo(videoId, url, videoInfo) {
                     </svg>
                     <span class="ml-2 text-blue-500">Processing</span>
                 </div>
+                <button class="cancel-button ml-2 text-gray-500 hover:text-red-600" title="Cancel" onclick="cancelVideo('${videoId}', event)">&times;</button>
             </div>
         </div>
     `;
@@ -351,7 +358,19 @@ function addProcessingVideo(videoId, url, videoInfo) {
     videoList.insertBefore(videoElement, videoList.firstChild);
 }
 
-function updateVideoStatus(videoId, status) {
+function formatProgress(event) {
+    // e.g. "transcribe 42%" or "process 3/7", falling back to the stage or status
+    const stage = event.stage || event.status;
+    if (event.unit === 'chunks') {
+        return `${stage} ${event.done}/${event.total}`;
+    }
+    if (event.percent !== undefined) {
+        return `${stage} ${Math.floor(event.percent)}%`;
+    }
+    return stage;
+}
+
+function updateVideoStatus(videoId, status, label = status) {
     const videoElement = document.querySelector(`[data-video-id="${videoId}"]`);
     if (!videoElement) return;
     
@@ -364,7 +383,10 @@ function updateVideoStatus(videoId, status) {
         
         // Refresh the page to show the completed video
         window.location.reload();
-    } else if (status === 'failed') {
+    } else if (status === 'cancelled') {
+        statusIndicator.innerHTML = `<span class="ml-2 text-gray-500">Cancelled</span>`;
+        videoElement.querySelector('.cancel-button')?.remove();
+    } else if (status === 'failed' || status === 'error') {
         statusIndicator.innerHTML = `
             <svg class="h-4 w-4 text-red-500" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                 <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 8v4m0 4h.01M21 12a9 9 0 11-18 0 9 9 0 0118 0z" />
@@ -377,35 +399,71 @@ function updateVideoStatus(videoId, status) {
                 <circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle>
                 <path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
             </svg>
-            <span class="ml-2 text-blue-500">${status}</span>
+            <span class="ml-2 text-blue-500">${label}</span>
         `;
     }
 }
 
-function startStatusPolling(videoId) {
-    // Poll for status updates every 5 seconds
-    const pollInterval = setInterval(async () => {
-        try {
-            const response = await fetch(`/video-status/${videoId}`);
-            
-            if (!response.ok) {
-                throw new Error(`Error checking status: ${response.status} ${response.statusText}`);
-            }
-            
-            const data = await response.json();
-            const status = data.status;
-            
-            updateVideoStatus(videoId, status);
-            
-            // Stop polling if processing is complete or failed
-            if (status === 'completed' || status === 'failed') {
-                clearInterval(pollInterval);
-            }
-        } catch (error) {
-            console.error('Error polling status:', error);
-            clearInterval(pollInterval);
+// One server-sent events connection carries the progress of every pending video
+let progressSource = null;
+const pendingVideos = new Set();
+const progressState = {};
+
+function watchVideoProgress(videoId) {
+    pendingVideos.add(videoId);
+    if (progressState[videoId]) {
+        handleProgressEvent(progressState[videoId]);
+    }
+    if (progressSource) return;
+
+    progressSource = new EventSource('/events');
+    progressSource.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        progressState[event.video_id] = event;
+        handleProgressEvent(event);
+    };
+    progressSource.onerror = (error) => {
+        // EventSource reconnects by itself and receives the latest state again
+        console.error('Error receiving progress events:', error);
+    };
+}
+
+function handleProgressEvent(event) {
+    const videoId = event.video_id;
+    if (!pendingVideos.has(videoId)) return;
+
+    updateVideoStatus(videoId, event.status, formatProgress(event));
+
+    // Stop listening once no video is pending anymore
+    if (event.status === 'completed' || event.status === 'error' || event.status === 'cancelled') {
+        pendingVideos.delete(videoId);
+        if (pendingVideos.size === 0 && progressSource) {
+            progressSource.close();
+            progressSource = null;
         }
-    }, 5000);
+    }
+}
+
+async function cancelVideo(videoId, event) {
+    // Stop event propagation to prevent video selection
+    event.stopPropagation();
+
+    try {
+        const response = await fetch(`/cancel-video/${videoId}`, { method: 'POST' });
+
+        if (!response.ok) {
+            throw new Error(`Error cancelling video: ${response.status} ${response.statusText}`);
+        }
+
+        const data = await response.json();
+        if (!data.success) {
+            showFlashMessage('The video is no longer queued or processing', 'warning');
+        }
+        // The final 'cancelled' status arrives as a progress event
+    } catch (error) {
+        console.error('Error cancelling video:', error);
+        showFlashMessage('Error cancelling video: ' + error.message, 'error');
+    }
 }
 
 async function deleteVideo(videoId, event) {
@@ -458,19 +516,97 @@ async function deleteVideo(videoId, event) {
     }
 }
 
+// Video list pages: the first one is rendered with the page, the next ones are fetched as JSON
+let loadingVideoPage = false;
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
+}
+
+function renderVideoItem(video) {
+    const videoElement = document.createElement('div');
+    videoElement.className = 'bg-gray-200 rounded-lg shadow p-2 hover:bg-gray-200 cursor-pointer transition-colors';
+    videoElement.setAttribute('data-video-id', video.video_id);
+    videoElement.addEventListener('click', () => selectVideo(video.video_id));
+
+    const uploadDate = video.upload_date ? video.upload_date.split('T')[0] : 'N/A';
+    const videoId = escapeHtml(video.video_id);
+    videoElement.innerHTML = `
+        <div class="flex flex-col gap-1">
+            <div class="text-base font-semibold hover:text-blue-600">
+                <a href="https://www.youtube.com/watch?v=${videoId}" target="_blank">${escapeHtml(video.title)}</a>
+            </div>
+            <div class="flex items-center text-sm text-gray-600">
+                <div class="flex-1">
+                    ${escapeHtml(video.channel)} &nbsp;|&nbsp; ${uploadDate}
+                </div>
+                <button class="delete-button text-red-500 hover:text-red-600 flex items-center ml-4">
+                    <svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" 
+                            d="M19 7l-.867 12.142A2 2 0 0116.138 21H7.862a2 2 0 01-1.995-1.858L5 7m5 4v6m4-6v6m1-10V4a1 1 0 00-1-1h-4a1 1 0 00-1 1v3M4 7h16" />
+                    </svg>
+                </button>
+            </div>
+        </div>
+    `;
+    videoElement.querySelector('.delete-button').addEventListener('click', (event) => deleteVideo(video.video_id, event));
+    return videoElement;
+}
+
+async function loadVideoPage() {
+    const videoList = document.querySelector('.video-list-content');
+    const cursor = videoList.dataset.nextCursor;
+    // an empty cursor means the last page is already shown
+    if (loadingVideoPage || !cursor) return;
+
+    loadingVideoPage = true;
+    try {
+        const params = new URLSearchParams({ sort: videoList.dataset.sort || 'process_date', cursor });
+        const response = await fetch(`/video-list?${params}`);
+
+        if (!response.ok) {
+            throw new Error(`Error loading videos: ${response.status} ${response.statusText}`);
+        }
+
+        const page = await response.json();
+        // the sort may have changed while the page was on its way
+        if (videoList.dataset.nextCursor !== cursor) return;
+
+        const sentinel = document.getElementById('video-list-sentinel');
+        page.videos.forEach(video => videoList.insertBefore(renderVideoItem(video), sentinel));
+        videoList.dataset.nextCursor = page.next_cursor || '';
+
+        if (currentVideoId) {
+            highlightSelectedVideo(currentVideoId);
+        }
+    } catch (error) {
+        console.error('Error loading videos:', error);
+        showFlashMessage('Error loading videos: ' + error.message, 'error');
+    } finally {
+        loadingVideoPage = false;
+    }
+}
+
 async function changeSort(sortBy) {
     try {
-        const response = await fetch(`/videos?sort=${sortBy}`);
+        const response = await fetch(`/video-list?sort=${encodeURIComponent(sortBy)}`);
         
         if (!response.ok) {
             throw new Error(`Error changing sort: ${response.status} ${response.statusText}`);
         }
         
-        const html = await response.text();
+        const page = await response.json();
         
-        // Update the video list content
+        // Replace the video list content with the first page in the new order
         const videoList = document.querySelector('.video-list-content');
-        videoList.innerHTML = html;
+        const sentinel = document.getElementById('video-list-sentinel');
+        videoList.querySelectorAll(':scope > div[data-video-id]').forEach(el => el.remove());
+        page.videos.forEach(video => videoList.insertBefore(renderVideoItem(video), sentinel));
+        videoList.dataset.sort = sortBy;
+        videoList.dataset.nextCursor = page.next_cursor || '';
+        videoList.scrollTop = 0;
         
         // Re-highlight the selected video if any
         if (currentVideoId) {
@@ -560,6 +696,17 @@ document.addEventListener('DOMContentLoaded', function() {
         chatToggleButton.addEventListener('click', toggleChat);
     }
 
+    // Load the next page of the video list when its end scrolls into view
+    const sentinel = document.getElementById('video-list-sentinel');
+    if (sentinel && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadVideoPage();
+            }
+        }, { root: document.querySelector('.video-list-content'), rootMargin: '200px' });
+        observer.observe(sentinel);
+    }
+
     // Add event listener for Enter key on URL input
     const urlInput = document.getElementById('youtube-url-input');
     if (urlInput) {
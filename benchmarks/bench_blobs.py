@@ -0,0 +1,69 @@
+"""Read latency and size of transcripts stored as files against zstd blobs in the database.
+
+Writes synthetic SRT transcripts to a download directory, stores them with
+`python -m yourtube.blobs`'s migration, then reads random transcripts back both ways.
+
+    python -m benchmarks.bench_blobs --videos 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from unittest import mock
+from yourtube import Database
+from yourtube.blobs import migrate_directory
+
+
+def srt(rng, cues=400):
+    """An SRT file with `cues` cues of common words"""
+    words = ["the", "model", "video", "we", "and", "data", "is", "going", "to", "train", "this", "so", "of", "a"]
+    return "\n".join(
+        f"{i}\n00:{i // 60 % 60:02d}:{i % 60:02d},000 --> 00:{(i + 1) // 60 % 60:02d}:{(i + 1) % 60:02d},000\n"
+        + " ".join(rng.choice(words) for _ in range(12)) + "\n"
+        for i in range(1, cues + 1)
+    )
+
+
+def timed(func, repeat):
+    """Median latency of `func` over `repeat` runs, in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)[len(durations) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=2000, help="Number of transcripts.")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory, \
+            mock.patch("yourtube.database.get_download_dir", lambda: directory), \
+            mock.patch("yourtube.blobs.get_download_dir", lambda: directory):
+        db = Database(db_path=os.path.join(directory, "videos.db"))
+        for n in range(args.videos):
+            with open(os.path.join(directory, f"v{n:06d}.en.srt"), 'w') as f:
+                f.write(srt(rng))
+            db.record_artifacts(f"v{n:06d}", "en", ["transcript"])
+
+        started = time.perf_counter()
+        stats = migrate_directory(db)
+        print(f"Stored in {time.perf_counter() - started:.1f}s, {stats['bytes'] / 2 ** 20:.1f} MiB "
+              f"in {stats['compressed'] / 2 ** 20:.1f} MiB ({stats['bytes'] / stats['compressed']:.1f}x)")
+
+        ids = iter([f"v{rng.randrange(args.videos):06d}" for _ in range(2000)])
+
+        def read_file():
+            with open(os.path.join(directory, f"{next(ids)}.en.srt"), 'r', encoding='utf-8') as f:
+                return f.read()
+
+        print(f"{'file read':<20}{timed(read_file, 500):>8.3f} ms")
+        print(f"{'blob lookup':<20}{timed(lambda: db.read_artifact(next(ids), 'transcript', 'en'), 500):>8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Lookup and listing latency of the videos table with and without the schema indexes.
+
+Builds a library of synthetic videos, measures the queries the API and pipeline run on
+it with the indexes dropped (the schema before versioning), then recreates the indexes
+of the current schema and measures again.
+
+    python -m benchmarks.bench_database --rows 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import insert, text
+from yourtube import Database, Video
+from yourtube.repository import AsyncVideoRepository, encode_cursor
+
+
+def fill(db, rows, channels=200):
+    """Insert `rows` synthetic videos spread over `channels` channels"""
+    start = datetime(2015, 1, 1)
+    batch = []
+    for n in range(rows):
+        batch.append({
+            'id': uuid4(),
+            'video_id': f"v{n:010d}",
+            'title': f"Video {n}",
+            'channel_id': f"UC{n % channels:08d}",
+            'channel': f"Channel {n % channels}",
+            'upload_date': start + timedelta(minutes=random.randrange(5_000_000)),
+            'process_date': start + timedelta(minutes=random.randrange(5_000_000)),
+            'language': "en",
+            'transcript': True,
+            'fulltext': True,
+            'summary': True
+        })
+        if len(batch) == 10_000:
+            db.session.execute(insert(Video), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Video), batch)
+    db.session.commit()
+
+
+def timed(func, repeat):
+    """Median latency of `func` over `repeat` runs, in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)[len(durations) // 2] * 1000
+
+
+def measure(db, rows):
+    ids = [f"v{random.randrange(rows):010d}" for _ in range(200)]
+    lookups = iter(ids * 10)
+    session = db.session
+    # the page 1000 pages deep, reached by OFFSET and by the cursor of the page before it
+    deep = session.query(Video.process_date, Video.video_id).order_by(Video.process_date.desc(), Video.video_id.desc()) \
+        .offset(50 * 1000 - 1).first()
+    keyset_page = AsyncVideoRepository.page_query(cursor=encode_cursor(*deep))
+    return {
+        'get_video(video_id)': timed(lambda: db.get_video(video_id=next(lookups)), len(ids)),
+        'newest 50 by upload_date': timed(lambda: session.query(Video).order_by(Video.upload_date.desc()).limit(50).all(), 20),
+        'newest 50 by process_date': timed(lambda: session.query(Video).order_by(Video.process_date.desc()).limit(50).all(), 20),
+        'newest 50 of a channel': timed(lambda: session.query(Video).filter(Video.channel_id == "UC00000042")
+                                        .order_by(Video.upload_date.desc()).limit(50).all(), 20),
+        'page 1000, OFFSET': timed(lambda: session.query(*AsyncVideoRepository.LIST_COLUMNS)
+                                   .order_by(Video.process_date.desc(), Video.video_id.desc())
+                                   .offset(50 * 1000).limit(50).all(), 20),
+        'page 1000, keyset cursor': timed(lambda: session.execute(keyset_page).all(), 20),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of videos in the library.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(db_path=os.path.join(directory, "videos.db"))
+        started = time.perf_counter()
+        fill(db, args.rows)
+        print(f"Inserted {args.rows} videos in {time.perf_counter() - started:.1f}s")
+
+        with db.engine.begin() as connection:
+            for index in Video.__table__.indexes:
+                connection.execute(text(f"DROP INDEX {index.name}"))
+        db.session.expire_all()
+        before = measure(db, args.rows)
+
+        started = time.perf_counter()
+        for index in Video.__table__.indexes:
+            index.create(db.engine)
+        print(f"Indexed in {time.perf_counter() - started:.1f}s")
+        db.session.expire_all()
+        after = measure(db, args.rows)
+
+    print(f"\n{'query':<28}{'no indexes':>14}{'indexed':>12}")
+    for name in before:
+        print(f"{name:<28}{before[name]:>11.2f} ms{after[name]:>9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Latency of full-text searches over a library of synthetic transcripts.
+
+Builds a library of videos with a transcript each, indexed the way the pipeline indexes
+them (windows of SRT cues in `search_documents`, trigram FTS5 in `search_index`), and
+measures searches for rare and common words, phrases, Chinese text and two-character
+terms that fall back to a scan. Each search also stands for the LIKE scan it replaces.
+
+    python -m benchmarks.bench_search --videos 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import text
+from yourtube import Database
+from yourtube.search import search
+
+_letters = random.Random(0)
+# pseudo-words of random letters, the first 500 are the common ones
+WORDS = [''.join(_letters.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(_letters.randint(3, 9))) for _ in range(5000)] \
+    + ["sourdough", "fermentation", "neural", "network", "gradient"]
+HANZI = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可也你"
+
+
+def fill(db, videos, windows, rng):
+    """Insert `windows` transcript windows of 30 seconds for each of `videos` videos"""
+    statement = text("""
+        INSERT INTO search_documents (path, video_id, kind, language, start_time, end_time, text)
+        VALUES (:path, :video_id, 'transcript', :language, :start_time, :end_time, :text)
+    """)
+    with db.engine.begin() as connection:
+        batch = []
+        for n in range(videos):
+            video_id, chinese = f"v{n:010d}", n % 10 == 0
+            for w in range(windows):
+                if chinese:
+                    window_text = ''.join(rng.choice(HANZI) for _ in range(120))
+                else:
+                    window_text = ' '.join(rng.choice(WORDS) if rng.random() < 0.02 else rng.choice(WORDS[:500]) for _ in range(80))
+                batch.append({'path': f"{video_id}.{'zh' if chinese else 'en'}.srt", 'video_id': video_id,
+                              'language': 'zh' if chinese else 'en', 'start_time': w * 30.0, 'end_time': w * 30.0 + 30,
+                              'text': window_text})
+            if len(batch) >= 20_000:
+                connection.execute(statement, batch)
+                batch = []
+        if batch:
+            connection.execute(statement, batch)
+
+
+def timed(func, repeat):
+    """Median latency of `func` over `repeat` runs, in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)[len(durations) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=50_000, help="Number of transcripts in the library.")
+    parser.add_argument("--windows", type=int, default=20, help="30 second windows per transcript.")
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(db_path=os.path.join(directory, "videos.db"))
+        started = time.perf_counter()
+        fill(db, args.videos, args.windows, rng)
+        print(f"Indexed {args.videos * args.windows} windows of {args.videos} transcripts "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        queries = {
+            'rare word': "sourdough",
+            'two rare words': "neural network",
+            'common word': WORDS[42],
+            'phrase': f'"{WORDS[1]} {WORDS[2]}"',
+            'chinese, 3+ characters': HANZI[3:6],
+            'chinese, 2 characters (scan)': HANZI[3:5],
+        }
+        with db.engine.connect() as connection:
+            print(f"\n{'query':<32}{'FTS5 top 20':>14}{'LIKE scan':>14}")
+            for name, query in queries.items():
+                fts = timed(lambda: search(connection, query, limit=20), 10)
+                like = timed(lambda: connection.execute(
+                    text("SELECT id FROM search_documents WHERE text LIKE :pattern LIMIT 20"),
+                    {'pattern': f"%{query.strip(chr(34))}%"}
+                ).all(), 3)
+                print(f"{name:<32}{fts:>11.2f} ms{like:>11.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Latency of semantic searches over a memory-mapped float16 matrix of embeddings.
+
+Writes synthetic unit vectors, grouped around random topics like real transcript windows,
+into a `SemanticIndex` and measures the brute-force search against the search that only
+scores the rows of the clusters closest to the query, with the recall of the latter.
+
+    python -m benchmarks.bench_semantic --rows 200000 --dim 384
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from yourtube.semantic import SemanticIndex
+
+
+def timed(func, repeat):
+    """Median latency of `func` over `repeat` runs, in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)[len(durations) // 2] * 1000
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="Number of transcript windows.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension.")
+    parser.add_argument("--topics", type=int, default=500, help="Number of topics the windows are about.")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SemanticIndex(directory)
+        topics = unit(rng.standard_normal((args.topics, args.dim)).astype(np.float32))
+        with open(index.vectors_path, 'wb') as f:
+            for start in range(0, args.rows, 50_000):
+                n = min(50_000, args.rows - start)
+                noise = rng.standard_normal((n, args.dim)).astype(np.float32) * 0.05
+                unit(topics[rng.integers(args.topics, size=n)] + noise).astype(np.float16).tofile(f)
+        with open(index.meta_path, 'w') as f:
+            json.dump({'model': 'synthetic', 'dim': args.dim}, f)
+        print(f"{args.rows} vectors of {args.dim} float16, {os.path.getsize(index.vectors_path) / 2 ** 20:.0f} MiB")
+
+        queries = unit(topics[rng.integers(args.topics, size=20)] + rng.standard_normal((20, args.dim)).astype(np.float32) * 0.05)
+        exact = [set(index.nearest(query, k=10)[0]) for query in queries]
+        queries_iter = iter(np.tile(queries, (10, 1)))
+        print(f"\n{'search':<28}{'latency':>12}{'recall@10':>12}")
+        print(f"{'brute force':<28}{timed(lambda: index.nearest(next(queries_iter), k=10), 20):>9.2f} ms{1.0:>12.2f}")
+
+        started = time.perf_counter()
+        clusters = index.build_clusters()
+        print(f"{'(built ' + str(clusters) + ' clusters in':<28}{time.perf_counter() - started:>9.2f} s)")
+        for nprobe in (4, 16, 64):
+            recall = np.mean([len(set(index.nearest(query, k=10, nprobe=nprobe)[0]) & truth) / 10
+                              for query, truth in zip(queries, exact)])
+            queries_iter = iter(np.tile(queries, (10, 1)))
+            latency = timed(lambda: index.nearest(next(queries_iter), k=10, nprobe=nprobe), 20)
+            print(f"{f'clusters, nprobe={nprobe}':<28}{latency:>9.2f} ms{recall:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
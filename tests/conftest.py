@@ -0,0 +1,27 @@
+import shutil
+import sys
+import pytest
+import yourtube.utils
+
+
+@pytest.fixture(autouse=True)
+def isolated_paths(tmp_path_factory, monkeypatch):
+    """
+    Keep the download directory, the database, config.json and logs/ of every test in a
+    temporary directory, so nothing a test imports or runs writes into the source tree.
+    Tests that need a download directory of their own patch `get_download_dir` again.
+    """
+    home = tmp_path_factory.mktemp("yourtube")
+    downloads = home / "downloads"
+    downloads.mkdir()
+    config_path = str(home / "config.json")
+    shutil.copy(yourtube.utils.get_config_path() + ".template", config_path + ".template")
+    # modules import the helpers by name, patch every copy
+    for name, module in list(sys.modules.items()):
+        if name == "yourtube" or name.startswith("yourtube."):
+            if hasattr(module, "get_download_dir"):
+                monkeypatch.setattr(module, "get_download_dir", lambda path="downloads/": str(downloads))
+            if hasattr(module, "get_config_path"):
+                monkeypatch.setattr(module, "get_config_path", lambda: config_path)
+    monkeypatch.chdir(home)  # create_logger writes to a relative logs/
+    return home
@@ -0,0 +1,64 @@
+import os
+import time
+from yourtube import Database, Video
+from yourtube import artifacts
+from yourtube.artifacts import classify_artifact, artifact_name
+
+
+def test_artifact_names_round_trip():
+    assert classify_artifact("abc.info.json") == ("abc", "info", None)
+    assert classify_artifact("abc.mp4") == ("abc", "media", None)
+    assert classify_artifact("abc.zh.processed.txt") == ("abc", "processed", "zh")
+    assert classify_artifact("abc.en.srt") == ("abc", "transcript", "en")
+    assert classify_artifact("abc.webm.part") == ("abc", "other", None)
+    assert artifact_name("abc", "summary", "en") == "abc.en.md"
+
+
+def test_flags_and_deletion_follow_recorded_artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr("yourtube.database.get_download_dir", lambda: str(tmp_path))
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    (tmp_path / "abc.en.srt").write_text("subtitles")
+    (tmp_path / "abc.mp4").write_bytes(b"media")
+    (tmp_path / "unrelated.en.srt").write_text("another video")
+
+    assert db.record_artifacts("abc", "en", ["transcript", "media", "summary"], producer="whisper-tiny@dev") == 2
+    transcript = db.get_artifacts("abc", kind="transcript")[0]
+    assert (transcript.path, transcript.size, transcript.producer) == ("abc.en.srt", 9, "whisper-tiny@dev")
+    assert len(transcript.checksum) == 64
+    assert db.get_artifacts("abc", kind="media")[0].checksum is None
+
+    # files a step removed are forgotten
+    (tmp_path / "abc.mp4").unlink()
+    db.record_artifacts("abc", "en", ["media"])
+    assert [artifact.kind for artifact in db.get_artifacts("abc")] == ["transcript"]
+
+    video = Video(video_id="abc", title="A video", language="en")
+    video.update(artifacts=db.get_artifacts("abc"))
+    assert (video.transcript, video.fulltext, video.summary) == (True, False, False)
+
+    db.update_video(video)
+    assert db.delete_video(video_id="abc")
+    assert not (tmp_path / "abc.en.srt").exists()
+    assert (tmp_path / "unrelated.en.srt").exists()
+    assert db.get_artifacts("abc") == []
+
+
+def test_only_new_or_changed_files_are_hashed(tmp_path, monkeypatch):
+    monkeypatch.setattr("yourtube.database.get_download_dir", lambda: str(tmp_path))
+    hashed = []
+    file_checksum = artifacts.file_checksum
+    monkeypatch.setattr(artifacts, "file_checksum", lambda path: hashed.append(path.rsplit("/", 1)[-1]) or file_checksum(path))
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    (tmp_path / "abc.en.srt").write_text("subtitles")
+    (tmp_path / "abc.wav").write_bytes(b"audio")
+    os.utime(tmp_path / "abc.en.srt", (time.time() - 60, time.time() - 60))  # written well before it is recorded
+
+    db.record_artifacts("abc", "en", ["transcript", "audio"])
+    first = db.get_artifacts("abc", kind="transcript")[0].checksum
+    db.record_artifacts("abc", "en", ["transcript", "audio"])
+    assert hashed == ["abc.en.srt"]
+
+    (tmp_path / "abc.en.srt").write_text("Subtitles")  # same size, newer content
+    db.record_artifacts("abc", "en", ["transcript"])
+    assert hashed == ["abc.en.srt", "abc.en.srt"]
+    assert db.get_artifacts("abc", kind="transcript")[0].checksum != first
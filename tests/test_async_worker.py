@@ -0,0 +1,415 @@
+import threading
+from datetime import datetime
+import time
+import pytest
+from yourtube.async_worker import VideoProcessingQueue, Stage, StageQueue, PRIORITY_SCHEDULED, PRIORITY_BACKFILL, stage_deadline
+
+
+def wait_for(condition, timeout=5):
+    """Wait until `condition()` is true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def video_queue():
+    queue = VideoProcessingQueue()
+    yield queue
+    queue.stop_worker()
+
+
+def test_stages_overlap(video_queue):
+    """Video N+1 is downloaded while video N is transcribed"""
+    events = []
+    lock = threading.Lock()
+
+    def record(name, duration):
+        def stage(task):
+            with lock:
+                events.append((name, task['video_id'], 'start'))
+            time.sleep(duration)
+            with lock:
+                events.append((name, task['video_id'], 'end'))
+        return stage
+
+    video_queue.start_worker(stages=[
+        Stage("download", record("download", 0.05)),
+        Stage("transcribe", record("transcribe", 0.3), maxsize=1),
+    ])
+    for video_id in ["a", "b"]:
+        video_queue.add_task(video_id=video_id)
+
+    wait_for(lambda: video_queue.get_status("b") == 'completed')
+    # b is downloaded before a finished transcribing
+    assert events.index(("download", "b", "end")) < events.index(("transcribe", "a", "end"))
+    assert video_queue.get_status("a") == 'completed'
+    assert video_queue.get_processing_count() == 0
+
+
+def test_failed_or_skipped_tasks_leave_the_pipeline(video_queue):
+    """A raising stage marks the video as error, a stage returning False ends the task early"""
+    later = []
+
+    def first(task):
+        if task['video_id'] == 'bad':
+            raise RuntimeError("boom")
+        return task['video_id'] != 'skip'
+
+    video_queue.start_worker(stages=[Stage("first", first), Stage("later", lambda task: later.append(task['video_id']))])
+    for video_id in ["bad", "skip", "good"]:
+        video_queue.add_task(video_id=video_id)
+
+    wait_for(lambda: video_queue.get_status("good") == 'completed')
+    assert video_queue.get_status("bad") == 'error'
+    assert video_queue.get_status("skip") == 'completed'
+    assert later == ["good"]
+
+
+@pytest.fixture
+def job_store(tmp_path):
+    from yourtube import Database
+    from yourtube.jobs import JobStore
+    return JobStore(Database(db_path=str(tmp_path / "videos.db")), lease_seconds=1)
+
+
+def test_jobs_resume_after_last_completed_stage(video_queue, job_store):
+    """A restarted worker picks queued and orphaned jobs up where the previous process left them"""
+    from datetime import datetime, timedelta
+    from yourtube.database import Job
+
+    # left over by a previous process: one job never started, one died after its first stage
+    queued_id = job_store.enqueue("queued", {'force': True})
+    orphan_id = job_store.enqueue("orphan", {'force': True})
+    job_store.claim(orphan_id)
+    job_store.complete_stage(orphan_id, "first", {'force': True, 'video_info': {'title': 'Some title'}})
+    with job_store._Session() as session, session.begin():
+        session.get(Job, orphan_id).lease_expires = datetime.now() - timedelta(seconds=1)
+
+    calls = []
+    def first(task):
+        calls.append(("first", task['video_id']))
+        task['video_info'] = {'title': task['video_id']}
+    def second(task):
+        calls.append(("second", task['video_id'], task['video_info']['title'], task['shared']))
+
+    video_queue.start_worker(stages=[Stage("first", first), Stage("second", second)], job_store=job_store, context={'shared': 'context'})
+    wait_for(lambda: video_queue.get_status("queued") == 'completed' and video_queue.get_status("orphan") == 'completed')
+
+    assert ("first", "orphan") not in calls
+    assert ("second", "orphan", "Some title", "context") in calls
+    assert ("second", "queued", "queued", "context") in calls
+    assert job_store.get_job("orphan").attempts == 2
+    assert job_store.get_job("queued").attempts == 1
+
+
+def test_status_comes_from_job_rows(video_queue, job_store):
+    """With a job store, statuses are read back from the jobs table"""
+    release = threading.Event()
+    video_queue.start_worker(stages=[Stage("only", lambda task: release.wait(5))], job_store=job_store)
+    assert video_queue.add_task(video_id="abc", force=True)
+    assert not video_queue.add_task(video_id="abc", force=True)
+    wait_for(lambda: job_store.get_status("abc") == 'processing')
+    assert job_store.get_job("abc").state == {'video_id': 'abc', 'force': True, 'is_last': True, 'priority': 0}
+    release.set()
+    wait_for(lambda: video_queue.get_status("abc") == 'completed')
+
+
+def test_tasks_added_to_a_pulling_worker_run_once(video_queue, job_store):
+    """A pulling worker only enqueues its own tasks and runs them once it claims them like any other job"""
+    processed = []
+    video_queue.start_worker(stages=[Stage("only", lambda task: processed.append(task['video_id']))],
+                             job_store=job_store, pull=True, poll_interval=0.05)
+    assert video_queue.add_task(video_id="up", upgrade=True)
+    wait_for(lambda: job_store.get_status("up") == 'completed')
+    time.sleep(0.3)  # a second claim of the job would run it again
+    assert processed == ["up"]
+    assert job_store.get_job("up").attempts == 1
+
+
+def test_idle_workers_wake_up_and_stop_immediately():
+    """Tasks are picked up without polling delay and idle workers exit on the STOP sentinel"""
+    video_queue = VideoProcessingQueue()
+    started = []
+    video_queue.start_worker(stages=[Stage("first", lambda task: started.append(time.monotonic()), workers=2)])
+    time.sleep(0.2)  # let the workers go idle
+
+    added = time.monotonic()
+    video_queue.add_task(video_id="abc")
+    wait_for(lambda: started)
+    assert started[0] - added < 0.1
+    assert "abc" not in video_queue.queued_tasks
+
+    stop = time.monotonic()
+    video_queue.stop_worker()
+    assert time.monotonic() - stop < 0.5
+    assert not any(thread.is_alive() for thread in video_queue.stages[0].threads)
+
+
+def test_priorities_and_fair_share_between_channels():
+    """Higher priorities go first; within a level channels take turns in proportion to their weight"""
+    queue = StageQueue(weights={"big": 2})
+    for i in range(4):
+        queue.put({'video_id': f"back{i}", 'channel_id': "back", 'priority': PRIORITY_BACKFILL})
+    for i in range(4):
+        queue.put({'video_id': f"big{i}", 'channel_id': "big", 'priority': PRIORITY_SCHEDULED})
+    for i in range(2):
+        queue.put({'video_id': f"small{i}", 'channel_id': "small", 'priority': PRIORITY_SCHEDULED})
+    queue.put({'video_id': "api"})
+
+    assert queue.position("api") == 0
+    assert queue.position("back0") == 7
+    order = [queue.get()['video_id'] for _ in range(queue.qsize())]
+    assert order == ["api", "big0", "big1", "small0", "big2", "big3", "small1", "back0", "back1", "back2", "back3"]
+    assert queue.position("api") is None
+
+
+def test_full_stage_queue_honors_block_and_timeout():
+    """A full bounded queue raises queue.Full instead of blocking when asked not to wait"""
+    import queue as queue_module
+    queue = StageQueue(maxsize=1)
+    assert queue.put({'video_id': "first"})
+    with pytest.raises(queue_module.Full):
+        queue.put_nowait({'video_id': "second"})
+    started = time.monotonic()
+    with pytest.raises(queue_module.Full):
+        queue.put({'video_id': "second"}, timeout=0.05)
+    assert 0.04 < time.monotonic() - started < 1
+    queue.stop()
+    assert queue.put({'video_id': "second"}, block=False) is False
+
+
+def test_estimated_start_follows_the_slowest_stage(video_queue):
+    """The estimated start of a queued video is its position times the bottleneck's time per video"""
+    release = threading.Event()
+    video_queue.start_worker(stages=[Stage("only", lambda task: release.wait(5))])
+    video_queue.stages[0].avg_duration = 10
+    for video_id in ("first", "second", "third"):
+        video_queue.add_task(video_id=video_id)
+    wait_for(lambda: video_queue.get_status("first") == 'processing')
+
+    assert video_queue.get_position("first") is None
+    assert video_queue.get_position("third") == 1
+    wait = (video_queue.get_estimated_start("third") - datetime.now()).total_seconds()
+    assert 9 < wait <= 10
+    release.set()
+
+
+def test_expired_leases_become_visible_to_other_workers(job_store):
+    """A job whose worker stops heartbeating is taken over, and the old worker can no longer write to it"""
+    from yourtube.jobs import JobStore
+    other = JobStore(job_store.database, lease_seconds=1, owner="other")
+    job_store.enqueue("abc", {'priority': 0})
+    job = job_store.claim_next()
+    assert job.video_id == "abc" and job.attempts == 1
+    assert other.claim_next() is None
+
+    time.sleep(1.1)  # no heartbeat, the lease expires
+    taken = other.claim_next()
+    assert taken.id == job.id and taken.attempts == 2 and taken.lease_owner == "other"
+    assert not job_store.complete_stage(job.id, "download", {})
+    assert other.finish(job.id, 'completed')
+
+
+def test_queued_jobs_wait_while_their_video_is_processing(job_store):
+    """A second job of a video, e.g. its upgrade, is only claimed once the first one is done"""
+    first = job_store.enqueue("abc", {'priority': 0})
+    job_store.enqueue("abc", {'priority': 2, 'upgrade': True})
+    assert job_store.claim_next().id == first
+    assert job_store.claim_next() is None
+    assert job_store.get_status("abc") == 'processing'
+
+    job_store.finish(first, 'completed')
+    assert job_store.claim_next().state['upgrade']
+
+
+def fleet_worker(db_path, log_path, barrier, stop_event):
+    """One worker process of the fleet in `test_worker_fleet_drains_a_shared_queue`"""
+    from yourtube import Database
+    from yourtube.jobs import JobStore
+    from yourtube.worker import run_worker
+
+    job_store = JobStore(Database(db_path=db_path), lease_seconds=5)
+
+    def work(task):
+        with open(log_path, "a") as f:
+            f.write(f"{task['video_id']} {job_store.owner}\n")
+        time.sleep(0.1)
+
+    barrier.wait()
+    run_worker(job_store, [Stage("work", work)], stop_event=stop_event, poll_interval=0.05)
+
+
+def test_worker_fleet_drains_a_shared_queue(tmp_path, job_store, monkeypatch):
+    """Several worker processes share one queue the API only enqueues to, and every job runs exactly once"""
+    import multiprocessing
+    monkeypatch.setenv("LITELLM_LOCAL_MODEL_COST_MAP", "True")  # spare each worker the remote fetch on import
+    api = VideoProcessingQueue()
+    api.attach(job_store)
+    video_ids = [f"video{i}" for i in range(20)]
+    for video_id in video_ids:
+        assert api.add_task(video_id=video_id, priority='backfill')
+    assert api.add_task(video_id="urgent", priority='interactive')
+    assert api.get_position("urgent") == 0
+    assert api.get_position("video5") == 6
+    assert not api.add_task(video_id="video5")
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(4)
+    stop_event = context.Event()
+    log_path = str(tmp_path / "processed.log")
+    workers = [
+        context.Process(target=fleet_worker, args=(str(tmp_path / "videos.db"), log_path, barrier, stop_event))
+        for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    barrier.wait(timeout=60)
+    try:
+        wait_for(lambda: all(api.get_status(video_id) == 'completed' for video_id in video_ids + ["urgent"]), timeout=60)
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join(timeout=10)
+
+    processed = [line.split() for line in open(log_path)]
+    assert sorted(video_id for video_id, _ in processed) == sorted(video_ids + ["urgent"])
+    assert len({owner for _, owner in processed}) > 1
+    assert all(worker.exitcode == 0 for worker in workers)
+
+
+def test_cancel_queued_and_running_videos(video_queue, job_store):
+    """Queued videos are dropped at once, running ones stop at the next progress report"""
+    started = threading.Event()
+
+    def transcribe(task):
+        started.set()
+        for frame in range(500):
+            task['report_progress'](done=frame, total=500, unit="frames")
+            time.sleep(0.01)
+
+    finished = []
+    video_queue.start_worker(
+        stages=[Stage("transcribe", transcribe), Stage("summarize", lambda task: finished.append(task['video_id']))],
+        job_store=job_store
+    )
+    video_queue.add_task(video_id="running")
+    video_queue.add_task(video_id="waiting")
+    assert started.wait(5)
+
+    assert video_queue.cancel("waiting")
+    assert video_queue.get_status("waiting") == 'cancelled'
+    assert video_queue.cancel("running")
+    wait_for(lambda: video_queue.get_processing_count() == 0)
+    assert video_queue.get_status("running") == 'cancelled'
+    assert not video_queue.cancel("running")
+    assert finished == []
+    assert job_store.get_job("running").lease_owner is None
+
+
+def test_watchdog_replaces_workers_stuck_past_the_stage_timeout(video_queue):
+    """A stuck task is given up, counted as an overrun and the stage keeps going with a new worker"""
+    unblock = threading.Event()
+    video_queue.max_attempts = 2
+
+    def download(task):
+        if task['video_id'] == "stuck":
+            unblock.wait(10)
+        return None
+
+    done = []
+    video_queue.watchdog_interval = 0.05
+    video_queue.start_worker(stages=[Stage("download", download, timeout=0.2),
+                                     Stage("summarize", lambda task: done.append(task['video_id']))])
+    video_queue.add_task(video_id="stuck")
+    video_queue.add_task(video_id="next")
+
+    wait_for(lambda: done == ["next"])
+    # retried once, then failed when it overran again
+    wait_for(lambda: video_queue.get_status("stuck") == 'error')
+    metrics = video_queue.get_metrics()["download"]
+    assert metrics["overruns"] == 2 and metrics["overrun_seconds"] >= 0.4
+    assert len(video_queue.stages[0].threads) == 1
+
+    # the abandoned worker drops its result and exits once it returns
+    unblock.set()
+    time.sleep(0.2)
+    assert done == ["next"]
+    assert video_queue.get_processing_count() == 0
+
+
+def test_overrun_jobs_are_released_and_retried(video_queue, job_store):
+    """A job that overran its budget loses its lease and is recovered for another attempt"""
+    unblock = threading.Event()
+    attempts = []
+
+    def transcribe(task):
+        attempts.append(task['video_id'])
+        if len(attempts) == 1:
+            unblock.wait(10)
+
+    video_queue.watchdog_interval = 0.05
+    video_queue.start_worker(stages=[Stage("transcribe", transcribe, timeout=0.2)], job_store=job_store)
+    video_queue.add_task(video_id="slow")
+
+    wait_for(lambda: job_store.get_status("slow") == 'completed')
+    unblock.set()
+    assert attempts == ["slow", "slow"]
+    assert job_store.get_job("slow").attempts == 2
+    assert video_queue.get_metrics()["transcribe"]["overruns"] == 1
+
+
+def test_overrun_tasks_are_retried_without_a_job_store(video_queue):
+    """Without a job store an overrun task is queued again in front of the stage it overran"""
+    unblock = threading.Event()
+    attempts, done = [], []
+
+    def transcribe(task):
+        attempts.append(task['video_id'])
+        if len(attempts) == 1:
+            unblock.wait(10)
+
+    video_queue.watchdog_interval = 0.05
+    video_queue.start_worker(stages=[Stage("download", lambda task: None),
+                                     Stage("transcribe", transcribe, timeout=0.2),
+                                     Stage("summarize", lambda task: done.append(task['video_id']))])
+    video_queue.add_task(video_id="slow")
+
+    wait_for(lambda: video_queue.get_status("slow") == 'completed')
+    unblock.set()
+    assert attempts == ["slow", "slow"] and done == ["slow"]
+    assert video_queue.get_metrics()["transcribe"]["overruns"] == 1
+    assert video_queue.get_processing_count() == 0
+
+
+def test_stage_deadline_outside_the_pool():
+    with stage_deadline("download", None):
+        pass
+    with pytest.raises(TimeoutError):
+        with stage_deadline("download", 0.05):
+            time.sleep(0.2)
+
+
+def test_status_store_is_bounded():
+    video_queue = VideoProcessingQueue(status_maxsize=2)
+    for video_id in ("a", "b", "c"):
+        video_queue._set_status(video_id, 'completed')
+    assert video_queue.get_status("a") is None
+    assert video_queue.get_status("c") == 'completed'
+
+
+def test_admission_control(video_queue):
+    """New videos are turned away with a retry hint once the backlog passes the limits"""
+    release = threading.Event()
+    video_queue.start_worker(stages=[Stage("only", lambda task: release.wait(5))])
+    video_queue.stages[0].avg_duration = 30
+    for video_id in ("first", "second", "third", "fourth"):
+        video_queue.add_task(video_id=video_id)
+    wait_for(lambda: video_queue.get_status("first") == 'processing')
+
+    assert video_queue.check_admission(max_queue_depth=10, max_wait_seconds=600) is None
+    assert video_queue.check_admission(max_queue_depth=2) == 60  # two videos to go before a slot frees up
+    assert video_queue.check_admission(max_wait_seconds=30) == 60  # 3 queued * 30s, 60s over the limit
+    release.set()
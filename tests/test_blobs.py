@@ -0,0 +1,66 @@
+import asyncio
+from yourtube import Database, Video
+from yourtube.blobs import migrate_directory
+from yourtube.repository import AsyncVideoRepository
+from yourtube.search import search
+
+SRT = "1\n00:00:00,000 --> 00:00:05,000\nhello from the archive\n"
+
+
+def read(path, *args):
+    async def scenario():
+        repository = AsyncVideoRepository(db_path=path)
+        try:
+            return await repository.read_artifact(*args)
+        finally:
+            await repository.dispose()
+    return asyncio.run(scenario())
+
+
+def test_stored_artifacts_outlive_their_files(tmp_path, monkeypatch):
+    monkeypatch.setattr("yourtube.database.get_download_dir", lambda: str(tmp_path))
+    monkeypatch.setattr("yourtube.repository.get_download_dir", lambda: str(tmp_path))
+    path = str(tmp_path / "videos.db")
+    db = Database(db_path=path, store_blobs=True)
+    (tmp_path / "abc.en.srt").write_text(SRT)
+    (tmp_path / "abc.mp4").write_bytes(b"media")
+    db.record_artifacts("abc", "en", ["transcript", "media"])
+
+    # only texts are stored, their files can go
+    (tmp_path / "abc.en.srt").unlink()
+    (tmp_path / "abc.mp4").unlink()
+    db.record_artifacts("abc", "en", ["transcript", "media"])
+    assert [artifact.kind for artifact in db.get_artifacts("abc")] == ["transcript"]
+    assert db.read_artifact("abc", "transcript", "en") == SRT
+    assert read(path, "abc", "transcript", "en") == SRT
+    assert search(db.session.connection(), "archive")[0]["video_id"] == "abc"
+
+    # a rewritten file replaces the stored copy
+    (tmp_path / "abc.en.srt").write_text("1\n00:00:00,000 --> 00:00:05,000\nnew words\n")
+    db.record_artifacts("abc", "en", ["transcript"])
+    assert "new words" in read(path, "abc", "transcript", "en")
+
+    db.update_video(Video(video_id="abc", title="A video", language="en"))
+    db.delete_video(video_id="abc")
+    assert db.read_artifact("abc", "transcript", "en") is None
+
+
+def test_download_directory_migrates_into_the_database(tmp_path, monkeypatch):
+    for module in ("yourtube.database", "yourtube.repository", "yourtube.blobs"):
+        monkeypatch.setattr(f"{module}.get_download_dir", lambda: str(tmp_path))
+    path = str(tmp_path / "videos.db")
+    db = Database(db_path=path)
+    (tmp_path / "abc.en.srt").write_text(SRT * 50)
+    (tmp_path / "abc.en.md").write_text("# Summary")
+    (tmp_path / "abc.mp4").write_bytes(b"media")
+    db.record_artifacts("abc", "en", ["transcript", "summary", "media"])
+    # a file that changed since it was recorded is stored as it is now
+    (tmp_path / "abc.en.md").write_text("# Summary, edited")
+
+    stats = migrate_directory(db, delete_files=True)
+    assert (stats['files'], stats['deleted']) == (2, 2)
+    assert stats['compressed'] < stats['bytes']
+    assert not (tmp_path / "abc.en.srt").exists() and (tmp_path / "abc.mp4").exists()
+    assert read(path, "abc", "summary", "en") == "# Summary, edited"
+    assert read(path, "abc", "transcript", "en") == SRT * 50
+    assert migrate_directory(db)['files'] == 0
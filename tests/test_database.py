@@ -0,0 +1,80 @@
+import threading
+import time
+import pytest
+from sqlalchemy import event
+from yourtube import Database, Video
+
+
+def test_update_video_upserts_in_place(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    db.add_video(Video(video_id="abc", title="Old title"))
+    original_id = db.get_video(video_id="abc").id
+
+    assert db.update_video(Video(video_id="abc", title="New title", transcript=True))
+    video = db.get_video(video_id="abc")
+    assert (video.id, video.title, video.transcript) == (original_id, "New title", True)
+
+    assert db.update_video(Video(video_id="new", title="Fresh"))
+    assert db.get_video(video_id="new").summary is False
+    assert db.session.query(Video).count() == 2
+
+
+def test_bulk_upsert_writes_in_one_transaction(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    db.add_video(Video(video_id="v00000", title="Already there"))
+    commits = []
+    event.listen(db.engine, "commit", lambda connection: commits.append(connection))
+
+    videos = [Video(video_id=f"v{n:05d}", title=f"Video {n}") for n in range(5000)]
+    videos.append(Video(video_id="v00001", title="Second copy"))  # the last copy of a video wins
+    assert db.upsert_videos(videos) == 5000
+
+    assert len(commits) == 1
+    assert db.session.query(Video).count() == 5000
+    assert db.get_video(video_id="v00000").title == "Video 0"
+    assert db.get_video(video_id="v00001").title == "Second copy"
+    assert db.upsert_videos([]) == 0
+
+
+def test_sessions_are_per_thread_and_per_request(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(db.session))
+    thread.start()
+    thread.join()
+    assert db.session is db.session
+    assert sessions[0] is not db.session
+
+    with db.request_session():
+        request_session = db.session
+        assert request_session is not sessions[0]
+    assert db.session is not request_session
+
+
+def test_readers_do_not_wait_for_the_writer(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    db.add_video(Video(video_id="abc", title="Committed"))
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+    with db.session_scope() as writer:
+        writer.add(Video(video_id="new", title="Not committed yet"))
+        writer.flush()  # holds the write lock until the block ends
+
+        result = []
+        reader = threading.Thread(target=lambda: result.append(db.session.query(Video).count()))
+        started = time.monotonic()
+        reader.start()
+        reader.join()
+        assert result == [1] and time.monotonic() - started < 1
+    assert db.session.query(Video).count() == 2
+
+
+def test_session_scope_rolls_back_on_error(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    with pytest.raises(RuntimeError):
+        with db.session_scope() as session:
+            session.add(Video(video_id="abc", title="Discarded"))
+            session.flush()
+            raise RuntimeError
+    assert db.get_video(video_id="abc") is None
@@ -0,0 +1,84 @@
+import sqlite3
+import pytest
+from sqlalchemy.exc import IntegrityError
+from yourtube import Database, Video
+from yourtube.migrations import MIGRATIONS
+from yourtube.search import search
+
+
+def create_old_library(path):
+    """A videos table as created before the schema was versioned: no indexes, duplicate video_ids"""
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE videos (
+            id CHAR(32) NOT NULL PRIMARY KEY, video_id VARCHAR(20) NOT NULL, title VARCHAR(200) NOT NULL,
+            channel_id VARCHAR(20), channel VARCHAR(100), upload_date DATETIME, process_date DATETIME,
+            language VARCHAR(10), transcript BOOLEAN, fulltext BOOLEAN, summary BOOLEAN
+        )
+    """)
+    connection.executemany(
+        "INSERT INTO videos (id, video_id, title, process_date) VALUES (?, ?, ?, ?)",
+        [
+            ("a" * 32, "dup", "older copy", "2024-01-01 00:00:00.000000"),
+            ("b" * 32, "dup", "newer copy", "2024-02-01 00:00:00.000000"),
+            ("c" * 32, "single", "only copy", None),
+        ]
+    )
+    connection.commit()
+    connection.close()
+
+
+def indexes(path):
+    with sqlite3.connect(path) as connection:
+        return {name for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'videos' AND sql IS NOT NULL"
+        )}
+
+
+def user_version(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_old_libraries_are_deduplicated_and_indexed(tmp_path, monkeypatch):
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    (downloads / "dup.en.srt").write_text("1\n00:00:00,000 --> 00:00:01,000\nhello\n")
+    (downloads / "dup.info.json").write_text('{"duration": 125}')
+    monkeypatch.setattr("yourtube.migrations.get_download_dir", lambda: str(downloads))
+    path = str(tmp_path / "videos.db")
+    create_old_library(path)
+
+    db = Database(db_path=path)
+    assert user_version(path) == MIGRATIONS[-1][0]
+    assert {"ix_videos_video_id", "ix_videos_upload_date_video_id", "ix_videos_process_date_video_id",
+            "ix_videos_channel_id_upload_date"} == indexes(path)
+    assert db.session.query(Video).count() == 2
+    assert db.get_video(video_id="dup").title == "newer copy"
+    # files already downloaded are indexed as artifacts
+    assert [(a.kind, a.language, a.path) for a in db.get_artifacts("dup")] == [
+        ("info", None, "dup.info.json"), ("transcript", "en", "dup.en.srt")
+    ]
+    # and transcripts are searchable
+    assert [hit["start"] for hit in search(db.session.connection(), "hello")] == [0.0]
+    # durations come from the info files and every channel has its statistics
+    assert db.get_video(video_id="dup").duration == 125
+    stats = db.get_channel_stats()
+    assert [(s.channel_id, s.video_count, s.total_duration) for s in stats] == [("", 2, 125)]
+
+    db.session.add(Video(video_id="single", title="another copy"))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    db.delete_video(video_id="single")
+    assert db.get_channel_stats()[0].video_count == 1
+
+    # reopening finds nothing left to migrate
+    assert Database(db_path=path).session.query(Video).count() == 1
+
+
+def test_new_libraries_start_at_the_latest_version(tmp_path):
+    path = str(tmp_path / "videos.db")
+    Database(db_path=path)
+    assert user_version(path) == MIGRATIONS[-1][0]
+    assert "ix_videos_video_id" in indexes(path)
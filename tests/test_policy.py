@@ -0,0 +1,124 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from yourtube.async_worker import VideoProcessingQueue, Stage, PRIORITY_INTERACTIVE, PRIORITY_SCHEDULED, PRIORITY_BACKFILL
+from yourtube.policy import TranscriptionPolicy
+
+
+CONFIG = {"transcribe": {"size": "small", "adaptive": {"sla_seconds": 1800, "sizes": ["base", "tiny"]}}}
+
+
+@pytest.fixture
+def job_store(tmp_path):
+    from yourtube import Database
+    from yourtube.jobs import JobStore
+    return JobStore(Database(db_path=str(tmp_path / "videos.db")))
+
+
+@pytest.fixture
+def policy(job_store):
+    queue = MagicMock(pull=False)
+    queue.get_backlog.return_value = 0
+    return TranscriptionPolicy(CONFIG, queue=queue, job_store=job_store)
+
+
+def test_full_size_until_speed_is_measured(policy):
+    policy.queue.get_backlog.return_value = 100
+    decision = policy.decide({'video_id': "abc", 'priority': PRIORITY_BACKFILL})
+    assert (decision['action'], decision['size']) == ('full', 'small')
+
+
+@pytest.mark.parametrize("priority, backlog, action, size", [
+    (PRIORITY_SCHEDULED, 1, 'full', 'small'),  # 2 * 600s * 0.5 fits the SLA
+    (PRIORITY_INTERACTIVE, 10, 'full', 'small'),  # interactive jobs always get the configured size
+    (PRIORITY_SCHEDULED, 10, 'downsize', 'tiny'),  # base at 4/7 of small's time still misses it
+    (PRIORITY_BACKFILL, 20, 'skip', None),
+])
+def test_lower_priorities_degrade_under_load(policy, priority, backlog, action, size):
+    policy.record("small", audio_seconds=600, elapsed=300)
+    policy.queue.get_backlog.return_value = backlog
+    decision = policy.decide({'video_id': "abc", 'priority': priority})
+    assert (decision['action'], decision['size']) == (action, size)
+    assert policy.pending_upgrades() == ([] if action == 'full' else ["abc"])
+
+
+def test_upgrades_wait_in_the_job_store(policy, job_store):
+    policy.record("small", audio_seconds=600, elapsed=300)
+    policy.queue.get_backlog.return_value = 20
+    policy.decide({'video_id': "abc", 'priority': PRIORITY_BACKFILL, 'process': True, 'summarize': False})
+    policy.decide({'video_id': "def", 'priority': PRIORITY_BACKFILL})
+    policy.decide({'video_id': "abc", 'priority': PRIORITY_BACKFILL})
+
+    assert job_store.get_job("abc").state == {
+        'video_id': "abc", 'force': True, 'transcribe': True, 'process': True, 'summarize': False,
+        'priority': PRIORITY_BACKFILL, 'upgrade': True, 'is_last': True
+    }
+    # a restarted app finds them again
+    assert TranscriptionPolicy(CONFIG, job_store=job_store).pending_upgrades() == ["abc", "def"]
+
+
+def test_idle_pipelines_take_upgrades_in_one_at_a_time(policy, job_store):
+    policy.record("small", audio_seconds=600, elapsed=300)
+    policy.queue.get_backlog.return_value = 20
+    policy.decide({'video_id': "abc", 'priority': PRIORITY_BACKFILL})
+    policy.decide({'video_id': "def", 'priority': PRIORITY_BACKFILL})
+
+    policy.queue.resume.side_effect = lambda job: job.video_id != "abc"  # already in the pipeline
+    assert policy.queue_upgrade()
+    assert [call.args[0].video_id for call in policy.queue.resume.call_args_list] == ["abc", "def"]
+
+    policy.queue.pull = True  # pulling workers claim upgrade jobs themselves
+    assert not policy.queue_upgrade()
+
+
+@pytest.mark.parametrize("upgrade, size", [(False, 'tiny'), (True, 'small')])
+def test_upgrades_use_the_configured_size_under_load(policy, upgrade, size):
+    from yourtube.main import stage_transcribe
+    policy.record("small", audio_seconds=600, elapsed=300)
+    policy.queue.get_backlog.return_value = 10
+    policy.decide = MagicMock(wraps=policy.decide)
+    transcriber = MagicMock(model=None, audio_seconds=600)
+    job = {'video_id': "abc", 'video': MagicMock(transcript=False), 'transcribe': True, 'upgrade': upgrade,
+           'priority': PRIORITY_BACKFILL, 'policy': policy, 'transcriber': transcriber, 'database': MagicMock(),
+           'config': {"transcribe": {"size": "small"}}}
+
+    assert stage_transcribe(job)
+    transcriber.load_model.assert_called_once_with(model_size=size)
+    assert policy.decide.called != upgrade
+
+
+def test_upgrade_jobs_run_in_an_idle_local_pipeline(job_store):
+    video_queue = VideoProcessingQueue()
+    upgraded = []
+    policy = TranscriptionPolicy(CONFIG, queue=video_queue, job_store=job_store)
+    video_queue.start_worker(stages=[Stage("only", lambda task: upgraded.append(task.get('upgrade')))],
+                             job_store=job_store, on_idle=policy.queue_upgrade)
+    try:
+        policy._enqueue_upgrade({'video_id': "abc"})
+        video_queue.add_task(video_id="def")
+        deadline = time.monotonic() + 5
+        while job_store.get_status("abc") != 'completed' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert upgraded == [None, True]
+        assert policy.pending_upgrades() == []
+    finally:
+        video_queue.stop_worker()
+
+
+def test_idle_callback_runs_when_the_pipeline_drains():
+    video_queue = VideoProcessingQueue()
+    release = threading.Event()
+    idle = []
+    video_queue.start_worker(stages=[Stage("only", lambda task: release.wait(5))], on_idle=lambda: idle.append(True))
+    try:
+        video_queue.add_task(video_id="first")
+        video_queue.add_task(video_id="second")
+        release.set()
+        deadline = time.monotonic() + 5
+        while not idle and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert idle == [True]
+        assert video_queue.get_status("second") == 'completed'
+    finally:
+        video_queue.stop_worker()
@@ -0,0 +1,83 @@
+import asyncio
+import importlib
+import pytest
+from yourtube.async_worker import VideoProcessingQueue, Stage
+from yourtube.progress import progress_bus
+
+
+@pytest.fixture
+def video_queue():
+    queue = VideoProcessingQueue()
+    yield queue
+    queue.stop_worker()
+
+
+def test_pipeline_publishes_stage_transitions_and_progress(video_queue):
+    """Subscribers see every status, every stage and the progress each stage reports"""
+    def transcribe(task):
+        task['report_progress'](done=50, total=200, unit="frames")
+        task['report_progress'](done=200, total=200, unit="frames")
+
+    async def collect():
+        queue = progress_bus.subscribe()
+        try:
+            video_queue.start_worker(stages=[Stage("download", lambda task: None), Stage("transcribe", transcribe)])
+            video_queue.add_task(video_id="progress1")
+            events = []
+            while not events or events[-1]['status'] != 'completed':
+                event = await asyncio.wait_for(queue.get(), timeout=5)
+                if event['video_id'] == "progress1":
+                    events.append(event)
+            return events
+        finally:
+            progress_bus.unsubscribe(queue)
+
+    events = asyncio.run(collect())
+    assert [(event['status'], event['stage'], event.get('percent')) for event in events] == [
+        ('queued', None, None),
+        ('processing', 'download', None),
+        ('processing', 'transcribe', None),
+        ('processing', 'transcribe', 25.0),
+        ('processing', 'transcribe', 100.0),
+        ('completed', None, None),
+    ]
+    assert progress_bus.latest("progress1")['status'] == 'completed'
+
+
+def test_late_subscribers_start_from_the_latest_state():
+    """A subscriber that connects mid-way first receives the current state of each video"""
+    progress_bus.publish("progress2", status='processing', stage='process')
+    progress_bus.publish("progress2", done=3, total=7, unit="chunks")
+
+    async def first_event():
+        queue = progress_bus.subscribe()
+        try:
+            while True:
+                event = await asyncio.wait_for(queue.get(), timeout=1)
+                if event['video_id'] == "progress2":
+                    return event
+        finally:
+            progress_bus.unsubscribe(queue)
+
+    event = asyncio.run(first_event())
+    assert (event['stage'], event['done'], event['total'], event['unit']) == ('process', 3, 7, 'chunks')
+
+
+def test_whisper_progress_bar_reports_to_the_running_transcription():
+    """Whisper's progress bar forwards decoded frames to the callback of its thread, even when hidden"""
+    from yourtube import transcriber
+    reports = []
+    whisper_transcribe = importlib.import_module("whisper.transcribe")
+    original = whisper_transcribe.tqdm
+    with transcriber._whisper_progress(lambda **report: reports.append(report)):
+        with transcriber._whisper_progress(None):  # a concurrent transcription doesn't uninstall it
+            pass
+        with whisper_transcribe.tqdm.tqdm(total=3000, unit="frames", disable=True) as bar:
+            bar.update(1000)
+            bar.update(3000)
+    # Whisper is left as it was once no transcription runs
+    assert whisper_transcribe.tqdm is original
+    assert reports == [
+        {'done': 1000, 'total': 3000, 'unit': 'frames'},
+        {'done': 3000, 'total': 3000, 'unit': 'frames'},
+    ]
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+from yourtube import Database, Video
+import pytest
+from yourtube.repository import AsyncVideoRepository
+
+
+def test_async_repository_reads_and_deletes(tmp_path, monkeypatch):
+    monkeypatch.setattr("yourtube.database.get_download_dir", lambda: str(tmp_path))
+    path = str(tmp_path / "videos.db")
+    db = Database(db_path=path)
+    db.upsert_videos([
+        Video(video_id="old", title="Old", upload_date=datetime(2020, 1, 1), process_date=datetime(2024, 1, 2)),
+        Video(video_id="new", title="New", upload_date=datetime(2023, 1, 1), process_date=datetime(2024, 1, 1)),
+    ])
+    (tmp_path / "old.en.srt").write_text("subtitles")
+    db.record_artifacts("old", "en", ["transcript"])
+
+    async def scenario():
+        repository = AsyncVideoRepository(db_path=path)
+        try:
+            assert (await repository.get_video(video_id="new")).title == "New"
+            assert await repository.get_video(video_id="missing") is None
+            videos, next_cursor = await repository.list_page()
+            assert [v["video_id"] for v in videos] == ["old", "new"] and next_cursor is None
+            videos, _ = await repository.list_page(sort="upload_date")
+            assert [v["video_id"] for v in videos] == ["new", "old"]
+            assert await repository.existing_video_ids(["old", "missing"]) == {"old"}
+
+            # queries run concurrently with other work on the loop
+            results = await asyncio.gather(*(repository.get_video(video_id="old") for _ in range(20)))
+            assert all(video.title == "Old" for video in results)
+
+            assert await repository.delete_video("old")
+            assert not await repository.delete_video("old")
+        finally:
+            await repository.dispose()
+
+    asyncio.run(scenario())
+    assert not (tmp_path / "old.en.srt").exists()
+    assert db.get_video(video_id="old") is None
+    assert db.get_artifacts("old") == []
+
+
+def test_list_page_walks_every_video_once(tmp_path):
+    path = str(tmp_path / "videos.db")
+    db = Database(db_path=path)
+    videos = [
+        Video(video_id=f"v{i:02d}", title=f"Video {i}", channel_id="a" if i % 2 else "b",
+              # pairs of videos share an upload date, and the last three have none
+              upload_date=datetime(2024, 1, 1 + i // 2) if i < 17 else None, transcript=i % 3 == 0)
+        for i in range(20)
+    ]
+    db.upsert_videos(videos)
+
+    async def walk(repository, **kwargs):
+        seen, cursor = [], None
+        while True:
+            page, cursor = await repository.list_page(sort="upload_date", limit=4, cursor=cursor, **kwargs)
+            assert len(page) <= 4
+            seen += [row["video_id"] for row in page]
+            if cursor is None:
+                return seen
+
+    async def scenario():
+        repository = AsyncVideoRepository(db_path=path)
+        try:
+            seen = await walk(repository)
+            dated = sorted((v for v in videos if v.upload_date), key=lambda v: (v.upload_date, v.video_id), reverse=True)
+            undated = sorted((v.video_id for v in videos if not v.upload_date), reverse=True)
+            assert seen == [v.video_id for v in dated] + undated
+
+            assert await walk(repository, channel_id="a") == [video_id for video_id in seen if int(video_id[1:]) % 2]
+            assert await walk(repository, status="transcribed") == [video_id for video_id in seen if int(video_id[1:]) % 3 == 0]
+
+            with pytest.raises(ValueError):
+                await repository.list_page(cursor="not a cursor")
+        finally:
+            await repository.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+import asyncio
+from yourtube import Database, Video
+from yourtube.repository import AsyncVideoRepository
+from yourtube.search import parse_srt, transcript_windows, split_query
+
+SRT = """1
+00:00:00,000 --> 00:00:20,000
+Welcome to the channel
+
+2
+00:00:20,000 --> 00:00:40,000
+today we talk about sourdough bread
+
+3
+00:01:05,500 --> 00:01:10,000
+我们今天讨论机器学习
+"""
+
+
+def test_srt_windows_keep_their_times():
+    assert parse_srt(SRT)[1] == (20.0, 40.0, "today we talk about sourdough bread")
+    assert transcript_windows(SRT, window_seconds=30) == [
+        (0.0, 40.0, "Welcome to the channel today we talk about sourdough bread"),
+        (65.5, 70.0, "我们今天讨论机器学习"),
+    ]
+    assert split_query('bread "machine learning" 机器') == ('"bread" AND "machine learning"', ["机器"])
+
+
+def test_search_finds_indexed_texts_and_follows_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr("yourtube.database.get_download_dir", lambda: str(tmp_path))
+    path = str(tmp_path / "videos.db")
+    db = Database(db_path=path)
+    db.update_video(Video(video_id="abc", title="Baking <live>", language="en"))
+    (tmp_path / "abc.en.srt").write_text(SRT, encoding="utf-8")
+    (tmp_path / "abc.en.md").write_text("# Summary\n\nA talk about Sourdough and machine learning.", encoding="utf-8")
+    db.record_artifacts("abc", "en", ["transcript", "summary"])
+
+    async def search(query, **kwargs):
+        repository = AsyncVideoRepository(db_path=path)
+        try:
+            return await repository.search(query, **kwargs)
+        finally:
+            await repository.dispose()
+
+    hits = asyncio.run(search("sourdough", kinds=["transcript"]))
+    assert [(hit["video_id"], hit["title"], hit["start"], hit["end"]) for hit in hits] == [("abc", "Baking <live>", 0.0, 40.0)]
+    assert "<mark>sourdough</mark>" in hits[0]["snippet"]
+
+    # summaries get the time of the matching transcript window, CJK matches by substring
+    summary_hit = asyncio.run(search("SOURDOUGH", kinds=["summary"]))[0]
+    assert (summary_hit["kind"], summary_hit["start"]) == ("summary", 0.0)
+    assert [hit["start"] for hit in asyncio.run(search("机器学习"))] == [65.5]
+    # two-character terms are too short for the trigram index and are matched by scanning
+    assert [hit["start"] for hit in asyncio.run(search("讨论"))] == [65.5]
+    assert [hit["start"] for hit in asyncio.run(search("讨论 机器学习"))] == [65.5]
+    assert asyncio.run(search("sourdough 讨论")) == []
+
+    # re-recording a changed file replaces its documents, removing it or the video drops them
+    (tmp_path / "abc.en.srt").write_text("1\n00:00:00,000 --> 00:00:05,000\nrye only\n", encoding="utf-8")
+    db.record_artifacts("abc", "en", ["transcript"])
+    assert asyncio.run(search("sourdough", kinds=["transcript"])) == []
+    assert len(asyncio.run(search("rye only"))) == 1
+    (tmp_path / "abc.en.md").unlink()
+    db.record_artifacts("abc", "en", ["summary"])
+    assert asyncio.run(search("machine")) == []
+    db.delete_video(video_id="abc")
+    assert asyncio.run(search("rye")) == []
@@ -0,0 +1,89 @@
+import asyncio
+import zlib
+import numpy as np
+from yourtube import Database, Video
+from yourtube.repository import AsyncVideoRepository
+from yourtube.semantic import SemanticIndex
+
+
+class FakeEmbedder:
+    """Hashed bag of words, so texts sharing words are close"""
+    model_name = "fake-bag-of-words"
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.encoded = 0
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, zlib.crc32(word.encode()) % self.dim] += 1
+        self.encoded += len(texts)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+
+
+def srt(*cues):
+    return "\n".join(f"{i}\n00:0{i}:00,000 --> 00:0{i}:40,000\n{text}\n" for i, text in enumerate(cues, start=1))
+
+
+def make_library(tmp_path, monkeypatch):
+    monkeypatch.setattr("yourtube.database.get_download_dir", lambda: str(tmp_path))
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    db.upsert_videos([Video(video_id="bread", title="Bread", language="en"), Video(video_id="ml", title="ML", language="en")])
+    (tmp_path / "bread.en.srt").write_text(srt("flour water salt", "sourdough starter feeding schedule"))
+    (tmp_path / "ml.en.srt").write_text(srt("gradient descent learning rate", "neural network layers"))
+    db.record_artifacts("bread", "en", ["transcript"])
+    db.record_artifacts("ml", "en", ["transcript"])
+    return db
+
+
+def test_index_is_incremental_and_finds_the_closest_window(tmp_path, monkeypatch):
+    db = make_library(tmp_path, monkeypatch)
+    index, embedder = SemanticIndex(str(tmp_path / "embeddings")), FakeEmbedder()
+
+    assert index.index_pending(db.engine, embedder, video_id="bread", batch_size=1) == 2
+    assert index.index_pending(db.engine, embedder) == 2
+    assert index.index_pending(db.engine, embedder) == 0
+    assert embedder.encoded == 4 and index.row_count() == 4
+
+    with db.engine.connect() as connection:
+        hit = index.search(connection, embedder.encode(["sourdough starter"])[0], limit=1)[0]
+        assert (hit["video_id"], hit["start"], hit["end"]) == ("bread", 120.0, 160.0)
+
+    # a changed transcript gets new rows, the old ones no longer match
+    (tmp_path / "bread.en.srt").write_text(srt("rye bread"))
+    db.record_artifacts("bread", "en", ["transcript"])
+    assert index.index_pending(db.engine, embedder) == 1
+    assert index.row_count() == 5
+    db.delete_video(video_id="ml")
+
+    async def scenario():
+        repository = AsyncVideoRepository(db_path=db.db_path)
+        try:
+            return await repository.semantic_search(index, embedder.encode(["neural network"])[0], limit=10)
+        finally:
+            await repository.dispose()
+
+    assert [hit["video_id"] for hit in asyncio.run(scenario())] == ["bread"]
+
+
+def test_clusters_narrow_the_search(tmp_path, monkeypatch):
+    db = make_library(tmp_path, monkeypatch)
+    index, embedder = SemanticIndex(str(tmp_path / "embeddings")), FakeEmbedder()
+    index.index_pending(db.engine, embedder)
+    query = embedder.encode(["gradient descent"])[0]
+    exact_rows, _ = index.nearest(query, k=4)
+
+    assert index.build_clusters(n_clusters=2) == 2
+    # probing every cluster scores every row
+    assert list(index.nearest(query, k=4, nprobe=2)[0]) == list(exact_rows)
+    assert index.nearest(query, k=1, nprobe=1)[0][0] == exact_rows[0]
+
+    # windows embedded after the clustering are assigned to a cluster as they are written
+    (tmp_path / "ml.en.srt").write_text(srt("gradient descent learning rate", "neural network layers", "gradient clipping"))
+    db.record_artifacts("ml", "en", ["transcript"])
+    index.index_pending(db.engine, embedder)
+    assert np.fromfile(index.clusters_path, dtype=np.int32).min() > 0
+    with db.engine.connect() as connection:
+        assert index.search(connection, query, limit=1, nprobe=1)[0]["video_id"] == "ml"
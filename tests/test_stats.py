@@ -0,0 +1,103 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from yourtube import Database, Video, Reporter
+from yourtube.jobs import JobStore
+from yourtube.repository import AsyncVideoRepository
+from yourtube.stats import rebuild_channel_stats
+
+
+def snapshot(db):
+    return sorted(tuple(stats.to_dict().values()) for stats in db.get_channel_stats())
+
+
+def test_triggers_match_a_full_recount(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    jobs = JobStore(db)
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    for step in range(300):
+        video_id = f"v{rng.randrange(40)}"
+        action = rng.random()
+        if action < 0.6:
+            db.upsert_videos([Video(
+                video_id=video_id, title=video_id, channel_id=rng.choice(["c1", "c2", None]), channel="Channel",
+                upload_date=start + timedelta(days=rng.randrange(100)),
+                process_date=start + timedelta(days=rng.randrange(100)),
+                transcript=rng.random() < 0.5, summary=rng.random() < 0.5,
+                duration=rng.choice([None, rng.randrange(1, 3600)])
+            )])
+        elif action < 0.75:
+            db.delete_video(video_id=video_id)
+        elif action < 0.9:
+            # submissions carry the channel id of their video, which may not be in the library yet
+            jobs.enqueue(video_id, {'channel_id': rng.choice(["c1", "c3", None])})
+        else:
+            job = jobs.get_job(video_id)
+            if job is not None:
+                with db.engine.begin() as connection:
+                    connection.execute(text("UPDATE jobs SET status = :status WHERE id = :id"),
+                                       {"status": rng.choice(["processing", "completed", "error"]), "id": job.id})
+    jobs.enqueue("missing", {'channel_id': "c4"})
+    maintained = snapshot(db)
+    assert maintained and any(row[-1] for row in maintained)  # some pending jobs are counted
+    assert ("c4", None, 0, 0, 0, None, None, 0, 1) in maintained  # a job whose video isn't in the library
+
+    with db.engine.begin() as connection:
+        rebuild_channel_stats(connection)
+    db.session.expire_all()
+    assert snapshot(db) == maintained
+
+
+def test_submissions_move_to_their_video_once_it_is_stored(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    JobStore(db).enqueue("new", {'channel_id': "c1", 'priority': 0})
+    assert snapshot(db) == [("c1", None, 0, 0, 0, None, None, 0, 1)]
+
+    db.upsert_videos([Video(video_id="new", title="New", channel_id="c1", channel="One", duration=60)])
+    assert snapshot(db) == [("c1", "One", 1, 0, 0, None, None, 60, 1)]
+
+    db.delete_video(video_id="new")
+    assert snapshot(db) == [("c1", None, 0, 0, 0, None, None, 0, 1)]
+
+
+def test_repository_reads_one_row_per_channel(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    db.upsert_videos([
+        Video(video_id="a", title="A", channel_id="c1", channel="One", upload_date=datetime(2024, 1, 1), duration=60),
+        Video(video_id="b", title="B", channel_id="c1", channel="One", upload_date=datetime(2024, 3, 1), duration=30),
+        Video(video_id="c", title="C", channel_id="c2", channel="Two", upload_date=datetime(2024, 2, 1)),
+    ])
+    JobStore(db).enqueue("c")
+    # written again without its info, the video keeps its duration
+    db.update_video(Video(video_id="b", title="B", channel_id="c1", upload_date=datetime(2024, 3, 1), summary=True))
+
+    async def scenario():
+        repository = AsyncVideoRepository(db_path=db.db_path)
+        try:
+            return await repository.channel_stats()
+        finally:
+            await repository.dispose()
+
+    rows = asyncio.run(scenario())
+    assert [(row["channel_id"], row["video_count"], row["summarized_count"], row["total_duration"], row["pending_jobs"])
+            for row in rows] == [("c1", 2, 1, 90, 0), ("c2", 1, 0, 0, 1)]
+    assert rows[0]["last_upload"] == datetime(2024, 3, 1)
+
+
+def test_report_overview_shows_the_channel_rows(tmp_path):
+    db = Database(db_path=str(tmp_path / "videos.db"))
+    db.upsert_videos([
+        Video(video_id="a", title="A", channel_id="c1", channel="One", upload_date=datetime(2024, 1, 1),
+              summary=True, duration=3600),
+        Video(video_id="b", title="B", channel_id="c1", channel="One", upload_date=datetime(2024, 3, 1), duration=1800),
+        Video(video_id="c", title="C", channel_id="c2", upload_date=datetime(2024, 2, 1)),
+    ])
+    JobStore(db).enqueue("b")
+
+    overview = Reporter({'email': {}}, database=db)._generate_channel_overview()
+    assert overview.splitlines()[4:] == [
+        "| One | 2 | 1 | 1 | 2024-03-01 | 1.5 |",
+        "| c2 | 1 | 0 | 0 | 2024-02-01 | 0.0 |",
+    ]
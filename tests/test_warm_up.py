@@ -0,0 +1,36 @@
+from unittest.mock import MagicMock, patch
+from yourtube.transcriber import Transcriber
+
+
+@patch('yourtube.transcriber.get_device', return_value="cpu")
+@patch('yourtube.transcriber.whisper')
+def test_warm_up_loads_the_model_once(mock_whisper, mock_get_device):
+    model = MagicMock()
+    model.dims.n_mels = 80
+    mock_whisper.load_model.return_value.to.return_value = model
+    mock_whisper.audio.SAMPLE_RATE = 16000
+
+    transcriber = Transcriber()
+    assert transcriber.warm_up_status == {'state': 'idle'}
+    assert transcriber.warm_up("tiny")
+
+    status = transcriber.warm_up_status
+    assert status['state'] == 'ready' and status['model_size'] == "tiny"
+    assert 'load_seconds' in status and 'inference_seconds' in status
+    model.detect_language.assert_called_once()
+    mock_whisper.decode.assert_called_once()
+
+    # the pipeline finds the warm model instead of loading it again
+    transcriber.load_model("tiny")
+    assert transcriber.model is model
+    mock_whisper.load_model.assert_called_once_with("tiny")
+
+
+@patch('yourtube.transcriber.get_device', return_value="cpu")
+@patch('yourtube.transcriber.whisper')
+def test_warm_up_reports_errors(mock_whisper, mock_get_device):
+    mock_whisper.load_model.side_effect = RuntimeError("no weights")
+
+    transcriber = Transcriber()
+    assert not transcriber.warm_up("tiny")
+    assert transcriber.warm_up_status == {'state': 'error', 'model_size': "tiny", 'error': "no weights"}
@@ -29,3 +29,280 @@ def test_get_latest_videos(youtube_monitor):
     videos = youtube_monitor.get_latest_videos(handle, until_date="20250101")
     assert len(videos) == 3
     assert all(video.video_id in expected_video_ids for video in videos)
+
+
+@pytest.fixture
+def database(tmp_path):
+    from yourtube import Database
+    return Database(db_path=str(tmp_path / "videos.db"))
+
+
+def fake_channel_ydl(video_ids, calls):
+    """Create a YoutubeDL stand-in that lists `video_ids` (newest first) honoring playliststart/playlistend"""
+    def factory(ydl_opts):
+        mock = MagicMock()
+        mock.__enter__.return_value = mock
+        mock.__exit__.return_value = None
+        start, end = ydl_opts['playliststart'], ydl_opts['playlistend']
+        calls.append((start, end))
+        mock.extract_info.return_value = {
+            'entries': [{'id': vid, 'url': f'https://www.youtube.com/watch?v={vid}'} for vid in video_ids[start - 1:end]]
+        }
+        return mock
+    return factory
+
+
+def test_check_updates_stops_at_watermark(database):
+    """Only videos newer than the stored watermark are returned"""
+    monitor = YoutubeMonitor(config={}, database=database)
+    channel = [f"vid{i:03d}" for i in range(30, 0, -1)]  # vid030 is the newest
+    calls = []
+
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        first_scan = monitor.check_updates("@somechannel", max_results=5)
+    assert first_scan == channel[:5]
+    assert calls == [(1, 5)]
+    # the watermark only moves once the videos are stored
+    assert database.get_watermark("somechannel") is None
+    assert monitor.commit_updates("@somechannel", first_scan) == "vid030"
+    assert database.get_watermark("somechannel").last_video_id == "vid030"
+
+    # eight new videos were posted since the last scan
+    channel = [f"vid{i:03d}" for i in range(38, 30, -1)] + channel
+    calls = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        second_scan = monitor.check_updates("somechannel", max_results=5)
+    assert second_scan == channel[:8]
+    assert calls == [(1, 5), (6, 10)]
+    monitor.commit_updates("somechannel", second_scan)
+    assert database.get_watermark("somechannel").last_video_id == "vid038"
+
+    # nothing new: one listing request, no ids
+    calls = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        assert monitor.check_updates("somechannel", max_results=5) == []
+    assert calls == [(1, 5)]
+    assert monitor.commit_updates("somechannel", []) is None
+    assert database.get_watermark("somechannel").last_video_id == "vid038"
+
+
+def test_check_updates_without_pages(database):
+    """Nothing is listed and nothing is learned when no page may be walked"""
+    monitor = YoutubeMonitor(config={}, database=database)
+    calls = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(["vid001"], calls)):
+        assert monitor.check_updates("somechannel", max_pages=0) == []
+    assert calls == []
+    assert database.get_watermark("somechannel") is None
+
+
+def test_failed_downloads_are_scanned_again(database):
+    """The watermark stops before the oldest video that wasn't stored"""
+    monitor = YoutubeMonitor(config={}, database=database)
+    database.set_watermark("somechannel", "vid001")
+    channel = ["vid005", "vid004", "vid003", "vid002", "vid001"]
+
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, [])):
+        scan = monitor.check_updates("somechannel", max_results=5)
+    assert scan == ["vid005", "vid004", "vid003", "vid002"]
+    # vid004 failed to download
+    assert monitor.commit_updates("somechannel", ["vid005", "vid003", "vid002"]) == "vid003"
+
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, [])):
+        assert monitor.check_updates("somechannel", max_results=5) == ["vid005", "vid004"]
+    # the oldest new video failed again, nothing moves
+    assert monitor.commit_updates("somechannel", ["vid005"]) is None
+    assert database.get_watermark("somechannel").last_video_id == "vid003"
+
+
+
+def test_uncommitted_channels_only_scan_their_first_page(database):
+    """A channel whose first scan stored nothing is scanned again like a new one, not walked to the end"""
+    monitor = YoutubeMonitor(config={}, database=database)
+    channel = [f"vid{i:03d}" for i in range(30, 0, -1)]
+    database.set_feed_state("somechannel", channel_id="UCsomechannel")  # learned by the first scan
+
+    calls = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        assert monitor.check_updates("somechannel", max_results=5) == channel[:5]
+    assert calls == [(1, 5)]
+
+FEED_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+ <title>Some Channel</title>
+ <yt:channelId>UCsomechannel</yt:channelId>
+{entries}
+</feed>
+"""
+FEED_ENTRY = """ <entry>
+  <id>yt:video:{video_id}</id>
+  <yt:videoId>{video_id}</yt:videoId>
+  <published>2025-01-01T00:00:00+00:00</published>
+ </entry>"""
+
+
+@pytest.fixture
+def feed_server():
+    """Local stand-in for the YouTube feed endpoint serving the feed in `server.feed` with an ETag"""
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class FeedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.requests.append(dict(self.headers))
+            etag = f'"{hash(server.feed)}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = server.feed.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/atom+xml')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.requests = []
+    server.set_feed = lambda ids: setattr(server, 'feed', FEED_TEMPLATE.format(
+        entries="\n".join(FEED_ENTRY.format(video_id=vid) for vid in ids)
+    ))
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/feeds/videos.xml?channel_id={{channel_id}}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def test_probe_feed_conditional_request(feed_server):
+    """The feed is re-fetched conditionally and parsing stops at the last seen video"""
+    monitor = YoutubeMonitor(config={'youtube': {'feed_url': feed_server.url}})
+    feed_server.set_feed(["new2", "new1", "old1", "old0"])
+
+    state = monitor.probe_feed("UCsomechannel", last_video_id="old1")
+    assert state['new_video_ids'] == ["new2", "new1"]
+    assert state['etag']
+
+    unchanged = monitor.probe_feed("UCsomechannel", last_video_id="new2", etag=state['etag'])
+    assert unchanged['new_video_ids'] == []
+    assert feed_server.requests[-1]['If-None-Match'] == state['etag']
+
+
+def test_check_updates_skips_listing_when_feed_is_quiet(feed_server, database):
+    """yt-dlp only runs when the feed shows new items"""
+    config = {'youtube': {
+        'feed_url': feed_server.url,
+        'channels': [{'channel_handle': '@somechannel', 'channel_id': 'UCsomechannel'}]
+    }}
+    monitor = YoutubeMonitor(config=config, database=database)
+    channel = ["vid003", "vid002", "vid001"]
+    database.set_watermark("somechannel", "vid002")
+
+    feed_server.set_feed(channel)
+    calls = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        assert monitor.check_updates("@somechannel", max_results=5) == ["vid003"]
+    assert len(calls) == 1
+    monitor.commit_updates("@somechannel", ["vid003"])
+
+    # the feed has not changed: answered with 304 and no yt-dlp extraction
+    calls = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        assert monitor.check_updates("@somechannel", max_results=5) == []
+    assert calls == []
+    assert 'If-None-Match' in feed_server.requests[-1]
+
+    # the feed changed without new videos, e.g. view counts: its new ETag is kept for the next probe
+    feed_server.set_feed(channel)
+    feed_server.feed = feed_server.feed.replace("Some Channel", "Some Channel ")
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=fake_channel_ydl(channel, calls)):
+        assert monitor.check_updates("@somechannel", max_results=5) == []
+        assert monitor.check_updates("@somechannel", max_results=5) == []
+    assert calls == []
+    assert database.get_watermark("somechannel").feed_etag == f'"{hash(feed_server.feed)}"'
+    assert feed_server.requests[-1]['If-None-Match'] == f'"{hash(feed_server.feed)}"'
+
+
+def test_video_info_is_cached_and_coalesced():
+    """Concurrent lookups of one video share a single extraction, later lookups hit the cache"""
+    import asyncio
+    import threading
+    import time
+
+    calls = []
+    def slow_ydl(ydl_opts):
+        mock = MagicMock()
+        mock.__enter__.return_value = mock
+        mock.__exit__.return_value = None
+        def extract_info(url, download=False):
+            calls.append(url)
+            time.sleep(0.2)
+            return {'title': 'Some title', 'uploader': 'Some channel', 'upload_date': '20250101'}
+        mock.extract_info.side_effect = extract_info
+        return mock
+
+    monitor = YoutubeMonitor(config={})
+    results = []
+    with patch('yourtube.monitor.yt_dlp.YoutubeDL', side_effect=slow_ydl):
+        threads = [threading.Thread(target=lambda: results.append(monitor.get_video_info("abc123"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cached = asyncio.run(monitor.get_video_info_async("abc123"))
+
+    assert len(calls) == 1
+    assert all(result['title'] == 'Some title' for result in results)
+    assert cached == results[0]
+
+
+@pytest.mark.parametrize("subtitles, expect_media", [({'en': [{'ext': 'vtt'}]}, False), ({}, True)])
+def test_download_processes_extracted_info_once(tmp_path, subtitles, expect_media):
+    """Subtitles vs. media is decided from the extracted info, with one download pass per video"""
+    monitor = YoutubeMonitor(config={'youtube': {'channels': []}, 'default_lang': 'en'})
+    monitor._default_path = str(tmp_path)
+    info = {'id': 'abc123', 'title': 'Some title', 'channel': 'Some channel', 'channel_id': 'UC1',
+            'upload_date': '20250101', 'subtitles': subtitles, 'language': 'en'}
+
+    def fake_download(path, video_id, video=False, info=None, **kwargs):
+        if not video:
+            (tmp_path / f"{video_id}.en.srt").write_text("1\n00:00:00,000 --> 00:00:01,000\nhello\n")
+        return info
+
+    with patch.object(monitor, 'extract_video_info', return_value=info) as mock_extract, \
+         patch('yourtube.monitor.download_youtube_video', side_effect=fake_download) as mock_download:
+        video = monitor.download('abc123')
+
+    mock_extract.assert_called_once_with('abc123')
+    mock_download.assert_called_once()
+    assert mock_download.call_args.kwargs['video'] is expect_media
+    assert mock_download.call_args.kwargs['info'] is info
+    assert video.transcript is (not expect_media)
+
+
+def test_download_audio_16k_picks_smallest_adequate_stream(tmp_path):
+    """The smallest audio-only stream above the bitrate floor is transcoded to 16kHz mono"""
+    from yourtube.utils import download_audio_16k, SOCKET_TIMEOUT
+
+    info = {'id': 'abc123', 'duration': 600, 'formats': [
+        {'format_id': '139', 'url': 'https://a/139', 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 32, 'filesize': 2_000_000},
+        {'format_id': '249', 'url': 'https://a/249', 'vcodec': 'none', 'acodec': 'opus', 'abr': 50, 'filesize': 3_000_000},
+        {'format_id': '251', 'url': 'https://a/251', 'vcodec': 'none', 'acodec': 'opus', 'abr': 130, 'filesize': 9_000_000},
+        {'format_id': '160', 'url': 'https://a/160', 'vcodec': 'avc1', 'acodec': 'none', 'filesize': 5_000_000},
+        {'format_id': '18', 'url': 'https://a/18', 'vcodec': 'avc1', 'acodec': 'mp4a', 'filesize': 30_000_000},
+    ]}
+    with patch('yourtube.utils.ffmpeg') as mock_ffmpeg:
+        process = mock_ffmpeg.input.return_value.output.return_value.run_async.return_value
+        process.communicate.return_value = (b'', b'')
+        process.returncode = 0
+        stats = download_audio_16k(info, str(tmp_path / 'abc123.wav'))
+
+    mock_ffmpeg.input.assert_called_once_with('https://a/249', rw_timeout=SOCKET_TIMEOUT * 1_000_000)
+    output_kwargs = mock_ffmpeg.input.return_value.output.call_args.kwargs
+    assert output_kwargs['ar'] == '16000' and output_kwargs['ac'] == 1
+    assert stats['format_id'] == '249'
+    assert stats['bytes_saved'] == 5_000_000 + 9_000_000 - 3_000_000
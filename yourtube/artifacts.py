@@ -0,0 +1,106 @@
+import hashlib
+import os
+from importlib.metadata import version, PackageNotFoundError
+
+# kind -> file name in the download directory, formatted with the video_id and language
+ARTIFACT_NAMES = {
+    'info': "{video_id}.info.json",
+    'media': "{video_id}.mp4",
+    'audio': "{video_id}.wav",
+    'subtitles': "{video_id}.{language}.vtt",
+    'transcript': "{video_id}.{language}.srt",
+    'fulltext': "{video_id}.{language}.txt",
+    'processed': "{video_id}.{language}.processed.txt",
+    'summary': "{video_id}.{language}.md",
+}
+
+# large binary kinds recorded without a checksum: hashing them would read hundreds of MB every time
+# they are recorded, and nothing compares their content
+UNHASHED_KINDS = {'media', 'audio'}
+# seconds a file must be older than its recorded row to keep its checksum, for filesystems with coarse timestamps
+MTIME_RESOLUTION = 2
+
+# kinds named without a language, by the rest of the file name after the video_id
+_PLAIN_SUFFIXES = {'info.json': 'info', 'mp4': 'media', 'wav': 'audio'}
+# kinds named with a language, by the end of the file name after the language
+_LANGUAGE_SUFFIXES = {'processed.txt': 'processed', 'vtt': 'subtitles', 'srt': 'transcript', 'txt': 'fulltext', 'md': 'summary'}
+
+
+def artifact_name(video_id, kind, language=None):
+    """File name of an artifact of a video in the download directory"""
+    return ARTIFACT_NAMES[kind].format(video_id=video_id, language=language)
+
+
+def classify_artifact(file_name):
+    """
+    Tell what a file in the download directory is from its name.
+
+    Args:
+        file_name (str): e.g. 'dQw4w9WgXcQ.en.processed.txt'
+
+    Returns:
+        tuple: (video_id, kind, language), kind 'other' for files the pipeline doesn't produce
+    """
+    video_id, _, rest = file_name.partition('.')
+    if rest in _PLAIN_SUFFIXES:
+        return video_id, _PLAIN_SUFFIXES[rest], None
+    language, _, suffix = rest.partition('.')
+    if suffix in _LANGUAGE_SUFFIXES:
+        return video_id, _LANGUAGE_SUFFIXES[suffix], language
+    return video_id, 'other', None
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe_artifact(path, recorded=None):
+    """
+    Columns of the artifact row for a file, None if the file doesn't exist.
+
+    Media and audio get no checksum. Other files keep the checksum of their recorded row
+    while their size is the same and they were last modified well before it was recorded,
+    so only new or changed files are read.
+
+    Args:
+        path (str): The file
+        recorded (tuple, optional): (size, checksum, updated_at) of the row recorded for the file
+
+    Returns:
+        dict: video_id, kind, language, path (the file name), size and checksum
+    """
+    file_name = os.path.basename(path)
+    video_id, kind, language = classify_artifact(file_name)
+    try:
+        stat = os.stat(path)
+        if kind in UNHASHED_KINDS:
+            checksum = None
+        elif recorded is not None and recorded[1] and recorded[2] and recorded[0] == stat.st_size \
+                and stat.st_mtime < recorded[2].timestamp() - MTIME_RESOLUTION:
+            checksum = recorded[1]
+        else:
+            checksum = file_checksum(path)
+    except OSError:
+        return None
+    return {
+        'video_id': video_id,
+        'kind': kind,
+        'language': language,
+        'path': file_name,
+        'size': stat.st_size,
+        'checksum': checksum
+    }
+
+
+def producer_version(step):
+    """Producer of an artifact, e.g. 'whisper-small@1.3.3', to tell which version of a step wrote it"""
+    try:
+        package_version = version("video-curator")
+    except PackageNotFoundError:
+        package_version = "dev"
+    return f"{step}@{package_version}"
@@ -1,111 +1,726 @@
+import functools
+import heapq
+import itertools
+import json
 import logging
-from queue import Queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from queue import Queue, Full
 import threading
 import time
+from yourtube.progress import progress_bus
+from yourtube.utils import TTLCache, kill_processes
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
+STOP = object()  # Sentinel telling a stage worker to exit
+
+# Task priorities, lower runs first
+PRIORITY_INTERACTIVE = 0  # URLs submitted through the API
+PRIORITY_SCHEDULED = 1  # Videos found by scheduled monitor pulls
+PRIORITY_BACKFILL = 2  # Bulk backfills of whole channels
+PRIORITIES = {
+    'interactive': PRIORITY_INTERACTIVE,
+    'scheduled': PRIORITY_SCHEDULED,
+    'backfill': PRIORITY_BACKFILL
+}
+
+
+class JobCancelled(BaseException):
+    """Raised at a safe point of a stage once its video was cancelled.
+
+    Like asyncio.CancelledError it derives from BaseException, so the `except Exception`
+    blocks inside the stages let it through to the worker loop.
+    """
+
+
+class StageQueue(Queue):
+    """Queue in front of a pipeline stage; producers and consumers block on its condition variables.
+
+    Tasks are served by `priority` first. Within a priority level, channels share the
+    stage by weighted fair queuing: every task gets a virtual finish time that grows by
+    1/weight per task of its channel, so a 300 video backfill of one channel interleaves
+    with other channels instead of blocking them. Tasks without channel or priority are
+    served first-in first-out.
+
+    `stop` wakes everyone up: consumers receive the STOP sentinel ahead of any remaining
+    task and producers waiting for room give up instead of blocking forever.
+    """
+    def __init__(self, maxsize=0, weights=None):
+        super().__init__(maxsize=maxsize)
+        self.weights = weights or {}  # channel_id -> weight, 1 by default
+        self.stopped = False
+
+    def _init(self, maxsize):
+        self.queue = []  # heap of (priority, finish, seq, start, task)
+        self._sentinels = 0
+        self._seq = itertools.count()
+        self._virtual_time = {}  # priority -> start time of the task served last
+        self._last_finish = {}  # (priority, channel_id) -> finish time of the channel's last task
+        self._keys = {}  # video_id -> (priority, finish, seq) of its queued task
+
+    def _qsize(self):
+        return len(self.queue) + self._sentinels
+
+    def _put(self, task):
+        priority = task.get('priority', PRIORITY_INTERACTIVE)
+        channel_id = task.get('channel_id')
+        start = max(self._virtual_time.get(priority, 0), self._last_finish.get((priority, channel_id), 0))
+        finish = start + 1 / self.weights.get(channel_id, 1)
+        self._last_finish[(priority, channel_id)] = finish
+        seq = next(self._seq)
+        self._keys[task.get('video_id')] = (priority, finish, seq)
+        heapq.heappush(self.queue, (priority, finish, seq, start, task))
+
+    def _get(self):
+        if self._sentinels:
+            self._sentinels -= 1
+            return STOP
+        priority, _, _, start, task = heapq.heappop(self.queue)
+        self._virtual_time[priority] = start
+        self._keys.pop(task.get('video_id'), None)
+        return task
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Add an item, waiting while the queue is full like `queue.Queue.put`.
+
+        Returns:
+            bool: False if the queue was stopped
+
+        Raises:
+            queue.Full: If the queue is still full without `block`, or after `timeout` seconds
+        """
+        if block and timeout is not None and timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        with self.not_full:
+            deadline = time.monotonic() + timeout if block and timeout is not None else None
+            while 0 < self.maxsize <= self._qsize() and not self.stopped:
+                if not block:
+                    raise Full
+                if deadline is None:
+                    self.not_full.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Full
+                    self.not_full.wait(remaining)
+            if self.stopped:
+                return False
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+            return True
+
+    def remove(self, video_id):
+        """Take the task of a video out of the queue. Returns False if it is not queued"""
+        with self.mutex:
+            key = self._keys.pop(video_id, None)
+            if key is None:
+                return False
+            self.queue = [entry for entry in self.queue if entry[:3] != key]
+            heapq.heapify(self.queue)
+            self.unfinished_tasks -= 1
+            if self.unfinished_tasks == 0:
+                self.all_tasks_done.notify_all()
+            self.not_full.notify()
+            return True
+
+    def position(self, video_id):
+        """Number of queued tasks that will be served before the task of `video_id`, None if it is not queued"""
+        with self.mutex:
+            key = self._keys.get(video_id)
+            if key is None:
+                return None
+            return sum(1 for entry in self.queue if entry[:3] < key)
+
+    def stop(self, consumers=1):
+        """Hand one STOP sentinel to each consumer and release waiting producers"""
+        with self.mutex:
+            self.stopped = True
+            self._sentinels += consumers
+            self.unfinished_tasks += consumers
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def reopen(self):
+        """Drop leftover sentinels so the queue can feed a restarted worker"""
+        with self.mutex:
+            self.stopped = False
+            self.unfinished_tasks -= self._sentinels
+            self._sentinels = 0
+
+
+class Stage:
+    """One step of the processing pipeline, with the bounded queue in front of it and its own worker pool.
+
+    `func` takes the task dict, may add to it for later stages, and returns False when the
+    task is finished early and the remaining stages must be skipped. A task that runs longer
+    than `timeout` seconds is given up by the watchdog of the pipeline.
+    """
+    def __init__(self, name, func, workers=1, maxsize=0, timeout=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.timeout = timeout
+        self.queue = StageQueue(maxsize=maxsize)
+        self.threads = []
+        self.avg_duration = None  # moving average of the time one task spends in the stage, in seconds
+        self.overruns = 0  # tasks given up for running past the timeout
+        self.overrun_seconds = 0.0  # time those tasks had been running when they were given up
+
+    def __repr__(self):
+        return f"<Stage(name='{self.name}', workers={self.workers}, queued={self.queue.qsize()})>"
+
+    def record_duration(self, seconds):
+        """Fold the duration of one task into the moving average"""
+        self.avg_duration = seconds if self.avg_duration is None else 0.8 * self.avg_duration + 0.2 * seconds
+
+    def record_overrun(self, seconds):
+        """Count a task given up after running `seconds` past its start"""
+        self.overruns += 1
+        self.overrun_seconds += seconds
+
+
+@contextmanager
+def stage_deadline(name, timeout):
+    """
+    Run a stage outside the worker pool under a time budget: once the budget is spent the
+    subprocesses the stage started are killed, and a TimeoutError is raised when it returns.
+    Work done in this process, e.g. a yt-dlp extraction or an LLM request, can't be stopped
+    and only ends at its own socket or request timeout.
+
+    Args:
+        name (str): Name of the stage, for the error message
+        timeout (float): Budget in seconds, None for no limit
+    """
+    if not timeout:
+        yield
+        return
+    thread_id = threading.get_ident()
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        kill_processes(thread_id)
+
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
+    if expired.is_set():
+        raise TimeoutError(f"Stage {name} overran its budget of {timeout}s")
+
+
 class VideoProcessingQueue:
-    def __init__(self):
-        self.queue = Queue()
+    def __init__(self, status_ttl=86400, status_maxsize=10000):
+        self.queue = StageQueue()  # Entry queue in front of the first stage
+        self.stages = []
         self.processing_videos = set()  # Set of video_ids currently being processed
+        self._cancelled = set()  # Running video_ids to interrupt at the next safe point
+        self._running = {}  # thread id -> the stage execution it is running, checked by the watchdog
+        self._abandoned = set()  # ids of threads the watchdog gave up on and replaced
+        self._watchdog_thread = None
+        self.watchdog_interval = 1  # Seconds between two deadline checks
+        self.max_attempts = 3  # Runs of a task in a stage before overruns fail it, without a job store
         self.worker_thread = None
         self.running = False
-        self.status_dict = {}  # Dictionary to store status of each video: 'queued', 'processing', 'completed', 'error'
-        self.queued_tasks = []  # List to track tasks in the queue
-        
-
-    def start_worker(self, process_func, logger=None):
-        """Start the worker thread if not already running"""
-        if self.worker_thread is None or not self.worker_thread.is_alive():
-            self.running = True
-            self.worker_thread = threading.Thread(target=self._worker_loop, args=(process_func,))
-            self.worker_thread.daemon = True  # Make thread a daemon so it exits when main program exits
-            self.worker_thread.start()
-            self.logger = logger if logger else logging.getLogger("API self.logger")
-            self.logger.info("Video processing worker started")
+        # Status of each recent video: 'queued', 'processing', 'completed', 'error' or 'cancelled'
+        self.status_dict = TTLCache(ttl=status_ttl, maxsize=status_maxsize)
+        self.stage_dict = {}  # Dictionary to store the pipeline stage each video is in
+        self.queued_tasks = OrderedDict()  # Tasks waiting for the first stage, keyed by video_id
+        self._last_task = None  # Most recently added task, the only one flagged is_last
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("API self.logger")
+        self.job_store = None  # Optional JobStore persisting every task
+        self.context = {}  # Shared objects (database, monitor, ...) added to every task but never persisted
+        self._heartbeat_thread = None
+        self._pull_thread = None
+        self.on_idle = None  # Called without arguments whenever the last video leaves the pipeline
+        self.pull = False  # Whether tasks are claimed from a job store shared with other workers
+        self._stop_event = threading.Event()
+
+
+    def attach(self, job_store, logger=None):
+        """
+        Only enqueue into a job store shared with standalone workers, without processing
+        anything in this process. Statuses and queue positions are read back from the store.
+        """
+        self.logger = logger if logger else logging.getLogger("API self.logger")
+        self.job_store = job_store
+
+    def start_worker(self, process_func=None, logger=None, stages=None, job_store=None, context=None,
+                     channel_weights=None, pull=False, poll_interval=2, on_idle=None):
+        """Start the worker threads if not already running.
+
+        Args:
+            process_func (callable, optional): Process a whole task in one step, called as `process_func(**task)`
+            logger (logging.Logger, optional): Logger to report to
+            stages (list[Stage], optional): Pipeline stages, each with its own queue and worker pool
+            job_store (JobStore, optional): Persist tasks so they resume after a restart
+            context (dict, optional): Shared objects added to every task, e.g. the database and monitor
+            channel_weights (dict, optional): Share of each channel_id within a priority level, 1 by default
+            pull (bool, optional): Claim jobs from `job_store` as the pipeline has room, for a fleet of workers sharing it
+            poll_interval (float, optional): Seconds to wait before looking again when the shared queue is empty
+            on_idle (callable, optional): Called whenever the last video leaves the pipeline, e.g. to queue optional work
+        """
+        if self.running and any(thread.is_alive() for stage in self.stages for thread in stage.threads):
+            return
+        self.logger = logger if logger else logging.getLogger("API self.logger")
+        self.job_store = job_store
+        self.context = context or {}
+        self.pull = pull and job_store is not None
+        self.on_idle = on_idle
+        if stages is None:
+            stages = [Stage("process", lambda task: process_func(**task))]
+
+        self.stages = stages
+        self.stages[0].queue = self.queue  # tasks enter the pipeline through the unbounded entry queue
+        # when pulling, claim no more jobs than the first stage can start, the rest stays available to other workers
+        self.queue.maxsize = self.stages[0].workers if self.pull else 0
+        for stage in self.stages:
+            stage.queue.reopen()
+            stage.queue.weights = channel_weights or {}
+        self._stop_event.clear()
+        self.running = True
+        for index, stage in enumerate(self.stages):
+            stage.threads = [self._start_stage_thread(index, n) for n in range(stage.workers)]
+        self.worker_thread = self.stages[0].threads[0]
+        self.logger.info(f"Video processing worker started with stages: {self.stages}")
+
+        if any(stage.timeout for stage in self.stages):
+            self._watchdog_thread = threading.Thread(target=self._watchdog_loop, name="watchdog", daemon=True)
+            self._watchdog_thread.start()
+        if self.pull:
+            self._pull_thread = threading.Thread(target=self._pull_loop, args=(poll_interval,), name="pull", daemon=True)
+            self._pull_thread.start()
+        elif self.job_store is not None:
+            self._resume(self.job_store.recover(include_queued=True))
+        if self.job_store is not None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True)
+            self._heartbeat_thread.start()
+
+    def _start_stage_thread(self, index, n):
+        """Start a worker thread for the stage at `index`"""
+        thread = threading.Thread(target=self._stage_loop, args=(index,), name=f"{self.stages[index].name}-{n}")
+        thread.daemon = True  # Make thread a daemon so it exits when main program exits
+        thread.start()
+        return thread
+
+    def _resume(self, jobs, claimed=False):
+        """Put recovered or claimed jobs back into the pipeline, right after the last stage they completed"""
+        stage_names = [stage.name for stage in self.stages]
+        for job in jobs:
+            task = {**self.context, **(job.state or {}), 'video_id': job.video_id, 'job_id': job.id}
+            if claimed:
+                task['is_last'] = False  # a fleet worker keeps its model loaded for the next job
+            index = stage_names.index(job.stage) + 1 if job.stage in stage_names else 0
+            if index >= len(self.stages):
+                self.job_store.finish(job.id, 'completed')
+                continue
+            if claimed or index > 0:
+                if not claimed:
+                    # already past the first stage, so the attempt is counted here
+                    self.job_store.claim(job.id)
+                with self._lock:
+                    self.processing_videos.add(job.video_id)
+                self._set_status(job.video_id, 'processing')
+            else:
+                self.queued_tasks[job.video_id] = task
+                self._set_status(job.video_id, 'queued')
+            self.logger.info(f"Resuming video {job.video_id} at stage {self.stages[index].name}")
+            self._put(self.stages[index], task)
+
+    def _heartbeat_loop(self):
+        """Renew the leases of running jobs and take over jobs whose worker went away"""
+        interval = max(self.job_store.lease_seconds / 3, 0.1)
+        while not self._stop_event.wait(interval):
+            try:
+                self.job_store.heartbeat()
+                for video_id in self.job_store.cancel_requested():
+                    with self._lock:
+                        if video_id in self.processing_videos:
+                            self._cancelled.add(video_id)
+                if not self.pull:  # pulling workers take over expired jobs through claim_next
+                    self._resume(self.job_store.recover())
+            except Exception as e:
+                self.logger.error(f"Error in heartbeat loop: {str(e)}")
+
+    def _watchdog_loop(self):
+        """Give up on stage executions that overran their stage's timeout"""
+        while not self._stop_event.wait(self.watchdog_interval):
+            try:
+                self.check_deadlines()
+            except Exception as e:
+                self.logger.error(f"Error in watchdog: {str(e)}")
+
+    def check_deadlines(self):
+        """
+        Give up on every stage execution past its stage's timeout: kill the subprocesses its
+        thread started, put a replacement worker on the stage, and retry the task from the
+        stage it overran. With a job store the job is released, so it is recovered like the
+        job of a crashed worker; without one the task is queued again in memory. Either way
+        it fails once `max_attempts` runs are used up.
+
+        Only subprocesses started through `run_ffmpeg` can be killed. Work done in this
+        process, e.g. Whisper decoding, a yt-dlp extraction or an LLM request, can't be
+        interrupted: the abandoned thread keeps running until its next safe point
+        (`report_progress`), or until a stalled download or request hits its own socket or
+        request timeout, and then drops whatever it produced.
+        """
+        now = time.monotonic()
+        with self._lock:
+            overdue = [(thread_id, execution) for thread_id, execution in self._running.items()
+                       if execution['deadline'] is not None and execution['deadline'] < now]
+            for thread_id, _ in overdue:
+                del self._running[thread_id]
+                self._abandoned.add(thread_id)
+
+        for thread_id, execution in overdue:
+            index, task = execution['index'], execution['task']
+            stage, video_id = self.stages[index], task.get('video_id')
+            stage.record_overrun(now - execution['started'])
+            killed = kill_processes(thread_id)
+            self.logger.error(
+                f"Video {video_id} overran the {stage.timeout}s budget of stage {stage.name}, "
+                f"killed {killed} subprocesses and replaced the worker"
+            )
+            stage.threads = [thread for thread in stage.threads if thread.ident != thread_id]
+            stage.threads.append(self._start_stage_thread(index, len(stage.threads)))
+
+            # a copy: the abandoned thread may still write to the task it is running
+            retry = dict(task, overruns=task.get('overruns', 0) + 1)
+            if self.job_store is None and retry['overruns'] < self.max_attempts:
+                # the video stays in the pipeline, queued again in front of the stage it overran
+                self._set_status(video_id, 'queued', stage=stage.name)
+                threading.Thread(target=self._put, args=(stage, retry), name=f"retry-{video_id}", daemon=True).start()
+                continue
+            with self._lock:
+                self.processing_videos.discard(video_id)
+            self.stage_dict.pop(video_id, None)
+            if self.job_store is not None:
+                self.job_store.release(task['job_id'])
+                self._set_status(video_id, 'queued', stage=stage.name)
+            else:
+                self._set_status(video_id, 'error', stage=stage.name)
+
+    def _pull_loop(self, poll_interval):
+        """Claim jobs from the shared job store whenever the first stage has room for them"""
+        while not self._stop_event.is_set():
+            try:
+                job = self.job_store.claim_next()
+            except Exception as e:
+                self.logger.error(f"Error claiming a job: {str(e)}")
+                job = None
+            if job is None:
+                self._stop_event.wait(poll_interval)
+                continue
+            self._resume([job], claimed=True)  # blocks while the first stage is busy
+
+    def _persistent_state(self, task):
+        """The part of a task that is stored with its job: everything JSON serializable outside the context"""
+        state = {}
+        for key, value in task.items():
+            if key in self.context or key == 'job_id':
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            state[key] = value
+        return state
 
     def stop_worker(self):
-        """Stop the worker thread"""
+        """Stop the worker threads. Each worker gets a STOP sentinel, tasks still waiting stay queued."""
         self.running = False
-        if self.worker_thread and self.worker_thread.is_alive():
-            self.worker_thread.join(timeout=5)
-            self.logger.info("Video processing worker stopped")
+        self._stop_event.set()
+        for stage in self.stages:
+            stage.queue.stop(consumers=len(stage.threads))
+        for thread in [self._pull_thread, self._watchdog_thread] + [thread for stage in self.stages for thread in stage.threads]:
+            if thread is not None and thread.is_alive():
+                thread.join(timeout=5)
+        self.logger.info("Video processing worker stopped")
 
-    def _worker_loop(self, process_func):
-        """Worker loop that processes videos from the queue"""
-        while self.running:
+    def _stage_loop(self, index):
+        """Worker loop that takes tasks from the queue of one stage and hands them on to the next"""
+        stage = self.stages[index]
+        while True:
             try:
-                if not self.queue.empty():
-                    # Get task from queue
-                    task = self.queue.get()
-                    video_id = task.get('video_id')
-                    
-                    # Remove from queued_tasks list
-                    self.queued_tasks = [t for t in self.queued_tasks if t.get('video_id') != video_id]
-                    
-                    # Update status
-                    self.status_dict[video_id] = 'processing'
-                    self.processing_videos.add(video_id)
-                    
-                    self.logger.info(f"Processing video {video_id}")
-                    
-                    try:
-                        # Process the video
-                        process_func(**task)
-                        # Update status on success
-                        self.status_dict[video_id] = 'completed'
-                    except Exception as e:
-                        # Update status on error
-                        self.status_dict[video_id] = 'error'
-                        self.logger.error(f"Error processing video {video_id}: {str(e)}")
-                    
-                    # Remove from processing set
-                    self.processing_videos.remove(video_id)
-                    self.queue.task_done()
+                task = stage.queue.get()  # blocks until there is work or the worker is stopped
+                if task is STOP:
+                    stage.queue.task_done()
+                    break
+                video_id = task.get('video_id')
+
+                if index == 0:
+                    # Remove from queued_tasks
+                    self.queued_tasks.pop(video_id, None)
+                    with self._lock:
+                        self.processing_videos.add(video_id)
+                    if self.job_store is not None and not self.pull:
+                        self.job_store.claim(task['job_id'])
+
+                # Update status
+                self.stage_dict[video_id] = stage.name
+                self._set_status(video_id, 'processing', stage=stage.name)
+                self.logger.info(f"Processing video {video_id}: {stage.name}")
+
+                # stages report e.g. transcribed frames or processed chunks as `report_progress(done=, total=, unit=)`,
+                # which is also where a cancelled video is interrupted
+                task['report_progress'] = functools.partial(self._report_progress, video_id)
+                started = time.monotonic()
+                thread_id = threading.get_ident()
+                with self._lock:
+                    self._running[thread_id] = {
+                        'index': index,
+                        'task': task,
+                        'started': started,
+                        'deadline': started + stage.timeout if stage.timeout else None
+                    }
+                result, error = None, None
+                try:
+                    if video_id in self._cancelled:
+                        raise JobCancelled(video_id)
+                    result = stage.func(task)
+                except (Exception, JobCancelled) as e:
+                    error = e
+                finally:
+                    stage.queue.task_done()
+                    with self._lock:
+                        self._running.pop(thread_id, None)
+                        abandoned = thread_id in self._abandoned
+                        self._abandoned.discard(thread_id)
+
+                if abandoned:
+                    # the watchdog gave up on this execution and another worker took our place
+                    self.logger.info(f"Abandoned worker of stage {stage.name} is done with video {video_id}, exiting")
+                    break
+                if isinstance(error, JobCancelled):
+                    self._set_status(video_id, 'cancelled', stage=stage.name)
+                    self.logger.info(f"Cancelled video {video_id} in stage {stage.name}")
+                    self._finish(task, 'cancelled')
+                    continue
+                if error is not None:
+                    # Update status on error
+                    self._set_status(video_id, 'error', stage=stage.name)
+                    self.logger.error(f"Error processing video {video_id} in stage {stage.name}: {str(error)}")
+                    self._finish(task, 'error')
+                    continue
+                stage.record_duration(time.monotonic() - started)
+
+                if result is False or index == len(self.stages) - 1:
+                    # Update status on success
+                    self._set_status(video_id, 'completed')
+                    self._finish(task, 'completed')
                 else:
-                    # Sleep a bit to avoid busy waiting
-                    time.sleep(0.5)
+                    if self.job_store is not None and \
+                            not self.job_store.complete_stage(task['job_id'], stage.name, self._persistent_state(task)):
+                        # the lease ran out and another worker took the job over
+                        self.logger.warning(f"Lost the lease on video {video_id}, dropping it after stage {stage.name}")
+                        self._finish(task, 'error')
+                        continue
+                    self._put(self.stages[index + 1], task)
             except Exception as e:
                 self.logger.error(f"Error in worker loop: {str(e)}")
                 time.sleep(1)  # Sleep to avoid rapid error loops
 
+    def _report_progress(self, video_id, **progress):
+        """Publish the progress a stage reports, interrupting the stage there if its video was cancelled or abandoned"""
+        if video_id in self._cancelled or threading.get_ident() in self._abandoned:
+            raise JobCancelled(video_id)
+        progress_bus.publish(video_id, **progress)
+
+    def _set_status(self, video_id, status, stage=None):
+        """Record the status of a video and publish it to progress subscribers"""
+        self.status_dict.set(video_id, status)
+        progress_bus.publish(video_id, status=status, stage=stage)
+
+    def _put(self, stage, task):
+        """Hand a task to a stage, waiting while its queue is full"""
+        if not stage.queue.put(task):
+            self.logger.info(f"Worker stopped before video {task.get('video_id')} reached stage {stage.name}")
+
+    def _finish(self, task, status):
+        """Remove a video that left the pipeline from the processing set and record its final status"""
+        video_id = task.get('video_id')
+        with self._lock:
+            self.processing_videos.discard(video_id)
+            self._cancelled.discard(video_id)
+            idle = not self.processing_videos and not self.get_queue_size()
+        self.stage_dict.pop(video_id, None)
+        if self.job_store is not None:
+            self.job_store.finish(task['job_id'], status)
+        if idle and self.on_idle is not None:
+            try:
+                self.on_idle()
+            except Exception as e:
+                self.logger.error(f"Error in idle callback: {str(e)}")
+
     def add_task(self, **kwargs):
         """Add a video processing task to the queue"""
         video_id = kwargs.get('video_id')
         if not video_id:
             raise ValueError("video_id is required")
-        
+
         # Check if video is already in queue or being processed
-        if video_id in self.processing_videos or video_id in self.status_dict and self.status_dict[video_id] in ['queued', 'processing']:
+        if video_id in self.processing_videos or self.get_status(video_id) in ['queued', 'processing']:
             self.logger.info(f"Video {video_id} is already in queue or being processed")
             return False
-        
-        # Update is_last flag for previous tasks
-        for task in self.queued_tasks:
-            if task.get('is_last', False):
-                task['is_last'] = False
-        
+
+        # Update is_last flag for the previous task, wherever it is in the pipeline
+        if self._last_task is not None:
+            self._last_task['is_last'] = False
+
         # Add to queue with is_last=True
-        kwargs['is_last'] = True
-        self.queued_tasks.append(kwargs)
-        self.status_dict[video_id] = 'queued'
+        kwargs = {**self.context, **kwargs, 'is_last': True}
+        kwargs['priority'] = PRIORITIES.get(kwargs.get('priority'), kwargs.get('priority', PRIORITY_INTERACTIVE))
+        if self.job_store is not None and (not self.running or self.pull):
+            # enqueue-only, or pulling: the job is run by whichever worker claims it from the shared store,
+            # this one included, so it must not also go on the local queue
+            self.job_store.enqueue(video_id, self._persistent_state(kwargs))
+            progress_bus.publish(video_id, status='queued', stage=None)
+            self.logger.info(f"Added video {video_id} to the shared job queue")
+            return True
+        if self.job_store is not None:
+            kwargs['job_id'] = self.job_store.enqueue(video_id, self._persistent_state(kwargs))
+        self._last_task = kwargs
+        self.queued_tasks[video_id] = kwargs
+        self._set_status(video_id, 'queued')
         self.queue.put(kwargs)
         self.logger.info(f"Added video {video_id} to processing queue")
         return True
 
+    def resume(self, job):
+        """
+        Put a queued job of the job store into the pipeline, e.g. one that was queued to run
+        later. Returns False if its video is already queued or being processed here.
+        """
+        with self._lock:
+            if job.video_id in self.processing_videos or job.video_id in self.queued_tasks:
+                return False
+        self._resume([job])
+        return True
+
+    def cancel(self, video_id):
+        """
+        Cancel a queued or running video. A queued video is dropped right away, a running
+        one stops at the next safe point of its stage: before each stage and whenever the
+        stage reports progress.
+
+        Returns:
+            bool: False if the video is neither queued nor running
+        """
+        cancelled = self.job_store.cancel(video_id) if self.job_store is not None else False
+        if self.queue.remove(video_id):
+            self.queued_tasks.pop(video_id, None)
+            self._set_status(video_id, 'cancelled')
+            self.logger.info(f"Cancelled queued video {video_id}")
+            return True
+        with self._lock:
+            running = video_id in self.processing_videos
+            if running:
+                self._cancelled.add(video_id)
+        if running:
+            self.logger.info(f"Cancelling video {video_id} at its next safe point")
+        # a job of a standalone worker stops once its heartbeat sees the cancelled job
+        return running or cancelled
+
     def get_status(self, video_id):
-        """Get the status of a video"""
-        return self.status_dict.get(video_id, None)
+        """Get the status of a video, from its most recent job if jobs are persisted"""
+        if self.job_store is not None:
+            return self.job_store.get_status(video_id)
+        status = self.status_dict.get(video_id)
+        if status is None:
+            # the status store only keeps recent entries, the pipeline knows the videos it holds
+            if video_id in self.queued_tasks:
+                return 'queued'
+            if video_id in self.processing_videos:
+                return 'processing'
+        return status
+
+    def get_position(self, video_id):
+        """Get the number of queued videos that will start before this one, None if it is not queued"""
+        if self.job_store is not None and not self.running:
+            return self.job_store.position(video_id)
+        return self.queue.position(video_id)
+
+    def get_estimated_start(self, video_id):
+        """
+        Estimate when a queued video will start processing. Backpressure from the bounded
+        stage queues lets videos in at the pace of the slowest stage, so the wait is the
+        queue position times the time that stage needs per video.
+
+        Returns:
+            datetime: Estimated start time, None if the video is not queued or no stage has been timed yet
+        """
+        position = self.queue.position(video_id)
+        wait = self.estimated_wait(position) if position is not None else None
+        return datetime.now() + timedelta(seconds=wait) if wait is not None else None
+
+    def estimated_wait(self, position):
+        """Seconds until the video at `position` of the entry queue starts, None if no stage has been timed yet"""
+        timed = [stage.avg_duration / stage.workers for stage in self.stages if stage.avg_duration is not None]
+        return position * max(timed) if timed else None
+
+    def check_admission(self, max_queue_depth=None, max_wait_seconds=None):
+        """
+        Decide whether one more video may be queued, given limits on the number of queued
+        videos and on the estimated wait before a new video starts.
+
+        Returns:
+            int: Seconds after which a retry is likely to be admitted, None if the video is admitted
+        """
+        depth = self.get_queue_size()
+        per_video = self.estimated_wait(1)
+        retry_after = []
+        if max_queue_depth is not None and depth >= max_queue_depth:
+            retry_after.append((depth - max_queue_depth + 1) * per_video if per_video else 60)
+        wait = self.estimated_wait(depth)
+        if max_wait_seconds is not None and wait is not None and wait > max_wait_seconds:
+            retry_after.append(wait - max_wait_seconds)
+        return max(1, round(max(retry_after))) if retry_after else None
+
+    def get_stage(self, video_id):
+        """Get the pipeline stage a video is in, None if it is not being processed"""
+        return self.stage_dict.get(video_id, None)
+
+    def get_backlog(self, stage_name):
+        """Get the number of videos waiting for a stage: queued for it or in any stage before it"""
+        names = [stage.name for stage in self.stages]
+        if stage_name not in names:
+            return self.get_queue_size()
+        index = names.index(stage_name)
+        waiting = sum(stage.queue.qsize() for stage in self.stages[:index + 1])
+        return waiting + sum(1 for name in list(self.stage_dict.values()) if name in names[:index])
 
     def get_queue_size(self):
         """Get the current queue size"""
-        return self.queue.qsize()
+        if self.job_store is not None and not self.running:
+            return self.job_store.count('queued')
+        return sum(stage.queue.qsize() for stage in self.stages) if self.stages else self.queue.qsize()
+
+    def get_metrics(self):
+        """Get per-stage metrics: workers, queued videos, average duration, timeout and overruns"""
+        return {
+            stage.name: {
+                'workers': stage.workers,
+                'queued': stage.queue.qsize(),
+                'avg_duration': stage.avg_duration,
+                'timeout': stage.timeout,
+                'overruns': stage.overruns,
+                'overrun_seconds': round(stage.overrun_seconds, 1)
+            }
+            for stage in self.stages
+        }
 
     def get_processing_count(self):
         """Get the number of videos currently being processed"""
         return len(self.processing_videos)
 
 # Create a global instance of the queue
-video_queue = VideoProcessingQueue() 
\ No newline at end of file
+video_queue = VideoProcessingQueue()
@@ -0,0 +1,151 @@
+"""zstd-compressed bodies of text artifacts, stored in the video database.
+
+With `storage.compress_artifacts` enabled, every text artifact a step records is also
+stored compressed in the `artifact_blobs` table, keyed by its file name, so reading it
+back is one primary key lookup and the whole library is backed up with the database
+file. `python -m yourtube.blobs` stores the texts already in the download directory, and
+with `--delete-files` removes the loose files once their copy is verified. Artifacts whose
+body is in the database stay recorded when their file is gone.
+"""
+import argparse
+import hashlib
+import os
+import zstandard
+from datetime import datetime
+from sqlalchemy import text, bindparam
+from yourtube.utils import get_download_dir
+
+# kinds of artifacts whose body can be stored in the database, the media stays in files
+BLOB_KINDS = ('subtitles', 'transcript', 'fulltext', 'processed', 'summary')
+# good ratio on text while decompressing at the same speed as the fast levels
+COMPRESSION_LEVEL = 10
+
+
+def compress(data: bytes, level=COMPRESSION_LEVEL):
+    """A zstd frame of some bytes"""
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress(blob: bytes):
+    """The bytes of a zstd frame written by `compress`"""
+    return zstandard.ZstdDecompressor().decompress(blob)
+
+
+def read_blob_row(path, artifact):
+    """
+    The artifact_blobs row of a file, None if the file can't be read.
+
+    Args:
+        path (str): Path of the file
+        artifact (dict): Its artifact columns, see `describe_artifact`; the checksum is of the bytes read here
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return {
+        'path': artifact['path'],
+        'video_id': artifact['video_id'],
+        'kind': artifact['kind'],
+        'language': artifact['language'],
+        'size': len(data),
+        'checksum': hashlib.sha256(data).hexdigest(),
+        'data': compress(data),
+        'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    }
+
+
+def store_blobs(connection, rows):
+    """Insert or replace artifact_blobs rows, matching them on the file name"""
+    if not rows:
+        return
+    connection.execute(text("""
+        INSERT INTO artifact_blobs (path, video_id, kind, language, size, checksum, data, updated_at)
+        VALUES (:path, :video_id, :kind, :language, :size, :checksum, :data, :updated_at)
+        ON CONFLICT (path) DO UPDATE SET
+            video_id = excluded.video_id, kind = excluded.kind, language = excluded.language, size = excluded.size,
+            checksum = excluded.checksum, data = excluded.data, updated_at = excluded.updated_at
+    """), rows)
+
+
+def migrate_directory(database, delete_files=False, batch_size=200, logger=None):
+    """
+    Store the text artifacts recorded in the download directory that have no blob yet.
+
+    Args:
+        database (SqliteDB): The video database
+        delete_files (bool, optional): Remove every file whose stored copy decompresses to the same bytes
+        batch_size (int, optional): Files stored per transaction. Defaults to 200.
+        logger (logging.Logger, optional): Logger to report to, printed if not given
+
+    Returns:
+        dict: Number of 'files' stored, their 'bytes' and 'compressed' bytes, and 'deleted' files
+    """
+    stats = {'files': 0, 'bytes': 0, 'compressed': 0, 'deleted': 0}
+    download_dir = get_download_dir()
+    with database.engine.connect() as connection:
+        artifacts = connection.execute(
+            text("""
+                SELECT a.video_id, a.kind, a.language, a.path FROM artifacts a
+                LEFT JOIN artifact_blobs b ON b.path = a.path
+                WHERE a.kind IN :kinds AND b.path IS NULL
+            """).bindparams(bindparam('kinds', expanding=True)),
+            {'kinds': list(BLOB_KINDS)}
+        ).mappings().all()
+    for start in range(0, len(artifacts), batch_size):
+        rows = [
+            row for row in (read_blob_row(os.path.join(download_dir, artifact['path']), artifact)
+                            for artifact in artifacts[start:start + batch_size])
+            if row is not None
+        ]
+        with database.engine.begin() as connection:
+            store_blobs(connection, rows)
+        for row in rows:
+            stats['files'] += 1
+            stats['bytes'] += row['size']
+            stats['compressed'] += len(row['data'])
+    if delete_files:
+        stats['deleted'] = delete_stored_files(database)
+    message = f"Stored {stats['files']} artifacts, {stats['bytes']} bytes in {stats['compressed']} compressed"
+    logger.info(message) if logger else print(message)
+    return stats
+
+
+def delete_stored_files(database):
+    """Remove the files of the download directory whose body is stored and verified, returns their number"""
+    deleted = 0
+    download_dir = get_download_dir()
+    with database.engine.connect() as connection:
+        for file_name, data in connection.execute(text("SELECT path, data FROM artifact_blobs")):
+            path = os.path.join(download_dir, file_name)
+            try:
+                with open(path, 'rb') as f:
+                    if f.read() != decompress(data):
+                        continue  # changed since it was stored, keep it
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                continue
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store the text artifacts of the download directory compressed in the database.")
+    parser.add_argument("--db", type=str, default=None, help="Path of the video database.")
+    parser.add_argument("--delete-files", action="store_true", help="Remove the loose files once their stored copy is verified.")
+    args = parser.parse_args()
+
+    from yourtube import Database
+    from yourtube.utils import get_db_path
+
+    db = Database(db_path=args.db or get_db_path())
+    stats = migrate_directory(db, delete_files=args.delete_files)
+    if stats['bytes']:
+        print(f"Compression ratio {stats['bytes'] / max(stats['compressed'], 1):.1f}x")
+    if args.delete_files:
+        print(f"Deleted {stats['deleted']} files")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,79 @@
 import os
-import glob
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from uuid import uuid4
 from datetime import datetime
 from abc import ABC, abstractmethod
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session, deferred
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import create_engine, inspect, event, text, func, ForeignKey
 from sqlalchemy import (
     Column, 
     String, 
+    Text,
+    LargeBinary,
     DateTime, 
     Boolean, 
-    UUID
+    Integer,
+    Float,
+    JSON,
+    UUID,
+    Index
 )
 from yourtube.utils import get_download_dir, get_db_path
+from yourtube.migrations import migrate, stamp
+from yourtube.artifacts import ARTIFACT_NAMES, artifact_name, classify_artifact, describe_artifact
+from yourtube.search import TEXT_KINDS, create_search_index, index_artifact, remove_video
+from yourtube.blobs import BLOB_KINDS, read_blob_row, store_blobs, decompress
+from yourtube.stats import create_channel_stats
 
 Base = declarative_base()
 
+# the request a session belongs to, set by `SqliteDB.request_session`
+_request_scope = ContextVar("request_scope", default=None)
+
+
+def _session_scope():
+    """Key of the current scoped session: the request being served, else the thread"""
+    scope = _request_scope.get()
+    return scope if scope is not None else threading.get_ident()
+
+
+def configure_sqlite_connection(dbapi_connection, busy_timeout=5000):
+    """Set up a new SQLite connection: WAL journal, relaxed fsync and a busy timeout in milliseconds"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # readers see the last commit while a write is in progress
+    cursor.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent, fsync only at checkpoints
+    cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    cursor.close()
+
+
+def delete_video_files(file_names):
+    """Remove files, e.g. the recorded artifacts of a video, from the download directory"""
+    for file_name in file_names:
+        file = os.path.join(get_download_dir(), file_name)
+        print(file)
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            print(f"Error deleting file: {file}")
+
 class Video(Base):
     """Abstract base class for Video objects"""
     __tablename__ = "videos"
+    __table_args__ = (
+        # sorted listings, with video_id to break ties between pages, see AsyncVideoRepository.list_page
+        Index("ix_videos_upload_date_video_id", "upload_date", "video_id"),
+        Index("ix_videos_process_date_video_id", "process_date", "video_id"),
+        Index("ix_videos_channel_id_upload_date", "channel_id", "upload_date"),  # a channel's videos, newest first
+    )
 
     id              = Column(UUID(as_uuid=True), primary_key=True, unique=True, default=uuid4)
-    video_id        = Column(String(20), nullable=False)
+    video_id        = Column(String(20), nullable=False, unique=True, index=True)
     title           = Column(String(200), nullable=False)
     channel_id      = Column(String(20), nullable=True)
     channel         = Column(String(100), nullable=True)
@@ -32,6 +83,7 @@ class Video(Base):
     transcript      = Column(Boolean, default=False)
     fulltext        = Column(Boolean, default=False)
     summary         = Column(Boolean, default=False)
+    duration        = Column(Float, nullable=True)  # seconds, from the extracted info
     _metadata       = {} # metadata from the 
     _default_path   = get_download_dir()
 
@@ -76,11 +128,15 @@ class Video(Base):
             'language': self.language,
             'transcript': self.transcript,
             'fulltext': self.fulltext,
-            'summary': self.summary
+            'summary': self.summary,
+            'duration': self.duration
         }
     
-    def update(self, **kwargs):
-        '''Update the video object with new attributes'''
+    def update(self, artifacts=None, **kwargs):
+        '''Update the video object with new attributes
+        Args:
+            artifacts: the recorded artifacts of the video, to set the transcript, fulltext and summary flags from
+        '''
         for key, value in kwargs.items():
             if hasattr(self, key):
                 setattr(self, key, value)
@@ -92,14 +148,155 @@ class Video(Base):
                 self.upload_date = datetime.strptime(self.upload_date.split('T')[0], '%Y-%m-%d')
         self.process_date = datetime.now()
 
-        #scan the folder to see if transcript, fulltext, and summary files exist
-        for file in glob.glob(f"{get_download_dir()}/{self.video_id}.*", recursive=True):
-            if file.endswith(f'{self.language}.srt'):
-                self.transcript = True
-            elif file.endswith(f'{self.language}.txt'):
-                self.fulltext = True
-            elif file.endswith(f'{self.language}.md'):
-                self.summary = True
+        # the flags follow the files recorded for the video in its language
+        if artifacts is not None:
+            kinds = {artifact.kind for artifact in artifacts if artifact.language == self.language}
+            self.transcript = 'transcript' in kinds
+            self.fulltext = 'fulltext' in kinds
+            self.summary = 'summary' in kinds
+
+class ChannelWatermark(Base):
+    """The newest video seen on a channel, used to stop incremental scans early"""
+    __tablename__ = "channel_watermarks"
+
+    channel_handle      = Column(String(100), primary_key=True)
+    channel_id          = Column(String(30), nullable=True)
+    last_video_id       = Column(String(20), nullable=True)
+    last_upload_date    = Column(DateTime, nullable=True)
+    last_checked        = Column(DateTime, nullable=True)
+    feed_etag           = Column(String(200), nullable=True)  # validators of the last fetched RSS feed
+    feed_last_modified  = Column(String(100), nullable=True)
+
+    def __repr__(self):
+        return f"<ChannelWatermark(channel_handle='{self.channel_handle}', last_video_id='{self.last_video_id}')>"
+
+
+class Artifact(Base):
+    """A file produced for a video in the download directory, see yourtube/artifacts.py for the kinds"""
+    __tablename__ = "artifacts"
+
+    id              = Column(Integer, primary_key=True, autoincrement=True)
+    video_id        = Column(String(20), nullable=False, index=True)
+    kind            = Column(String(20), nullable=False)  # 'info', 'media', 'audio', 'subtitles', 'transcript', 'fulltext', 'processed', 'summary' or 'other'
+    language        = Column(String(10), nullable=True)
+    path            = Column(String(300), nullable=False, unique=True)  # file name in the download directory
+    size            = Column(Integer, nullable=True)
+    checksum        = Column(String(64), nullable=True)  # SHA-256 of the content
+    producer        = Column(String(100), nullable=True)  # step and version that wrote the file, e.g. 'whisper-small@1.3.3'
+    updated_at      = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<Artifact(path='{self.path}', kind='{self.kind}', size={self.size})>"
+
+
+class ArtifactBlob(Base):
+    """The zstd-compressed body of a text artifact, see yourtube/blobs.py"""
+    __tablename__ = "artifact_blobs"
+
+    path            = Column(String(300), primary_key=True)  # file name of the artifact
+    video_id        = Column(String(20), nullable=False, index=True)
+    kind            = Column(String(20), nullable=False)
+    language        = Column(String(10), nullable=True)
+    size            = Column(Integer, nullable=True)  # bytes before compression
+    checksum        = Column(String(64), nullable=True)  # SHA-256 of the uncompressed body, as in artifacts
+    data            = deferred(Column(LargeBinary, nullable=False))  # only loaded when the body is read
+    updated_at      = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<ArtifactBlob(path='{self.path}', size={self.size})>"
+
+
+class SearchDocument(Base):
+    """A searchable piece of the text of an artifact, see yourtube/search.py"""
+    __tablename__ = "search_documents"
+
+    id              = Column(Integer, primary_key=True, autoincrement=True)  # rowid in the search_index FTS5 table
+    path            = Column(String(300), nullable=False, index=True)  # file name of the artifact
+    video_id        = Column(String(20), nullable=False, index=True)
+    kind            = Column(String(20), nullable=False)  # 'transcript', 'processed' or 'summary'
+    language        = Column(String(10), nullable=True)
+    start_time      = Column(Float, nullable=True)  # seconds into the video, for transcript windows
+    end_time        = Column(Float, nullable=True)
+    text            = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return f"<SearchDocument(path='{self.path}', start_time={self.start_time})>"
+
+
+# the FTS5 index over the documents isn't a model, create it along with their table
+event.listen(SearchDocument.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+
+
+class Embedding(Base):
+    """The row of the vector of a transcript window in the semantic index, see yourtube/semantic.py"""
+    __tablename__ = "embeddings"
+    __table_args__ = {'sqlite_autoincrement': True}  # rows of deleted documents are never handed out again
+
+    row             = Column(Integer, primary_key=True)  # 1-based row in vectors.f16
+    document_id     = Column(Integer, ForeignKey("search_documents.id"), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Embedding(row={self.row}, document_id={self.document_id})>"
+
+
+# documents are replaced when their artifact changes, their vectors must not outlive them
+event.listen(Embedding.__table__, "after_create", lambda target, connection, **kw: connection.execute(text(
+    """CREATE TRIGGER IF NOT EXISTS search_documents_embeddings_ad AFTER DELETE ON search_documents BEGIN
+        DELETE FROM embeddings WHERE document_id = old.id;
+    END"""
+)))
+
+
+class Job(Base):
+    """A video processing job, persisted so that queued and running work survives restarts"""
+    __tablename__ = "jobs"
+
+    id              = Column(Integer, primary_key=True, autoincrement=True)
+    video_id        = Column(String(20), nullable=False, index=True)
+    status          = Column(String(20), nullable=False, default='queued', index=True)  # 'queued', 'processing', 'completed', 'error', 'cancelled'
+    stage           = Column(String(30), nullable=True)  # last completed pipeline stage
+    attempts        = Column(Integer, nullable=False, default=0)
+    state           = Column(JSON, default=dict)  # job options plus what completed stages produced
+    lease_owner     = Column(String(100), nullable=True)
+    lease_expires   = Column(DateTime, nullable=True, index=True)
+    heartbeat_at    = Column(DateTime, nullable=True)
+    created_at      = Column(DateTime, default=datetime.now)
+    updated_at      = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, video_id='{self.video_id}', status='{self.status}', stage='{self.stage}')>"
+
+
+class ChannelStats(Base):
+    """Aggregates of the videos and jobs of a channel, maintained by triggers, see yourtube/stats.py"""
+    __tablename__ = "channel_stats"
+
+    channel_id          = Column(String(30), primary_key=True)  # '' for videos without a channel id
+    channel             = Column(String(100), nullable=True)
+    video_count         = Column(Integer, nullable=False, default=0)
+    transcribed_count   = Column(Integer, nullable=False, default=0)
+    summarized_count    = Column(Integer, nullable=False, default=0)  # fully processed videos
+    last_upload         = Column(DateTime, nullable=True)
+    last_processed      = Column(DateTime, nullable=True)
+    total_duration      = Column(Float, nullable=False, default=0)  # seconds of audio
+    pending_jobs        = Column(Integer, nullable=False, default=0)  # queued or processing
+
+    def __repr__(self):
+        return f"<ChannelStats(channel_id='{self.channel_id}', video_count={self.video_count})>"
+
+    def to_dict(self):
+        return {column.key: getattr(self, column.key) for column in self.__table__.columns}
+
+
+def _create_channel_stats_triggers(target, connection, **kw):
+    # videos tables from before the duration column get the triggers from migration 5
+    if any(column['name'] == 'duration' for column in inspect(connection).get_columns(Video.__tablename__)):
+        create_channel_stats(connection)
+
+
+# the triggers are on videos and jobs, create them once every table exists
+event.listen(Base.metadata, "after_create", _create_channel_stats_triggers)
+
 
 class Database(ABC):
     def __init__(self, db_path=None):
@@ -120,38 +317,78 @@ class Database(ABC):
     def get_video(self, **kwargs):
         return  self._get_video(**kwargs)
 
+    def get_watermark(self, channel_handle: str):
+        return self._get_watermark(channel_handle)
+
+    def set_watermark(self, channel_handle: str, video_id: str, upload_date=None):
+        return self._set_watermark(channel_handle, video_id, upload_date)
+
+    def set_feed_state(self, channel_handle: str, channel_id=None, etag=None, last_modified=None):
+        return self._set_feed_state(channel_handle, channel_id, etag, last_modified)
+
     
     def update_video(self, video: Video):
-        """Update an existing video in the database without deleting/re-adding."""
-        try:
-            # Get existing video
-            existing_video = self.get_video(video_id=video.video_id)
-            
-            if existing_video:
-                # Instead of updating, delete the existing video and add the new one
-                # This ensures a clean state and avoids session tracking issues
-                
-                # Store the ID of the existing video
-                existing_id = existing_video.id
-                
-                # Remove the existing video from the session
-                self.session.delete(existing_video)
-                self.session.commit()
-                
-                # Set the ID on the new video to maintain the same primary key
-                video.id = existing_id
-                
-                # Add the new video to the session
-                self.session.add(video)
-                self.session.commit()
-                return True
-            else:
-                # If video doesn't exist, add it
-                return self.add_video(video)
-        except Exception as e:
-            self.session.rollback()
-            raise Exception(f"Error updating video: {str(e)}")
-    
+        """Insert a video, or update the row with the same video_id in place."""
+        return self.upsert_videos([video]) == 1
+
+    def record_artifacts(self, video_id: str, language=None, kinds=(), producer=None):
+        """
+        Record the files of some kinds of a video after a step wrote them. Kinds whose file
+        doesn't exist (any more) are forgotten, so a step can also report files it removed.
+
+        Args:
+            video_id (str): The video
+            language (str, optional): Language of the subtitles, transcript, texts and summary
+            kinds (iterable[str]): Kinds of artifacts to look at, see yourtube/artifacts.py
+            producer (str, optional): Step and version that wrote the files
+
+        Returns:
+            int: Number of artifacts recorded
+        """
+        paths = [
+            os.path.join(get_download_dir(), artifact_name(video_id, kind, language))
+            for kind in kinds if language or '{language}' not in ARTIFACT_NAMES[kind]  # language files need a language
+        ]
+        return self._record_artifacts(paths, producer)
+
+    def get_artifacts(self, video_id: str, kind=None):
+        """Recorded artifacts of a video, optionally only of one kind"""
+        return self._get_artifacts(video_id, kind)
+
+    def read_artifact(self, video_id: str, kind: str, language=None):
+        """
+        The text of an artifact of a video, from its compressed copy in the database if
+        there is one, else from its file.
+
+        Returns:
+            str: The text, None if the artifact doesn't exist
+        """
+        return self._read_artifact(artifact_name(video_id, kind, language))
+
+    def get_channel_stats(self, channel_id=None):
+        """
+        Statistics of every channel, one maintained row each, see yourtube/stats.py.
+
+        Args:
+            channel_id (str, optional): Only this channel
+
+        Returns:
+            list[ChannelStats]: Channels with the newest upload first
+        """
+        return self._get_channel_stats(channel_id)
+
+    def upsert_videos(self, videos):
+        """
+        Insert or update many videos in a single transaction, matching rows on video_id.
+
+        Args:
+            videos (list[Video]): Videos to write, existing rows keep their primary key
+
+        Returns:
+            int: Number of videos written
+        """
+        return self._upsert_videos(list(videos))
+
     @abstractmethod
     def _add_video(self, video: Video):
         """Add a new video to the database."""
@@ -167,14 +404,109 @@ class Database(ABC):
         """Get a video from the database."""
         raise NotImplementedError
 
+    @abstractmethod
+    def _record_artifacts(self, paths: list, producer=None):
+        """Record the files at paths, forgetting the ones that don't exist."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_artifacts(self, video_id: str, kind=None):
+        """Get the recorded artifacts of a video."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _read_artifact(self, file_name: str):
+        """Read the text of an artifact by its file name."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_channel_stats(self, channel_id=None):
+        """Get the statistics of the channels."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _upsert_videos(self, videos: list):
+        """Insert or update videos in one transaction."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_watermark(self, channel_handle: str):
+        """Get the scan watermark of a channel."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _set_watermark(self, channel_handle: str, video_id: str, upload_date=None):
+        """Move the scan watermark of a channel forward."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _set_feed_state(self, channel_handle: str, channel_id=None, etag=None, last_modified=None):
+        """Store the channel id and feed validators of a channel."""
+        raise NotImplementedError
+
 
 class SqliteDB(Database):
-    def __init__(self, db_path='videos.db'):
+    """SQLite video database.
+
+    Connections come from a pool and run in WAL mode, so readers never wait for the writer
+    and writers wait up to `busy_timeout` milliseconds for each other instead of failing
+    with "database is locked". `session` is a different session for every thread, and for
+    every API request inside `request_session`; `session_scope` gives a short-lived one.
+    With `store_blobs`, the text artifacts are also stored compressed, see yourtube/blobs.py.
+    """
+    def __init__(self, db_path='videos.db', busy_timeout=5000, store_blobs=False):
         super().__init__(db_path)
-        self.engine = create_engine(f'sqlite:///{self.db_path}', echo=False)
+        self.busy_timeout = busy_timeout
+        self.store_blobs = store_blobs
+        self.engine = create_engine(
+            f'sqlite:///{self.db_path}',
+            echo=False,
+            connect_args={'check_same_thread': False}  # pooled connections move between threads
+        )
+        event.listen(self.engine, "connect", self._configure_connection)
+        fresh = not inspect(self.engine).has_table(Video.__tablename__)
         Base.metadata.create_all(self.engine)  # Create tables if they don't exist
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        if fresh:
+            stamp(self.engine)
+        else:
+            migrate(self.engine)  # bring tables created by older versions up to date, see yourtube/migrations.py
+        self._sessionmaker = sessionmaker(bind=self.engine)
+        self.Session = scoped_session(self._sessionmaker, scopefunc=_session_scope)
+
+    def _configure_connection(self, dbapi_connection, connection_record):
+        configure_sqlite_connection(dbapi_connection, self.busy_timeout)
+
+    @property
+    def session(self):
+        """The session of the current thread, or of the current request"""
+        return self.Session()
+
+    def remove_session(self):
+        """Close the session of the current thread or request, e.g. after a pipeline stage"""
+        self.Session.remove()
+
+    @contextmanager
+    def session_scope(self):
+        """A short-lived session, committed when the block succeeds and rolled back when it fails"""
+        session = self._sessionmaker()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @contextmanager
+    def request_session(self):
+        """Give the code in the block, e.g. one API request, a session of its own, closed at the end"""
+        token = _request_scope.set(object())
+        try:
+            yield
+        finally:
+            self.Session.remove()
+            _request_scope.reset(token)
 
     def _add_video(self, video: Video):
         """Add a new video to the database."""
@@ -190,14 +522,15 @@ class SqliteDB(Database):
         try:
             video = self.get_video(**kwargs)
             if video:
+                # the files to remove are the recorded artifacts, no need to scan the download directory
+                artifacts = self.session.query(Artifact).filter(Artifact.video_id == video.video_id)
+                file_names = [artifact.path for artifact in artifacts]
+                artifacts.delete()
+                self.session.query(ArtifactBlob).filter(ArtifactBlob.video_id == video.video_id).delete()
+                remove_video(self.session.connection(), video.video_id)
                 self.session.delete(video) # remove from database
                 self.session.commit() 
-                for file in glob.glob(f"{get_download_dir()}/{video.video_id}.*", recursive=True):
-                    print(file)
-                    try:
-                        os.remove(file)
-                    except OSError as e:
-                        print(f"Error deleting file: {file}")
+                delete_video_files(file_names)
                 print(f"Successfully deleted videos filtered by: {kwargs}")
                 return True
             else:
@@ -218,6 +551,162 @@ class SqliteDB(Database):
             raise IndexError(f"Something went wrong when trying to get video: {e}")
             return None
 
+    def _upsert_videos(self, videos: list):
+        """
+        Write videos with INSERT ... ON CONFLICT (video_id) DO UPDATE, all in one transaction.
+        The triggers on videos update the statistics of their channels in the same transaction.
+        """
+        if not videos:
+            return 0
+        columns = [column for column in Video.__table__.columns]
+        rows = {}  # video_id -> row, the last of several copies of a video wins
+        for video in videos:
+            row = {column.key: getattr(video, column.key) for column in columns}
+            row['id'] = row['id'] or uuid4()
+            for column in columns:
+                # unset flags get their column default, as with session.add
+                if row[column.key] is None and column.default is not None and column.default.is_scalar:
+                    row[column.key] = column.default.arg
+            rows[row['video_id']] = row
+        statement = sqlite_insert(Video.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Video.__table__.c.video_id],
+            set_={
+                column.key: statement.excluded[column.key] for column in columns if column.key not in ('id', 'video_id')
+            } | {
+                # videos written without their info, e.g. by a later pipeline stage, keep their duration
+                'duration': func.coalesce(statement.excluded.duration, Video.__table__.c.duration)
+            }
+        )
+        try:
+            self.session.execute(statement, list(rows.values()))
+            self.session.commit()
+            return len(rows)
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error upserting videos: {str(e)}")
+
+    def _record_artifacts(self, paths: list, producer=None):
+        """
+        Upsert a row per existing file and delete the rows of missing ones, in one transaction.
+        Texts whose content changed are re-indexed for search and, when they are stored in
+        the database, stored again in the same transaction. Missing files whose body is
+        stored in the database stay recorded.
+        """
+        file_names = [os.path.basename(path) for path in paths]
+        recorded = {
+            path: (size, checksum, updated_at) for path, size, checksum, updated_at in self.session.query(
+                Artifact.path, Artifact.size, Artifact.checksum, Artifact.updated_at
+            ).filter(Artifact.path.in_(file_names))
+        }
+        checksums = {path: row[1] for path, row in recorded.items()}
+        stored = {path for (path,) in self.session.query(ArtifactBlob.path).filter(ArtifactBlob.path.in_(file_names))}
+        rows, missing, blobs = [], [], []
+        for path in paths:
+            row = describe_artifact(path, recorded.get(os.path.basename(path)))
+            if row is None:
+                if os.path.basename(path) not in stored:
+                    missing.append(os.path.basename(path))
+            else:
+                rows.append(dict(row, producer=producer, updated_at=datetime.now()))
+                changed = row['checksum'] != checksums.get(row['path'])
+                if row['kind'] in BLOB_KINDS and (self.store_blobs or row['path'] in stored) and \
+                        (changed or row['path'] not in stored):
+                    blobs.append(read_blob_row(path, row))
+        try:
+            if rows:
+                statement = sqlite_insert(Artifact.__table__)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[Artifact.__table__.c.path],
+                    set_={key: statement.excluded[key] for key in rows[0] if key != 'path'}
+                )
+                self.session.execute(statement, rows)
+            if missing:
+                self.session.query(Artifact).filter(Artifact.path.in_(missing)).delete()
+            store_blobs(self.session.connection(), [blob for blob in blobs if blob is not None])
+            written = {row['path']: row['checksum'] for row in rows}
+            for path in paths:
+                file_name = os.path.basename(path)
+                video_id, kind, language = classify_artifact(file_name)
+                changed = file_name in written and written[file_name] != checksums.get(file_name)
+                if kind in TEXT_KINDS and (changed or file_name in missing):
+                    index_artifact(self.session.connection(), video_id, kind, language, path)
+            self.session.commit()
+            return len(rows)
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error recording artifacts: {str(e)}")
+
+    def _get_artifacts(self, video_id: str, kind=None):
+        """Artifacts of a video, by kind and path."""
+        query = self.session.query(Artifact).filter(Artifact.video_id == video_id)
+        if kind is not None:
+            query = query.filter(Artifact.kind == kind)
+        return query.order_by(Artifact.kind, Artifact.path).all()
+
+    def _read_artifact(self, file_name: str):
+        """Decompress the stored body of an artifact, or read its file."""
+        blob = self.session.query(ArtifactBlob.data).filter(ArtifactBlob.path == file_name).scalar()
+        if blob is not None:
+            return decompress(blob).decode('utf-8')
+        try:
+            with open(os.path.join(get_download_dir(), file_name), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _get_channel_stats(self, channel_id=None):
+        """Rows of channel_stats, newest upload first."""
+        query = self.session.query(ChannelStats)
+        if channel_id is not None:
+            query = query.filter(ChannelStats.channel_id == channel_id)
+        return query.order_by(ChannelStats.last_upload.desc().nulls_last(), ChannelStats.channel_id).all()
+
+    def _get_watermark(self, channel_handle: str):
+        '''Return the ChannelWatermark of a channel, or None if it was never scanned
+        '''
+        try:
+            return self.session.get(ChannelWatermark, channel_handle)
+        except Exception as e:
+            self.session.rollback()
+            raise IndexError(f"Something went wrong when trying to get watermark: {e}")
+
+    def _set_watermark(self, channel_handle: str, video_id: str, upload_date=None):
+        """Record the newest video seen on a channel."""
+        if isinstance(upload_date, str):
+            upload_date = datetime.strptime(upload_date, '%Y%m%d')
+        try:
+            watermark = self.session.get(ChannelWatermark, channel_handle)
+            if watermark is None:
+                watermark = ChannelWatermark(channel_handle=channel_handle)
+                self.session.add(watermark)
+            watermark.last_video_id = video_id
+            if upload_date is not None:
+                watermark.last_upload_date = upload_date
+            watermark.last_checked = datetime.now()
+            self.session.commit()
+            return watermark
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error setting watermark: {str(e)}")
+
+    def _set_feed_state(self, channel_handle: str, channel_id=None, etag=None, last_modified=None):
+        """Store the channel id and the ETag/Last-Modified validators of its feed."""
+        try:
+            watermark = self.session.get(ChannelWatermark, channel_handle)
+            if watermark is None:
+                watermark = ChannelWatermark(channel_handle=channel_handle)
+                self.session.add(watermark)
+            if channel_id is not None:
+                watermark.channel_id = channel_id
+            watermark.feed_etag = etag
+            watermark.feed_last_modified = last_modified
+            self.session.commit()
+            return watermark
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error setting feed state: {str(e)}")
+
 if __name__ == "__main__":
     db = SqliteDB()
     deleted = db.delete_video(video_id="HeHnTfkCcok")
@@ -0,0 +1,253 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, update, func
+from sqlalchemy.orm import sessionmaker, aliased
+from yourtube.database import Job
+
+
+class JobStore:
+    """Persistent job queue kept in the `jobs` table of the video database.
+
+    Every job records the last pipeline stage it completed, how often it was attempted and
+    a lease (owner + expiry) that its worker keeps renewing with heartbeats. Jobs whose
+    lease ran out, e.g. because the process was restarted, are recovered and resume after
+    their last completed stage.
+
+    Several worker processes on the same host can share one store. Every change of
+    ownership is a conditional UPDATE that only succeeds while the row still looks the way
+    the worker read it, so two workers never hold the same job, and a worker that lost its
+    lease can no longer write to the job. The database runs in WAL mode, whose shared
+    memory index only works between processes of one host: the SQLite file must not be
+    shared over a network filesystem by workers on several hosts.
+    """
+    def __init__(self, database, lease_seconds=60, max_attempts=3, owner=None):
+        self.database = database
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        # short-lived sessions of our own: the store is used from every worker thread
+        self._Session = sessionmaker(bind=database.engine, expire_on_commit=False)
+
+    def _lease_expiry(self):
+        return datetime.now() + timedelta(seconds=self.lease_seconds)
+
+    @staticmethod
+    def _orphaned(now):
+        """Condition matching processing jobs whose lease ran out, i.e. that became visible again"""
+        return and_(Job.status == 'processing', or_(Job.lease_expires == None, Job.lease_expires < now))
+
+    @staticmethod
+    def _priority():
+        return func.coalesce(Job.state['priority'].as_integer(), 0)
+
+    def enqueue(self, video_id, state=None):
+        """Add a queued job for a video and return its id"""
+        with self._Session() as session, session.begin():
+            job = Job(video_id=video_id, status='queued', state=state or {})
+            session.add(job)
+            session.flush()
+            return job.id
+
+    def get_job(self, video_id):
+        """Return the most recent job of a video, or None"""
+        with self._Session() as session:
+            return session.query(Job).filter_by(video_id=video_id).order_by(Job.id.desc()).first()
+
+    def get_status(self, video_id):
+        """Return the status of the job processing a video, else of its most recent job, or None"""
+        with self._Session() as session:
+            job = session.query(Job).filter_by(video_id=video_id).order_by(
+                (Job.status == 'processing').desc(), Job.id.desc()
+            ).first()
+        return job.status if job else None
+
+    def queued(self, flag=None):
+        """Queued jobs, oldest first, only those whose state sets `flag` if given, e.g. 'upgrade'"""
+        with self._Session() as session:
+            query = session.query(Job).filter(Job.status == 'queued')
+            if flag is not None:
+                query = query.filter(Job.state[flag].as_boolean() == True)
+            return query.order_by(Job.id).all()
+
+    def count(self, status):
+        """Number of jobs with a status"""
+        with self._Session() as session:
+            return session.query(Job).filter(Job.status == status).count()
+
+    def cancel(self, video_id):
+        """
+        Mark the queued or processing jobs of a video as 'cancelled'. The worker holding a
+        processing job notices it through `cancel_requested` and stops it.
+
+        Returns:
+            bool: True if a job was cancelled
+        """
+        with self._Session() as session, session.begin():
+            return session.execute(
+                update(Job)
+                .where(Job.video_id == video_id, Job.status.in_(['queued', 'processing']))
+                .values(status='cancelled')
+            ).rowcount > 0
+
+    def cancel_requested(self):
+        """Video ids of cancelled jobs this worker still holds a lease on"""
+        with self._Session() as session:
+            return [video_id for (video_id,) in session.query(Job.video_id).filter(
+                Job.lease_owner == self.owner, Job.status == 'cancelled'
+            )]
+
+    def claim(self, job_id):
+        """Take a lease on a job that starts processing and count the attempt"""
+        with self._Session() as session, session.begin():
+            session.execute(
+                update(Job).where(Job.id == job_id, Job.status.in_(['queued', 'processing'])).values(
+                    status='processing',
+                    attempts=Job.attempts + 1,
+                    lease_owner=self.owner,
+                    lease_expires=self._lease_expiry(),
+                    heartbeat_at=datetime.now()
+                )
+            )
+
+    def claim_next(self):
+        """
+        Atomically take the next job off the shared queue: the most urgent queued job, or a
+        processing job whose lease expired. A queued job waits while another job of its
+        video is processing, so e.g. an upgrade never runs alongside the job it redoes. The
+        job is marked 'processing' under this worker's lease and the attempt is counted;
+        taken over jobs that already used up `max_attempts` are marked 'error' and skipped.
+
+        Returns:
+            Job: The claimed job, None if there is nothing to do
+        """
+        other = aliased(Job)
+        while True:
+            now = datetime.now()
+            with self._Session() as session:
+                busy = session.query(other.id).filter(
+                    other.video_id == Job.video_id, other.id != Job.id, other.status == 'processing'
+                ).exists()
+                job = (
+                    session.query(Job)
+                    .filter(or_(and_(Job.status == 'queued', ~busy), self._orphaned(now)))
+                    .order_by(self._priority(), Job.id)
+                    .first()
+                )
+            if job is None:
+                return None
+            exhausted = job.status == 'processing' and job.attempts >= self.max_attempts
+            values = {'status': 'error', 'lease_owner': None, 'lease_expires': None} if exhausted else {
+                'status': 'processing',
+                'attempts': job.attempts + 1,
+                'lease_owner': self.owner,
+                'lease_expires': self._lease_expiry(),
+                'heartbeat_at': now
+            }
+            with self._Session() as session, session.begin():
+                # only succeeds if no other worker changed the job since we read it
+                claimed = session.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.status == job.status, Job.attempts == job.attempts,
+                           Job.lease_owner == job.lease_owner)
+                    .values(**values)
+                ).rowcount
+            if claimed and not exhausted:
+                job.status, job.attempts, job.lease_owner = 'processing', job.attempts + 1, self.owner
+                return job
+
+    def position(self, video_id):
+        """Number of queued jobs that will be taken before the job of a video, None if it is not queued"""
+        job = self.get_job(video_id)
+        if job is None or job.status != 'queued':
+            return None
+        priority = (job.state or {}).get('priority', 0)
+        with self._Session() as session:
+            return session.query(Job).filter(
+                Job.status == 'queued',
+                or_(self._priority() < priority, and_(self._priority() == priority, Job.id < job.id))
+            ).count()
+
+    def complete_stage(self, job_id, stage, state):
+        """
+        Record that a job finished a pipeline stage, along with what the stage produced
+
+        Returns:
+            bool: False if this worker lost the lease on the job in the meantime
+        """
+        with self._Session() as session, session.begin():
+            return session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == self.owner)
+                .values(stage=stage, state=state, lease_expires=self._lease_expiry())
+            ).rowcount > 0
+
+    def finish(self, job_id, status):
+        """
+        Mark a job as 'completed' or 'error' and release its lease
+
+        Returns:
+            bool: False if this worker lost the lease on the job in the meantime
+        """
+        with self._Session() as session, session.begin():
+            return session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == self.owner)
+                .values(status=status, lease_owner=None, lease_expires=None)
+            ).rowcount > 0
+
+    def release(self, job_id):
+        """
+        Give a processing job up without finishing it, e.g. after it overran its time budget.
+        Its lease is dropped, so it is recovered and retried like the job of a crashed worker.
+
+        Returns:
+            bool: False if this worker no longer held the job
+        """
+        with self._Session() as session, session.begin():
+            return session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == self.owner, Job.status == 'processing')
+                .values(lease_owner=None, lease_expires=None)
+            ).rowcount > 0
+
+    def heartbeat(self):
+        """Renew the leases of every job this worker is processing"""
+        now = datetime.now()
+        with self._Session() as session, session.begin():
+            session.execute(
+                update(Job)
+                .where(Job.lease_owner == self.owner, Job.status == 'processing')
+                .values(heartbeat_at=now, lease_expires=now + timedelta(seconds=self.lease_seconds))
+            )
+
+    def recover(self, include_queued=False):
+        """
+        Take over jobs whose worker stopped renewing its lease, and optionally jobs that
+        were still queued when the previous process stopped.
+
+        Jobs that already used up `max_attempts` are marked 'error' instead.
+
+        Returns:
+            list[Job]: The recovered jobs, oldest first
+        """
+        now = datetime.now()
+        condition = or_(self._orphaned(now), Job.status == 'queued') if include_queued else self._orphaned(now)
+        with self._Session() as session:
+            jobs = session.query(Job).filter(condition).order_by(Job.id).all()
+        recovered = []
+        for job in jobs:
+            exhausted = job.status == 'processing' and job.attempts >= self.max_attempts
+            values = {'status': 'error', 'lease_owner': None, 'lease_expires': None} if exhausted else \
+                {'lease_owner': self.owner, 'lease_expires': self._lease_expiry()}
+            with self._Session() as session, session.begin():
+                # skip jobs another worker took over since we read them
+                changed = session.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.status == job.status, Job.lease_owner == job.lease_owner)
+                    .values(**values)
+                ).rowcount
+            if changed and not exhausted:
+                job.lease_owner = self.owner
+                recovered.append(job)
+        return recovered
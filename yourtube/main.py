@@ -1,13 +1,17 @@
 import os
 import argparse
-from yourtube import Database, Transcriber
+import functools
+from yourtube import Database, Transcriber, Video
 from yourtube.utils import extract_youtube_id, load_config, get_download_dir, get_db_path
 from yourtube.monitor import YoutubeMonitor, BilibiliMonitor
 from yourtube.reporter import Reporter
+from yourtube.async_worker import Stage, stage_deadline
+from yourtube.artifacts import ARTIFACT_NAMES, producer_version
 from typing import Dict
 import asyncio
 import schedule
 import time
+from datetime import datetime
 
 # global variables setup: dadtabase, monitor, transcriber, config, video_queue
 DOWNLOAD_DIR = get_download_dir()
@@ -15,12 +19,12 @@ DB_PATH = get_db_path()
 
 
 config =load_config() #check if config.json exists, if not create it from template
-db = Database(db_path=DB_PATH)
-monitor = YoutubeMonitor(config=config)
+db = Database(db_path=DB_PATH, store_blobs=(config or {}).get("storage", {}).get("compress_artifacts", False))
+monitor = YoutubeMonitor(config=config, database=db)
 transcriber = Transcriber(config=config)
 
 
-def initialize_monitors(config: Dict) -> Dict:
+def initialize_monitors(config: Dict, database: Database=None) -> Dict:
     """Initialize monitors for each platform"""
     monitors = {}
     platform_monitors = {
@@ -29,9 +33,15 @@ def initialize_monitors(config: Dict) -> Dict:
     }
     for platform in config.get('monitored_platforms', list(platform_monitors.keys())):
         if platform in platform_monitors:
-            monitors[platform] = platform_monitors[platform](config)
+            monitors[platform] = platform_monitors[platform](config, database=database)
     return monitors
 
+
+def get_channel_handles(config: Dict, platform: str) -> list:
+    """Get the handles of the channels configured for a platform"""
+    channels = config.get(platform, {}).get("channels", [])
+    return [channel["channel_handle"] for channel in channels if channel.get("channel_handle")]
+
 async def pull_updates(monitors: Dict):
     """Start monitors on the platforms and pull updates to database"""
     for monitor in monitors.values():
@@ -40,15 +50,23 @@ async def pull_updates(monitors: Dict):
 async def process_updates(monitors: Dict):
         """Check for the latest videos in database and create a report. start_date and end_date are in the format of YYYY-MM-DD"""
         new_videos = []
+        scanned = []  # (monitor, channel handle, downloaded videos), the watermarks move once they are stored
         
         # Check each platform and process all channels for that platform
-        for monitor in monitors.values():
-            for video_id in monitor.check_updates():
-                video = monitor.download(video_id, download_video=True)
-                new_videos.append(video)
+        for platform, monitor in monitors.items():
+            for channel_handle in get_channel_handles(config, platform):
+                channel_videos = []
+                for video_id in monitor.check_updates(channel_handle):
+                    video = monitor.download(video_id)
+                    if video:
+                        channel_videos.append(video)
+                new_videos.extend(channel_videos)
+                scanned.append((monitor, channel_handle, channel_videos))
         
         if not new_videos:
             print("No new videos found")
+            for monitor, channel_handle, _ in scanned:
+                monitor.commit_updates(channel_handle, [])
             return
         
         # Process all videos using a single Transcriber instance
@@ -58,6 +76,11 @@ async def process_updates(monitors: Dict):
                 transcriber.transcribe(video)
             if not video.summary:
                 transcriber.summarize(video)
+            db.record_artifacts(video.video_id, video.language, ARTIFACT_NAMES, producer=producer_version("update"))
+            video.update(artifacts=db.get_artifacts(video.video_id))
+        db.upsert_videos(new_videos)  # the whole sweep in one transaction
+        for monitor, channel_handle, channel_videos in scanned:
+            monitor.commit_updates(channel_handle, [video.video_id for video in channel_videos])
         
         # Generate and send report
         
@@ -82,14 +105,21 @@ async def run_scheduler(
         """
         if run_immediately:
             print("Running immediate check...")
+            videos, scanned = [], []
             for platform, monitor in monitors.items():
-                new_video_ids =await monitor.check_updates()
-                for video_id in new_video_ids:
-                    video = database.get_video(video_id=video_id)
-                    if video and not args.force:
-                        continue
-                    video = monitor.download(video_id, download_video=True, download_json=True)
-                    database.add_video(video)
+                for channel_handle in get_channel_handles(config, platform):
+                    # only videos newer than the channel watermark are returned
+                    channel_videos = []
+                    for video_id in monitor.check_updates(channel_handle):
+                        video = monitor.download(video_id)
+                        if video:
+                            channel_videos.append(video)
+                    videos.extend(channel_videos)
+                    scanned.append((monitor, channel_handle, channel_videos))
+            database.upsert_videos(videos)  # the whole sweep in one transaction
+            # the watermarks only move past what is stored, failed downloads come back on the next scan
+            for monitor, channel_handle, channel_videos in scanned:
+                monitor.commit_updates(channel_handle, [video.video_id for video in channel_videos])
             print("Initial check completed.")
 
         # Schedule updates based on configuration
@@ -106,6 +136,171 @@ async def run_scheduler(
             schedule.run_pending()
             time.sleep(60)  # Check every minute
 
+def stage_download(job: Dict):
+    """
+    Pipeline stage 1: skip videos that are already processed, otherwise fetch the
+    metadata plus either the subtitles or the media of the video.
+
+    Args:
+        job (dict): The job being processed, see `process_video_pipeline` for its keys
+
+    Returns:
+        bool: False if the job is finished and the remaining stages must be skipped
+    """
+    video_id = job.get('video_id') or extract_youtube_id(job['url'])
+    job['video_id'] = video_id
+
+    video = job['database'].get_video(video_id=video_id)
+    if video and not job.get('force'):
+        print(f"Video {video_id} already processed")
+        return False
+
+    video = job['monitor'].download(video_id)
+    job['video'] = video
+    # plain copy of the metadata, stored with the job so later stages can resume after a restart
+    job['video_info'] = {
+        'video_id': video.video_id,
+        'title': video.title,
+        'channel': video.channel,
+        'channel_id': video.channel_id,
+        'language': video.language,
+        'upload_date': video.upload_date.strftime('%Y%m%d') if isinstance(video.upload_date, datetime) else video.upload_date,
+        'transcript': video.transcript
+    }
+    record_artifacts(job, "download", 'info', 'subtitles', 'transcript', 'media', 'audio')
+    return True
+
+
+def get_job_video(job: Dict) -> Video:
+    """The Video of a job, rebuilt from its stored metadata when the job was resumed after a restart"""
+    if job.get('video') is None:
+        job['video'] = Video.from_dict(job['video_info'])
+    return job['video']
+
+
+def record_artifacts(job: Dict, step: str, *kinds):
+    """Record the files of some kinds that a step wrote, or removed, for the video of a job"""
+    video = get_job_video(job)
+    job['database'].record_artifacts(video.video_id, video.language, kinds, producer=producer_version(step))
+
+
+def stage_prepare_audio(job: Dict):
+    """Pipeline stage 2: make sure a 16kHz mono WAV exists for videos that need transcribing"""
+    video = get_job_video(job)
+    if job.get('transcribe') and not video.transcript:
+        job['transcriber'].prepare_audio(video)
+        record_artifacts(job, "ffmpeg", 'audio')
+    return True
+
+
+def stage_transcribe(job: Dict):
+    """
+    Pipeline stage 3: transcribe the audio with Whisper, keeping the model loaded between videos.
+    With a `policy` in the job, the model size comes from its decision under the current load,
+    except for upgrades, which always use the configured size.
+    """
+    video, transcriber = get_job_video(job), job['transcriber']
+    if job.get('transcribe') and (not video.transcript or job.get('upgrade')):
+        model_size = job['config'].get("transcribe", {}).get("size", "base")
+        policy = job.get('policy')
+        # an upgrade re-transcribes with the configured size whatever the load
+        if policy is not None and not job.get('upgrade'):
+            decision = policy.decide(job)
+            if decision['action'] == 'skip':
+                # stored without a transcript for now, the upgrade transcribes, processes and summarizes it later
+                job['process'] = job['summarize'] = False
+                return True
+            model_size = decision['size']
+        print(f"Transcribing video")
+        if transcriber.model and transcriber.model_size != model_size:
+            transcriber.release_model()
+        if not transcriber.model:
+            transcriber.load_model(model_size=model_size)
+        started = time.monotonic()
+        _ = transcriber.transcribe(video, progress_callback=job.get('report_progress'))
+        # the media and audio are removed once transcribed
+        record_artifacts(job, f"whisper-{model_size}", 'transcript', 'media', 'audio')
+        if policy is not None:
+            policy.record(model_size, transcriber.audio_seconds, time.monotonic() - started)
+        if job.get('is_last'):
+            transcriber.release_model()
+    return True
+
+
+def stage_process(job: Dict):
+    """Pipeline stage 4: turn the SRT file into fulltext and reorganize it with the LLM"""
+    if job.get('process'):
+        print(f"Processing SRT file.")
+        transcriber = Transcriber(config=job['config']) # LLM stages don't share the Whisper transcriber's state
+        _ = transcriber.extract_fulltext(get_job_video(job))
+        _ = transcriber.process_fulltext(get_job_video(job), progress_callback=job.get('report_progress'))
+        record_artifacts(job, "process_fulltext", 'fulltext', 'processed')
+    return True
+
+
+def stage_summarize(job: Dict):
+    """Pipeline stage 5: summarize the transcription and store the video in the database"""
+    video = get_job_video(job)
+    if job.get('summarize'):
+        print(f"Summarizing transcription.")
+        _ = Transcriber(config=job['config']).summarize(video)
+        record_artifacts(job, "summarize", 'summary')
+
+    # Add to database, with the flags of the files recorded for the video
+    video.update(artifacts=job['database'].get_artifacts(video.video_id))
+    job['database'].update_video(video)
+    print(f"Successfully downloaded video: {video.title}")
+    return True
+
+
+def stage_embed(job: Dict):
+    """Pipeline stage 6: embed the transcript windows of the video for semantic search, if it is enabled"""
+    if job.get('semantic_index') is not None:
+        embedded = job['semantic_index'].index_pending(job['database'].engine, job['embedder'], video_id=job['video_id'])
+        print(f"Embedded {embedded} transcript windows")
+    return True
+
+
+def with_short_session(func):
+    """Close the database session of the worker thread after every task of a stage, so no session outlives a task"""
+    @functools.wraps(func)
+    def run(job: Dict):
+        try:
+            return func(job)
+        finally:
+            if job.get('database') is not None:
+                job['database'].remove_session()
+    return run
+
+
+# (name, function, default number of workers) of each pipeline stage, in order
+PIPELINE_STAGES = [
+    ("download", stage_download, 2),
+    ("prepare_audio", stage_prepare_audio, 1),
+    ("transcribe", stage_transcribe, 1), # one Whisper model, one worker
+    ("process", stage_process, 2),
+    ("summarize", stage_summarize, 2),
+    ("embed", stage_embed, 1), # one embedding model, batches already use every core
+]
+
+
+def build_pipeline_stages(config: Dict) -> list:
+    """
+    Build the stages of the processing pipeline for `VideoProcessingQueue`.
+    Pool sizes can be set per stage in `worker.pool_sizes`, the size of the queue
+    in front of each stage in `worker.stage_queue_size` and the time budget of each
+    stage in seconds in `worker.stage_timeouts` of the config.
+    """
+    worker_config = (config or {}).get("worker", {})
+    pool_sizes = worker_config.get("pool_sizes", {})
+    maxsize = worker_config.get("stage_queue_size", 4)
+    timeouts = worker_config.get("stage_timeouts", {})
+    return [
+        Stage(name, with_short_session(func), workers=pool_sizes.get(name, workers), maxsize=maxsize, timeout=timeouts.get(name))
+        for name, func, workers in PIPELINE_STAGES
+    ]
+
+
 def process_video_pipeline(
         config, 
         url, 
@@ -117,7 +312,9 @@ def process_video_pipeline(
         is_last=False # whether this is the last video to process in a queue
     ):
     """
-    Process a video from URL through the pipeline
+    Process a video from URL through the pipeline, running all stages in turn.
+    Stages that overrun their budget in `worker.stage_timeouts` have their subprocesses
+    killed and fail with a TimeoutError.
     
     Args:
         url (str): YouTube URL
@@ -133,39 +330,25 @@ def process_video_pipeline(
     Returns:
         int: 0 on success, non-zero on failure
     """
-    if not video_id:
-        video_id = extract_youtube_id(url)
-    
-    video = database.get_video(video_id=video_id)
-    if video and not force:
-        print(f"Video {video_id} already processed")
-        return 0
-
-    # Download and transcribe video flow
-    video = monitor.download(video_id)
-
-    if transcribe and not video.transcript:
-        model_size = config.get("transcribe", {}).get("size", "base")
-        print(f"Transcribing video")
-        if not transcriber.model:
-            transcriber.load_model(model_size=model_size)
-        _ = transcriber.transcribe(video)
-        if is_last:
-            transcriber.release_model()
-    
-    if process:
-        print(f"Processing SRT file.")
-        _ = transcriber.extract_fulltext(video)
-        _ = transcriber.process_fulltext(video)
-
-    if summarize:
-        print(f"Summarizing transcription.")
-        _ = transcriber.summarize(video)
-    
-    # Add to database
-    video.update(**transcriber.metadata) 
-    database.update_video(video)
-    print(f"Successfully downloaded video: {video.title}")
+    job = {
+        'config': config,
+        'url': url,
+        'database': database,
+        'monitor': monitor,
+        'transcriber': transcriber,
+        'transcribe': transcribe,
+        'process': process,
+        'summarize': summarize,
+        'force': force,
+        'video_id': video_id,
+        'is_last': is_last
+    }
+    timeouts = (config or {}).get("worker", {}).get("stage_timeouts", {})
+    for name, stage, _ in PIPELINE_STAGES:
+        with stage_deadline(name, timeouts.get(name)):
+            result = stage(job)
+        if result is False:
+            return 0
     
     transcriber.release_model()
 
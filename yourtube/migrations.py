@@ -0,0 +1,146 @@
+"""Versioned schema migrations for the SQLite video database.
+
+`Base.metadata.create_all` creates missing tables but never changes existing ones, so
+every change to the schema of a table that already holds data is a migration here. The
+schema version of a database file is kept in SQLite's `PRAGMA user_version`; `migrate`
+applies the migrations above it in order, each in its own transaction together with the
+version bump. Databases freshly created from the models already have the latest schema
+and are only stamped with its version.
+"""
+import json
+import os
+from datetime import datetime
+from sqlalchemy import text, bindparam
+from yourtube.artifacts import describe_artifact, producer_version
+from yourtube.search import TEXT_KINDS, create_search_index, index_artifact
+from yourtube.stats import create_channel_stats, rebuild_channel_stats, recreate_channel_stats
+from yourtube.utils import get_download_dir
+
+
+def _dedupe_and_index_videos(connection):
+    """Keep the most recently processed row of every video_id, then index the lookup and listing columns"""
+    connection.execute(text("""
+        DELETE FROM videos WHERE rowid NOT IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY video_id ORDER BY process_date IS NULL, process_date DESC, rowid DESC
+                ) AS rank
+                FROM videos
+            ) WHERE rank = 1
+        )
+    """))
+    connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_videos_video_id ON videos (video_id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_videos_upload_date ON videos (upload_date)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_videos_process_date ON videos (process_date)"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_videos_channel_id_upload_date ON videos (channel_id, upload_date)"
+    ))
+
+
+def _index_existing_artifacts(connection):
+    """Record the files already in the download directory in the artifacts table, in one pass over it"""
+    download_dir = get_download_dir()
+    if not os.path.isdir(download_dir):
+        return
+    producer, now = producer_version("backfill"), datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    with os.scandir(download_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            row = describe_artifact(entry.path)
+            if row is None:
+                continue
+            connection.execute(text("""
+                INSERT OR IGNORE INTO artifacts (video_id, kind, language, path, size, checksum, producer, updated_at)
+                VALUES (:video_id, :kind, :language, :path, :size, :checksum, :producer, :updated_at)
+            """), dict(row, producer=producer, updated_at=now))
+
+
+def _keyset_indexes(connection):
+    """Replace the date indexes by (date, video_id) ones that serve keyset pagination"""
+    connection.execute(text("DROP INDEX IF EXISTS ix_videos_upload_date"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_videos_process_date"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_videos_upload_date_video_id ON videos (upload_date, video_id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_videos_process_date_video_id ON videos (process_date, video_id)"))
+
+
+def _index_existing_texts(connection):
+    """Index the transcripts, processed texts and summaries recorded as artifacts for full-text search"""
+    create_search_index(connection)
+    download_dir = get_download_dir()
+    artifacts = connection.execute(
+        text("SELECT video_id, kind, language, path FROM artifacts WHERE kind IN :kinds")
+        .bindparams(bindparam('kinds', expanding=True)),
+        {'kinds': list(TEXT_KINDS)}
+    ).all()
+    for video_id, kind, language, path in artifacts:
+        index_artifact(connection, video_id, kind, language, os.path.join(download_dir, path))
+
+
+def _channel_stats(connection):
+    """Add the duration of videos, read from their info files, then fill the statistics of every channel"""
+    columns = {row[1] for row in connection.execute(text("PRAGMA table_info(videos)"))}
+    if 'duration' not in columns:
+        connection.execute(text("ALTER TABLE videos ADD COLUMN duration FLOAT"))
+    download_dir = get_download_dir()
+    durations = []
+    for video_id, path in connection.execute(text("SELECT video_id, path FROM artifacts WHERE kind = 'info'")).all():
+        try:
+            with open(os.path.join(download_dir, path), 'r', encoding='utf-8') as f:
+                duration = json.load(f).get('duration')
+        except (OSError, ValueError):
+            continue
+        if duration is not None:
+            durations.append({'video_id': video_id, 'duration': duration})
+    if durations:
+        connection.execute(text("UPDATE videos SET duration = :duration WHERE video_id = :video_id"), durations)
+    create_channel_stats(connection)
+    rebuild_channel_stats(connection)
+
+
+# (version, description, function taking a Connection), in the order they apply
+MIGRATIONS = [
+    (1, "unique video_id, indexes for lookups and sorted listings", _dedupe_and_index_videos),
+    (2, "index the files of the download directory as artifacts", _index_existing_artifacts),
+    (3, "(date, video_id) indexes for keyset pagination", _keyset_indexes),
+    (4, "full-text search index of transcripts, processed texts and summaries", _index_existing_texts),
+    (5, "video durations and per-channel statistics", _channel_stats),
+    (6, "count the pending jobs of videos not in the library yet", recreate_channel_stats),
+]
+
+
+def get_version(connection):
+    """Schema version of the database behind a connection"""
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def stamp(engine):
+    """Record that the database of an engine has the latest schema, e.g. right after creating it"""
+    with engine.begin() as connection:
+        connection.execute(text(f"PRAGMA user_version = {int(MIGRATIONS[-1][0])}"))
+
+
+def migrate(engine, logger=None):
+    """
+    Bring the database of an engine up to the latest schema version.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the SQLite database
+        logger (logging.Logger, optional): Logger to report applied migrations to, printed if not given
+
+    Returns:
+        int: The schema version of the database afterwards
+    """
+    with engine.connect() as connection:
+        version = get_version(connection)
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        with engine.begin() as connection:
+            apply(connection)
+            # PRAGMA doesn't take bound parameters; the version is one of our own integers
+            connection.execute(text(f"PRAGMA user_version = {int(target)}"))
+        version = target
+        message = f"Migrated database to version {target}: {description}"
+        logger.info(message) if logger else print(message)
+    return version
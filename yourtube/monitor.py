@@ -1,29 +1,82 @@
 from typing import List, Dict, Optional
 from datetime import datetime
 from yourtube import Video
-from yourtube.utils import get_download_dir, convert_vtt_to_srt, download_youtube_video, load_config, get_language
+from yourtube.utils import (
+    get_download_dir,
+    convert_vtt_to_srt,
+    download_youtube_video,
+    download_audio_16k,
+    load_config,
+    get_language,
+    TTLCache,
+    SOCKET_TIMEOUT
+)
+from concurrent.futures import Future
+import xml.etree.ElementTree as ET
+import asyncio
+import threading
+import urllib.request
+import urllib.error
 import yt_dlp
 import os
 
+FEED_URL = "https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+YT_NS = "{http://www.youtube.com/xml/schemas/2015}"
+
 
 class Monitor:
     """Base class for platform-specific monitors"""
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, database=None):
         self._default_path = get_download_dir()
         self._config = config
+        self._database = database # used to persist per-channel scan watermarks
+        self._scans = {}  # channel handle -> what its last `check_updates` found, until `commit_updates`
     
-    def check_updates(self, handle: str, max_results: int = 10, until_date: str="", end_date: str="") -> List[Video]:
-        """Get latest videos from a single channel. 
+    def check_updates(self, handle: str, max_results: int = 10, max_pages: int = 10) -> List[str]:
+        """Get the videos posted on a single channel since its last scan.
 
         Args:
-            channel_id (str): The channel ID or handle to fetch videos from
-            max_results (int, optional): Maximum number of videos to return. Defaults to 5.
-            until_date (datetime, optional): Only return videos published before this date. Defaults to None.
+            handle (str): The channel ID or handle to fetch videos from
+            max_results (int, optional): Number of videos listed per page. Defaults to 10.
+            max_pages (int, optional): Maximum number of pages to walk. Defaults to 10.
 
         Returns:
             List[video_id]: List of video ids representing the latest videos from the channel
         """
         raise NotImplementedError
+
+    def commit_updates(self, handle: str, stored_video_ids) -> Optional[str]:
+        """Move the watermark of a channel forward once the videos of its last scan are stored.
+
+        The watermark only moves past the videos older than the oldest one that wasn't
+        stored, so a video whose download failed is returned again by the next scan.
+
+        Args:
+            handle (str): The channel handle passed to `check_updates`
+            stored_video_ids (iterable[str]): The ids of the scanned videos that are now in the database
+
+        Returns:
+            str: The video id of the new watermark, None if it didn't move
+        """
+        handle = handle.lstrip('@')
+        scan = self._scans.pop(handle, None)
+        if scan is None or self._database is None:
+            return None
+        stored = set(stored_video_ids)
+        entries = scan['entries']
+        failed = [i for i, entry in enumerate(entries) if entry['id'] not in stored]
+        if not failed and scan['feed_state']:
+            # the feed validators would answer the next probe with "nothing new", only keep them when nothing is missing
+            self._database.set_feed_state(
+                handle, etag=scan['feed_state'].get('etag'), last_modified=scan['feed_state'].get('last_modified')
+            )
+        # entries are newest first, the watermark can move up to the video right after the oldest failure
+        start = failed[-1] + 1 if failed else 0
+        if start >= len(entries):
+            return None
+        self._database.set_watermark(handle, entries[start]['id'], upload_date=entries[start].get('upload_date'))
+        return entries[start]['id']
     
     def download(self, video_id: str):
         """Download the video from the platform"""
@@ -32,102 +85,295 @@ class Monitor:
 
 
 class YoutubeMonitor(Monitor):
-    def __init__(self, config: Dict):
-        super().__init__(config)
+    def __init__(self, config: Dict, database=None):
+        super().__init__(config, database=database)
+        self._feed_url = (config or {}).get('youtube', {}).get('feed_url', FEED_URL)
+        self._info_cache = TTLCache(ttl=(config or {}).get('youtube', {}).get('info_cache_ttl', 600))
+        self._inflight = {}  # video_id -> Future of an extraction that is already running
+        self._inflight_lock = threading.Lock()
         self.ydl_opts = {
             'quiet': True,
             'extract_flat': True,
-            'force_generic_extractor': False
+            'force_generic_extractor': False,
+            'socket_timeout': SOCKET_TIMEOUT
         }
     
-    def get_video_info(self, video_id):
+    def extract_video_info(self, video_id):
         """
-        Get basic information about a video without downloading it
-        
+        Extract the full yt-dlp info of a video without downloading it.
+
+        Results are cached for `youtube.info_cache_ttl` seconds (default 600) and
+        concurrent calls for the same video share a single extraction.
+
         Args:
             video_id (str): YouTube video ID
-            
+
         Returns:
-            dict: Dictionary containing basic video information
+            dict: The info dict returned by yt-dlp
         """
+        info = self._info_cache.get(video_id)
+        if info is not None:
+            return info
+
+        with self._inflight_lock:
+            future = self._inflight.get(video_id)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[video_id] = future
+        if not is_owner:
+            return future.result()
+
         video_url = f"https://www.youtube.com/watch?v={video_id}"
         ydl_opts = {
             'quiet': True,
             'skip_download': True,
             'no_warnings': True,
             'writeinfojson': False,
-            'noplaylist': True
+            'noplaylist': True,
+            'socket_timeout': SOCKET_TIMEOUT  # the watchdog can't interrupt an extraction
         }
-        
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(video_url, download=False)
-                
-                # Extract only the needed information
-                return {
-                    'title': info.get('title', f'Video {video_id}'),
-                    'channel': info.get('uploader', 'Unknown channel'),
-                    'upload_date': info.get('upload_date', '')
-                }
+            self._info_cache.set(video_id, info)
+            future.set_result(info)
+            return info
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(video_id, None)
+
+    def get_video_info(self, video_id):
+        """
+        Get basic information about a video without downloading it
+        
+        Args:
+            video_id (str): YouTube video ID
+            
+        Returns:
+            dict: Dictionary containing basic video information
+        """
+        try:
+            info = self.extract_video_info(video_id)
+            # Extract only the needed information
+            return {
+                'title': info.get('title', f'Video {video_id}'),
+                'channel': info.get('uploader', 'Unknown channel'),
+                'upload_date': info.get('upload_date', ''),
+                'channel_id': info.get('channel_id')
+            }
         except Exception as e:
             print(f"Error getting video info: {str(e)}")
             return {
                 'title': f'Processing: {video_id}',
                 'channel': 'Loading...',
-                'upload_date': ''
+                'upload_date': '',
+                'channel_id': None
             }
 
-    def check_updates(self, channel_handle, max_results=1):
+    async def get_video_info_async(self, video_id):
+        """Run `get_video_info` in the default executor so the event loop is never blocked"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_video_info, video_id)
+
+    def check_updates(self, channel_handle, max_results=10, max_pages=10):
         """
-        Fetches latest videos from a YouTube channel (by handle) from a given date span.
+        Fetches the videos posted on a YouTube channel (by handle) since the last scan.
+
+        The channel listing is paged through `max_results` entries at a time until the
+        stored watermark (last seen video ID or upload date) is reached, so a steady-state
+        poll costs a single small listing request. Once a channel has a watermark and its
+        channel ID is known, its Atom feed is probed first and the listing is skipped
+        entirely when the feed shows nothing new. The first scan of a channel only
+        returns its latest page. The watermark and feed validators are only saved by
+        `commit_updates`, once the returned videos are stored.
 
         Parameters:
             - channel_handle: YouTube channel handle (e.g., "@ChannelHandle")
-            - until_date: Cutoff date in "YYYYMMDD" format (e.g., "20240101" for Jan 1, 2024)
-            - max_results: Maximum number of videos to check (default: 50)
+            - max_results: Number of videos to list per page (default: 10)
+            - max_pages: Maximum number of pages to walk before giving up (default: 10)
 
         Returns:
-            - List of video ids uploaded until the given date.
+            - List of video ids that are newer than the watermark, newest first.
         """
-        
-        url = f"https://www.youtube.com/@{channel_handle}"
+        channel_handle = channel_handle.lstrip('@')
+        watermark = self._database.get_watermark(channel_handle) if self._database else None
+        last_video_id = watermark.last_video_id if watermark else None
+        last_upload_date = watermark.last_upload_date if watermark else None
+
+        # cheap probe first: the feed tells us whether the expensive listing is needed at all
+        channel_id = self._get_channel_id(channel_handle, watermark)
+        feed_state = None
+        if last_video_id and channel_id:
+            feed_state = self.probe_feed(
+                channel_id,
+                last_video_id=last_video_id,
+                etag=watermark.feed_etag,
+                last_modified=watermark.feed_last_modified
+            )
+            if feed_state is not None and not feed_state['new_video_ids']:
+                # nothing to store, so the validators of a changed feed are kept right away for the next probe
+                if (feed_state['etag'], feed_state['last_modified']) != (watermark.feed_etag, watermark.feed_last_modified):
+                    self._database.set_feed_state(
+                        channel_handle, etag=feed_state['etag'], last_modified=feed_state['last_modified']
+                    )
+                return []
+
+        new_entries = []
+        listed_channel_id = None  # no page listed, e.g. with max_pages=0
+        for page in range(max_pages):
+            entries, listed_channel_id = self._list_channel_page(
+                channel_handle,
+                start=page * max_results + 1,
+                end=(page + 1) * max_results
+            )
+            reached_watermark = False
+            for entry in entries:
+                upload_date = entry.get('upload_date')
+                if entry['id'] == last_video_id or (
+                    last_upload_date and upload_date
+                    and datetime.strptime(upload_date, '%Y%m%d') < last_upload_date
+                ):
+                    reached_watermark = True
+                    break
+                new_entries.append(entry)
+
+            # stop at the watermark, at the end of the channel, or after the first page of a channel never committed,
+            # whose watermark row may only hold its channel id
+            if reached_watermark or len(entries) < max_results or last_video_id is None:
+                break
+
+        if self._database and listed_channel_id and not channel_id:
+            self._database.set_feed_state(channel_handle, channel_id=listed_channel_id)
+        # validators are only stored once the listing succeeded and its videos are stored, so a failed scan is retried
+        self._scans[channel_handle] = {'entries': new_entries, 'feed_state': feed_state}
+
+        return [entry['id'] for entry in new_entries]
+
+    def probe_feed(self, channel_id, last_video_id=None, etag=None, last_modified=None):
+        """
+        Check a channel's public Atom feed for videos newer than `last_video_id`.
+
+        The request is conditional (If-None-Match / If-Modified-Since) and the feed is
+        parsed incrementally, stopping as soon as the last seen video shows up.
+
+        Parameters:
+            - channel_id: YouTube channel ID (e.g., "UC...")
+            - last_video_id: The newest video ID seen on the previous scan
+            - etag: ETag returned by the previous fetch of this feed
+            - last_modified: Last-Modified returned by the previous fetch of this feed
+
+        Returns:
+            - dict with 'new_video_ids' (newest first), 'etag' and 'last_modified', or
+              None if the feed could not be fetched.
+        """
+        request = urllib.request.Request(self._feed_url.format(channel_id=channel_id))
+        if etag:
+            request.add_header('If-None-Match', etag)
+        if last_modified:
+            request.add_header('If-Modified-Since', last_modified)
+
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                new_video_ids = []
+                for _, element in ET.iterparse(response, events=('end',)):
+                    if element.tag != f'{ATOM_NS}entry':
+                        continue
+                    video_id = element.findtext(f'{YT_NS}videoId')
+                    element.clear()
+                    if video_id == last_video_id:
+                        break
+                    new_video_ids.append(video_id)
+                return {
+                    'new_video_ids': new_video_ids,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+        except urllib.error.HTTPError as e:
+            if e.code == 304: # feed unchanged since the last fetch
+                return {'new_video_ids': [], 'etag': etag, 'last_modified': last_modified}
+            print(f"Error probing feed of {channel_id}: {str(e)}")
+            return None
+        except (urllib.error.URLError, ET.ParseError, OSError) as e:
+            print(f"Error probing feed of {channel_id}: {str(e)}")
+            return None
+
+    def _get_channel_id(self, channel_handle, watermark=None):
+        """Look up the channel ID of a handle in the config, or in what an earlier scan learned"""
+        channels = (self._config or {}).get('youtube', {}).get('channels', [])
+        for channel in channels:
+            if channel.get('channel_handle', '').lstrip('@') == channel_handle and channel.get('channel_id', '').startswith('UC'):
+                return channel['channel_id']
+        return watermark.channel_id if watermark else None
+
+    def _list_channel_page(self, channel_handle, start=1, end=10):
+        """
+        List one page of a channel's uploads without extracting the videos themselves.
+
+        Parameters:
+            - channel_handle: YouTube channel handle without the leading "@"
+            - start: 1-based index of the first entry of the page
+            - end: 1-based index of the last entry of the page
+
+        Returns:
+            - Tuple of the flat entry dicts (newest first) and the channel ID.
+        """
+        url = f"https://www.youtube.com/@{channel_handle}/videos"
         ydl_opts = {
             'quiet': True,
             'extract_flat': True,  # Extract metadata without downloading
-            'playlistend': max_results  # Fetch up to `max_results` videos
+            'playliststart': start,
+            'playlistend': end,
+            'socket_timeout': SOCKET_TIMEOUT
         }
 
-        video_ids = []
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=False)
-        
-        video_entries = info['entries']
-        if not video_entries[0].get("url", None): # some channels have two layers of entries
-                video_entries = video_entries[0]['entries']
 
-        for video in video_entries:
-            video_ids.append(video['id'])
+        video_entries = list(info.get('entries') or [])
+        if video_entries and not video_entries[0].get("url", None): # some channels have two layers of entries
+                video_entries = list(video_entries[0]['entries'])
 
-        return video_ids
+        return video_entries, info.get('channel_id')
 
 
-    def download(self, video_id, format='wv+ba'):
+    def download(self, video_id, format='wv+ba', audio_only=None):
         '''
         Download a YouTube video using yt-dlp library.
+
+        The video is extracted once. Whether subtitles exist in the video's language is
+        decided from that info, and the same info is then processed a single time to
+        write the info json plus either the subtitles or the media for transcription.
         
         Parameters:
             - video_id: str, YouTube video ID
             - format: str, format/quality specification for yt-dlp (default: 'worst')
+            - audio_only: bool, fetch only the audio stream, transcoded to a 16kHz mono
+              WAV while downloading (default: `transcribe.audio_only` from config)
             
         Returns:
             - Video: Video object containing metadata and file paths
             - None: If download fails
         '''
-        
-        # load info either from local json or downlaod
-        info = download_youtube_video(path=self._default_path, video_id=video_id, video=False)
+        info = self.extract_video_info(video_id)
         video_title = info.get('title', 'Untitled')
         language = get_language(info, config=self._config)
+        need_media = not self._has_subtitles(info, language)
+        if audio_only is None:
+            audio_only = (self._config or {}).get("transcribe", {}).get("audio_only", False)
+
+        download_youtube_video(
+            path=self._default_path,
+            video_id=video_id,
+            format=format,
+            video=need_media and not audio_only,
+            info=info
+        )
+        if need_media and audio_only:
+            self._download_audio(video_id, info, format=format)
         
         # get srt path
         srt_path = os.path.join(self._default_path, f'{video_id}.{language}.srt')
@@ -140,7 +386,9 @@ class YoutubeMonitor(Monitor):
             except FileNotFoundError:
                 srt_path = None
                 vtt_path = None
-                _ = download_youtube_video(path=self._default_path, video_id=video_id, format=format, video=True)
+                if not need_media:
+                    # subtitles were listed but could not be fetched: get the media from the same info
+                    download_youtube_video(path=self._default_path, video_id=video_id, format=format, video=True, info=info)
                 print("No subtitles for this video, transcribe it please")
 
 
@@ -152,16 +400,41 @@ class YoutubeMonitor(Monitor):
             'channel_id': info.get('channel_id', ""),  # Added channel_id extraction
             'language': language,
             'upload_date': info.get('upload_date'),
+            'duration': info.get('duration'),
             'transcript': True if srt_path else False
         })
 
         return video
 
+    def _download_audio(self, video_id, info, format='wv+ba'):
+        """Fetch the audio of a video as a 16kHz mono WAV, falling back to the regular media download"""
+        wav_path = os.path.join(self._default_path, f'{video_id}.wav')
+        try:
+            stats = download_audio_16k(info, wav_path)
+            print(
+                f"Audio-only download of {video_id} (format {stats['format_id']}): "
+                f"{stats['bytes'] / 1e6:.1f} MB in {stats['elapsed']:.1f}s, "
+                f"saved {stats['bytes_saved'] / 1e6:.1f} MB and ~{stats['latency_saved']:.1f}s"
+            )
+            return stats
+        except Exception as e:
+            print(f"Audio-only download failed ({str(e)}), downloading the media instead")
+            download_youtube_video(path=self._default_path, video_id=video_id, format=format, video=True, info=info)
+            return None
+
+    @staticmethod
+    def _has_subtitles(info, language):
+        """Whether manual or automatic subtitles in `language` are listed in the extracted info"""
+        return bool(
+            language in (info.get('subtitles') or {})
+            or language in (info.get('automatic_captions') or {})
+        )
+
     
 
 class BilibiliMonitor(Monitor):
-    def __init__(self, config: Dict):
-        super().__init__(config)
+    def __init__(self, config: Dict, database=None):
+        super().__init__(config, database=database)
         
     def get_channel_info(self, channel_id: str) -> Dict:
         pass
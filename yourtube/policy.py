@@ -0,0 +1,148 @@
+import json
+import logging
+import threading
+from yourtube.async_worker import PRIORITY_INTERACTIVE, PRIORITY_BACKFILL
+
+# Approximate speed of each Whisper size relative to large, from the Whisper README
+RELATIVE_SPEED = {"tiny": 10, "base": 7, "small": 4, "medium": 2, "large": 1, "turbo": 8}
+
+
+def relative_speed(model_size):
+    """Speed of a Whisper size relative to large, e.g. 'small.en' or 'large-v3'"""
+    name = model_size.split(".")[0].split("-")[0]
+    return RELATIVE_SPEED.get(name, 1)
+
+
+class TranscriptionPolicy:
+    """Choose how to transcribe each job from the backlog and the measured speed of Whisper.
+
+    The expected latency of a job is the audio waiting to be transcribed ahead of it, times
+    the real-time factor (seconds of work per second of audio) measured for a model size.
+    When that exceeds `transcribe.adaptive.sla_seconds`, jobs below interactive priority
+    use the largest smaller size that meets the deadline, or skip transcription for now:
+    the policy only decides for videos without subtitles, so a skipped video is stored
+    without a transcript. Those videos get a backfill job in the job store that
+    re-transcribes them with the configured size, so pending upgrades survive a restart:
+    pulling workers claim it once nothing more urgent is queued, a local pipeline takes it
+    in whenever it is idle. Every decision is logged.
+    """
+    def __init__(self, config, queue=None, logger=None, job_store=None):
+        transcribe_config = (config or {}).get("transcribe", {})
+        adaptive = transcribe_config.get("adaptive", {})
+        self.size = transcribe_config.get("size", "base")
+        self.enabled = adaptive.get("enabled", True)
+        self.sla_seconds = adaptive.get("sla_seconds", 1800)
+        self.upgrade = adaptive.get("upgrade_when_idle", True)
+        # smaller sizes to fall back to, best quality first
+        self.fallback_sizes = sorted(
+            (size for size in adaptive.get("sizes", ["base", "tiny"]) if relative_speed(size) > relative_speed(self.size)),
+            key=relative_speed
+        )
+        self.queue = queue
+        self.job_store = job_store  # where upgrades wait as backfill jobs, none are queued without one
+        self.logger = logger if logger else logging.getLogger("Policy")
+        self._rtf = {}  # model size -> moving average of the real-time factor
+        self._audio_seconds = None  # moving average of the audio length of a job
+        self._lock = threading.Lock()
+
+    def record(self, model_size, audio_seconds, elapsed):
+        """Fold one transcription into the measured real-time factor of its size and the average audio length"""
+        if not audio_seconds:
+            return
+        rtf = elapsed / audio_seconds
+        with self._lock:
+            previous = self._rtf.get(model_size)
+            self._rtf[model_size] = rtf if previous is None else 0.8 * previous + 0.2 * rtf
+            self._audio_seconds = audio_seconds if self._audio_seconds is None else \
+                0.8 * self._audio_seconds + 0.2 * audio_seconds
+        self.logger.info(f"Transcribed {audio_seconds:.0f}s of audio with {model_size} at {rtf:.2f}x real time")
+
+    def real_time_factor(self, model_size):
+        """Measured real-time factor of a size, extrapolated from another measured size, None if nothing was measured"""
+        with self._lock:
+            if model_size in self._rtf:
+                return self._rtf[model_size]
+            if not self._rtf:
+                return None
+            measured, rtf = next(iter(self._rtf.items()))
+        return rtf * relative_speed(measured) / relative_speed(model_size)
+
+    def predict(self, model_size, backlog):
+        """Seconds until a job with `backlog` jobs ahead of it is transcribed, None if no speed was measured yet"""
+        rtf = self.real_time_factor(model_size)
+        if rtf is None or self._audio_seconds is None:
+            return None
+        return (backlog + 1) * self._audio_seconds * rtf
+
+    def decide(self, job):
+        """
+        Choose how to transcribe a job that has no subtitles.
+
+        Args:
+            job (dict): The job being processed
+
+        Returns:
+            dict: The decision, with `action` ('full', 'downsize' or 'skip') and the model `size` to use,
+                None when the video is left untranscribed until its upgrade
+        """
+        priority = job.get('priority', PRIORITY_INTERACTIVE)
+        backlog = self.queue.get_backlog("transcribe") if self.queue else 0
+        predicted = self.predict(self.size, backlog)
+        action, size = 'full', self.size
+        if self.enabled and priority > PRIORITY_INTERACTIVE and predicted is not None and predicted > self.sla_seconds:
+            size = next((size for size in self.fallback_sizes if self.predict(size, backlog) <= self.sla_seconds), None)
+            action = 'downsize' if size else 'skip'
+            predicted = self.predict(size, backlog) if size else 0
+
+        decision = {
+            'video_id': job.get('video_id'),
+            'priority': priority,
+            'backlog': backlog,
+            'action': action,
+            'size': size,
+            'predicted_seconds': round(predicted) if predicted is not None else None,
+            'sla_seconds': self.sla_seconds
+        }
+        self.logger.info(f"Transcription decision: {json.dumps(decision)}")
+        if action != 'full' and self.upgrade:
+            self._enqueue_upgrade(job)
+        return decision
+
+    def _enqueue_upgrade(self, job):
+        """Queue a backfill job re-transcribing the video of a degraded job, unless one is already waiting"""
+        video_id = job['video_id']
+        if self.job_store is None or video_id in self.pending_upgrades():
+            return
+        self.job_store.enqueue(video_id, {
+            'video_id': video_id,
+            'force': True,
+            'transcribe': True,
+            'process': job.get('process', True),
+            'summarize': job.get('summarize', True),
+            'priority': PRIORITY_BACKFILL,
+            'upgrade': True,
+            'is_last': True
+        })
+
+    def pending_upgrades(self):
+        """Video ids waiting for a re-transcription with the configured size, oldest first"""
+        if self.job_store is None:
+            return []
+        return [job.video_id for job in self.job_store.queued('upgrade')]
+
+    def queue_upgrade(self):
+        """
+        Put the oldest pending re-transcription into a local pipeline. Meant to be called
+        whenever the pipeline becomes idle, so upgrades trickle in one at a time and never
+        hold up fresh videos. Pulling workers claim upgrade jobs like any other job.
+
+        Returns:
+            bool: True if an upgrade was started
+        """
+        if self.job_store is None or self.queue is None or self.queue.pull:
+            return False
+        for job in self.job_store.queued('upgrade'):
+            if self.queue.resume(job):
+                self.logger.info(f"Transcription decision: {json.dumps({'video_id': job.video_id, 'action': 'upgrade', 'size': self.size})}")
+                return True
+        return False
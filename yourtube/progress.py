@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from datetime import datetime
+from yourtube.utils import TTLCache
+
+
+class ProgressBus:
+    """Fan progress events out from the worker threads to any number of asyncio subscribers.
+
+    An event is a dict with the `video_id` and any of `status`, `stage`, `done`, `total`
+    and `unit` (e.g. 'frames' while transcribing, 'chunks' while an LLM processes the text).
+    The latest state of each video is kept for a while, so a subscriber that connects late
+    starts from a snapshot instead of waiting for the next event.
+    """
+    def __init__(self, ttl=3600, maxsize=1024, buffer=1000):
+        self._latest = TTLCache(ttl=ttl, maxsize=maxsize)  # video_id -> merged state
+        self._subscribers = set()  # (loop, asyncio.Queue)
+        self._buffer = buffer
+        self._lock = threading.Lock()
+
+    def publish(self, video_id, **event):
+        """Send an event about a video to every subscriber, callable from any thread"""
+        state = dict(self._latest.get(video_id) or {'video_id': video_id})
+        if 'stage' in event or 'status' in event:
+            for key in ('done', 'total', 'unit', 'percent'):  # a new stage or status starts without progress
+                state.pop(key, None)
+        state.update(event, time=datetime.now().isoformat())
+        if state.get('total'):
+            state['percent'] = round(100 * state.get('done', 0) / state['total'], 1)
+        self._latest.set(video_id, state)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, state)
+            except RuntimeError:  # the subscriber's event loop is closed
+                with self._lock:
+                    self._subscribers.discard((loop, queue))
+
+    def _offer(self, queue, event):
+        """Queue an event for a subscriber, dropping its oldest one if it does not keep up"""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def latest(self, video_id):
+        """The latest known state of a video, None if nothing was published about it lately"""
+        return self._latest.get(video_id)
+
+    def snapshot(self):
+        """The latest state of every video with recent events"""
+        return [state for _, state in self._latest.items()]
+
+    def subscribe(self):
+        """
+        Subscribe the running event loop to all events. The returned queue starts with the
+        latest state of every recent video and then receives every new event.
+
+        Returns:
+            asyncio.Queue: Queue of event dicts, pass it to `unsubscribe` when done
+        """
+        queue = asyncio.Queue(maxsize=self._buffer)
+        for state in self.snapshot()[-self._buffer:]:
+            queue.put_nowait(state)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        """Stop sending events to a queue returned by `subscribe`"""
+        with self._lock:
+            self._subscribers = {subscriber for subscriber in self._subscribers if subscriber[1] is not queue}
+
+
+# Create a global instance of the bus
+progress_bus = ProgressBus()
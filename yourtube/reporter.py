@@ -5,8 +5,8 @@ from email.mime.multipart import MIMEMultipart
 import aiosmtplib
 import markdown
 import os
-from yourtube import Database, Video
-from yourtube.utils import get_download_dir
+from yourtube.database import SqliteDB, Video
+from yourtube.utils import get_download_dir, get_db_path
 import asyncio
 
 REPORT_TEMPLATE_SINGLE = lambda title, url, channel, upload_date, summary: f"""
@@ -20,10 +20,16 @@ REPORT_TEMPLATE_SINGLE = lambda title, url, channel, upload_date, summary: f"""
 
 """
 
+REPORT_TEMPLATE_CHANNELS = lambda rows: "## Channels\n\n| Channel | Videos | Summarized | Pending | Latest upload | Hours |\n|---|---|---|---|---|---|\n" + "".join(
+    f"| {stats.channel or stats.channel_id} | {stats.video_count} | {stats.summarized_count} | {stats.pending_jobs} "
+    f"| {stats.last_upload.strftime('%Y-%m-%d') if stats.last_upload else '-'} | {stats.total_duration / 3600:.1f} |\n"
+    for stats in rows
+)
+
 class Reporter:
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, database=None):
         self.config = config
-        self.db = SqliteDB()
+        self.db = database or SqliteDB(db_path=get_db_path())
         self.email_config = config['email']
         self.download_dir = get_download_dir()
     
@@ -45,6 +51,11 @@ class Reporter:
         return REPORT_TEMPLATE_SINGLE(video.title, video_url, video.channel, video.upload_date, summary_content)
 
 
+    def _generate_channel_overview(self) -> str:
+        """Markdown table of the maintained per-channel statistics, one row read per channel"""
+        return REPORT_TEMPLATE_CHANNELS(self.db.get_channel_stats())
+
+
     def _send_email(self, subject: str, content: str):
         """Send email asynchronously"""
         msg = MIMEMultipart()
@@ -70,11 +81,12 @@ class Reporter:
 
     async def generate_report(self, videos: List[Video]) -> str:
         """Generate full report content from list of videos"""
+        overview = self._generate_channel_overview()
         if not videos:
-            return "## Daily Video Update Report ## \nNo new videos available today."
+            return "## Daily Video Update Report ## \nNo new videos available today.\n\n" + overview
         # Use asyncio.gather to properly handle multiple async tasks
         summaries = await asyncio.gather(*[self._generate_report_single(video) for video in videos])
-        return "\n\n".join(summaries)
+        return "\n\n".join(summaries) + "\n\n" + overview
 
 
     def send_report(self, videos: List[Video]):
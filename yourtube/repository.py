@@ -0,0 +1,208 @@
+import asyncio
+import base64
+import json
+import os
+from datetime import datetime
+from sqlalchemy import event, select, delete, or_, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from yourtube.database import Video, Artifact, ArtifactBlob, SearchDocument, ChannelStats, configure_sqlite_connection, delete_video_files
+from yourtube.artifacts import artifact_name
+from yourtube.blobs import decompress
+from yourtube.search import search
+from yourtube.utils import get_db_path, get_download_dir
+
+
+class AsyncVideoRepository:
+    """Read and delete videos from async code without blocking the event loop.
+
+    Queries run on SQLAlchemy's async engine over aiosqlite, which does the blocking SQLite
+    calls on a thread of its own, so a slow query only delays the request that made it.
+    The schema is created and migrated by `SqliteDB`, which must have opened the same file.
+    Videos are returned detached, with all their columns loaded.
+    """
+    SORT_COLUMNS = {'upload_date': Video.upload_date, 'process_date': Video.process_date}
+    # columns the video list shows
+    LIST_COLUMNS = (Video.video_id, Video.title, Video.channel, Video.channel_id, Video.upload_date,
+                    Video.process_date, Video.language, Video.transcript, Video.summary)
+    STATUS_FILTERS = {
+        'summarized': Video.summary == True,
+        'transcribed': Video.transcript == True,
+        'untranscribed': or_(Video.transcript == False, Video.transcript == None),
+    }
+
+    def __init__(self, db_path=None, busy_timeout=5000):
+        self.db_path = db_path or get_db_path()
+        self.engine = create_async_engine(f'sqlite+aiosqlite:///{self.db_path}', echo=False)
+        event.listen(
+            self.engine.sync_engine, "connect",
+            lambda dbapi_connection, connection_record: configure_sqlite_connection(dbapi_connection, busy_timeout)
+        )
+        self._Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def get_video(self, **kwargs):
+        """Return the first video matching the filters, e.g. `video_id=...`, or None"""
+        async with self._Session() as session:
+            return (await session.execute(select(Video).filter_by(**kwargs).limit(1))).scalars().first()
+
+    async def list_page(self, sort="process_date", limit=50, cursor=None, channel_id=None, language=None, status=None):
+        """
+        Return one page of the video list, newest first, with only the listed columns.
+
+        Pages are cut by keyset: the cursor holds the sort date and video_id of the last row
+        of the previous page and the next page starts right after it, so every page costs
+        the same walk down the (date, video_id) index however deep into the list it is.
+        Videos without a date come last.
+
+        Args:
+            sort (str, optional): 'process_date' or 'upload_date'. Defaults to 'process_date'.
+            limit (int, optional): Videos per page. Defaults to 50.
+            cursor (str, optional): `next_cursor` of the previous page, None for the first page
+            channel_id (str, optional): Only videos of this channel
+            language (str, optional): Only videos in this language
+            status (str, optional): 'summarized', 'transcribed' or 'untranscribed'
+
+        Returns:
+            tuple: (list[dict] of the videos, the cursor of the next page or None on the last page)
+        """
+        column = self.SORT_COLUMNS.get(sort, Video.process_date)
+        filters = {'channel_id': channel_id, 'language': language, 'status': status}
+        undated = cursor is not None and decode_cursor(cursor)[0] is None
+        async with self._Session() as session:
+            query = self.page_query(sort, limit + 1, cursor, undated=undated, **filters)
+            rows = [dict(row._mapping) for row in await session.execute(query)]
+            if cursor and not undated and len(rows) <= limit:
+                # the dated videos ran out on this page, go on with the undated ones
+                query = self.page_query(sort, limit + 1 - len(rows), undated=True, **filters)
+                rows += [dict(row._mapping) for row in await session.execute(query)]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][column.key], rows[-1]['video_id'])
+        return rows, next_cursor
+
+    @classmethod
+    def page_query(cls, sort="process_date", limit=50, cursor=None, channel_id=None, language=None, status=None,
+                   undated=False):
+        """
+        The SELECT of up to `limit` rows of the video list after a cursor, see `list_page`.
+        After a dated cursor it only reaches the dated videos, a (date, video_id) range of the
+        index; `undated` selects the videos without a date, after the cursor if it has none.
+        """
+        column = cls.SORT_COLUMNS.get(sort, Video.process_date)
+        query = select(*cls.LIST_COLUMNS).order_by(column.desc(), Video.video_id.desc()).limit(limit)
+        if channel_id:
+            query = query.where(Video.channel_id == channel_id)
+        if language:
+            query = query.where(Video.language == language)
+        if status:
+            query = query.where(cls.STATUS_FILTERS[status])
+        last_date, last_video_id = decode_cursor(cursor) if cursor else (None, None)
+        if undated:
+            query = query.where(column == None)
+            if last_video_id is not None and last_date is None:
+                query = query.where(Video.video_id < last_video_id)
+        elif cursor:
+            query = query.where(tuple_(column, Video.video_id) < (last_date, last_video_id))
+        return query
+
+    async def read_artifact(self, video_id, kind, language=None):
+        """
+        The text of an artifact of a video: one primary key lookup when its body is stored
+        in the database, else a read of its file on a thread.
+
+        Returns:
+            str: The text, None if the artifact doesn't exist
+        """
+        file_name = artifact_name(video_id, kind, language)
+        async with self._Session() as session:
+            blob = (await session.execute(select(ArtifactBlob.data).where(ArtifactBlob.path == file_name))).scalar()
+        if blob is not None:
+            return decompress(blob).decode('utf-8')
+        return await asyncio.to_thread(_read_file, os.path.join(get_download_dir(), file_name))
+
+    async def channel_stats(self, channel_id=None):
+        """
+        Statistics of every channel, newest upload first: one row per channel, maintained by
+        triggers as videos and jobs are written, see yourtube/stats.py.
+
+        Args:
+            channel_id (str, optional): Only this channel
+
+        Returns:
+            list[dict]: The columns of channel_stats
+        """
+        query = select(ChannelStats).order_by(ChannelStats.last_upload.desc().nulls_last(), ChannelStats.channel_id)
+        if channel_id is not None:
+            query = query.where(ChannelStats.channel_id == channel_id)
+        async with self._Session() as session:
+            return [stats.to_dict() for stats in (await session.execute(query)).scalars()]
+
+    async def existing_video_ids(self, video_ids):
+        """The subset of `video_ids` that is in the database"""
+        async with self._Session() as session:
+            return set((await session.execute(select(Video.video_id).where(Video.video_id.in_(list(video_ids))))).scalars())
+
+    async def delete_video(self, video_id):
+        """
+        Delete a video and its recorded artifacts.
+
+        Returns:
+            bool: False if the video was not in the database
+        """
+        async with self._Session() as session, session.begin():
+            file_names = list((await session.execute(select(Artifact.path).where(Artifact.video_id == video_id))).scalars())
+            await session.execute(delete(Artifact).where(Artifact.video_id == video_id))
+            await session.execute(delete(ArtifactBlob).where(ArtifactBlob.video_id == video_id))
+            await session.execute(delete(SearchDocument).where(SearchDocument.video_id == video_id))
+            deleted = (await session.execute(delete(Video).where(Video.video_id == video_id))).rowcount
+        if deleted:
+            await asyncio.to_thread(delete_video_files, file_names)
+        return deleted > 0
+
+    async def search(self, query, limit=20, kinds=None, video_id=None, language=None):
+        """Full-text search over transcripts, processed texts and summaries, see `yourtube.search.search`"""
+        async with self.engine.connect() as connection:
+            return await connection.run_sync(
+                search, query, limit=limit, kinds=kinds, video_id=video_id, language=language
+            )
+
+    async def semantic_search(self, index, vector, limit=10, nprobe=None):
+        """
+        Transcript windows closest to a query embedding in a `SemanticIndex`. The vectors
+        are scored on a thread, the windows are looked up on the async engine.
+        """
+        rows, scores = await asyncio.to_thread(index.nearest, vector, limit * 2, nprobe)
+        async with self.engine.connect() as connection:
+            return await connection.run_sync(index.lookup, rows, scores, limit)
+
+    async def dispose(self):
+        """Close the pooled connections"""
+        await self.engine.dispose()
+
+
+def _read_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def encode_cursor(date, video_id):
+    """Opaque page cursor for the row with a sort date and video_id"""
+    position = [date.isoformat() if date else None, video_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    The sort date and video_id of a page cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        date, video_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(date) if date else None), str(video_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
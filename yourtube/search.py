@@ -0,0 +1,297 @@
+"""Full-text search over transcripts, processed texts and summaries.
+
+The text of every indexed artifact is split into documents, rows of `search_documents`:
+windows of consecutive SRT cues for transcripts, so every hit knows the moment of the
+video it comes from, and paragraphs for processed texts and summaries. `search_index`
+is an FTS5 index over their text with the trigram tokenizer, which matches any
+substring of three or more characters and therefore works for languages written
+without spaces, e.g. Chinese and Japanese, as well as for the others. Triggers keep the
+index in step with the documents, so indexing an artifact is a DELETE and an INSERT on
+`search_documents` inside the transaction that records it.
+"""
+import html
+import os
+import re
+from sqlalchemy import text
+
+# artifact kinds whose text is searchable
+TEXT_KINDS = ('transcript', 'processed', 'summary')
+# a transcript window closes once it spans this many seconds
+WINDOW_SECONDS = 30
+# the trigram tokenizer can only look up terms of at least this many characters
+MIN_TERM_LENGTH = 3
+# BM25 ranks at most this many of the newest matching documents, so common words stay fast
+MAX_RANKED = 1000
+# snippet() marks hits with these, replaced by <mark> once the snippet is escaped
+_HIT_START, _HIT_END = '\x02', '\x03'
+
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        text, content='search_documents', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_index (rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_index (search_index, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_index (search_index, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO search_index (rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+_SRT_TIME = re.compile(r'(\d+):(\d+):(\d+)[,.](\d+)')
+
+
+def create_search_index(connection):
+    """Create the FTS5 index over `search_documents` and the triggers keeping it up to date"""
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+
+
+def _srt_seconds(timestamp):
+    hours, minutes, seconds, millis = _SRT_TIME.match(timestamp.strip()).groups()
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 10 ** len(millis)
+
+
+def parse_srt(srt_text):
+    """
+    Cues of an SRT file.
+
+    Returns:
+        list[tuple]: (start, end, text) of every cue, times in seconds
+    """
+    cues = []
+    for block in re.split(r'\n\s*\n', srt_text.replace('\r\n', '\n')):
+        lines = block.strip().split('\n')
+        for i, line in enumerate(lines):
+            if '-->' in line:
+                start, _, end = line.partition('-->')
+                cue_text = ' '.join(l.strip() for l in lines[i + 1:] if l.strip())
+                if cue_text and _SRT_TIME.match(start.strip()) and _SRT_TIME.match(end.strip()):
+                    cues.append((_srt_seconds(start), _srt_seconds(end), cue_text))
+                break
+    return cues
+
+
+def transcript_windows(srt_text, window_seconds=WINDOW_SECONDS):
+    """Group the cues of an SRT file into windows of about `window_seconds`, as (start, end, text)"""
+    windows, current = [], []
+    for cue in parse_srt(srt_text):
+        current.append(cue)
+        if cue[1] - current[0][0] >= window_seconds:
+            windows.append((current[0][0], current[-1][1], ' '.join(c[2] for c in current)))
+            current = []
+    if current:
+        windows.append((current[0][0], current[-1][1], ' '.join(c[2] for c in current)))
+    return windows
+
+
+def split_documents(kind, content):
+    """Documents of the text of an artifact, as (start, end, text), times None outside transcripts"""
+    if kind == 'transcript':
+        return transcript_windows(content)
+    return [(None, None, paragraph.strip()) for paragraph in re.split(r'\n\s*\n', content) if paragraph.strip()]
+
+
+def index_artifact(connection, video_id, kind, language, path):
+    """
+    Replace the documents of an artifact file by its current content, or drop them if the
+    file is gone.
+
+    Args:
+        connection (Connection): Connection to the video database, in the caller's transaction
+        video_id (str): The video
+        kind (str): One of TEXT_KINDS
+        language (str): Language of the text
+        path (str): Path of the file, its name identifies the artifact
+
+    Returns:
+        int: Number of documents indexed
+    """
+    file_name = os.path.basename(path)
+    connection.execute(text("DELETE FROM search_documents WHERE path = :path"), {'path': file_name})
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            content = file.read()
+    except OSError:
+        return 0
+    documents = [
+        {'path': file_name, 'video_id': video_id, 'kind': kind, 'language': language,
+         'start_time': start, 'end_time': end, 'text': document_text}
+        for start, end, document_text in split_documents(kind, content)
+    ]
+    if documents:
+        connection.execute(text("""
+            INSERT INTO search_documents (path, video_id, kind, language, start_time, end_time, text)
+            VALUES (:path, :video_id, :kind, :language, :start_time, :end_time, :text)
+        """), documents)
+    return len(documents)
+
+
+def remove_video(connection, video_id):
+    """Drop every document of a video from the index"""
+    connection.execute(text("DELETE FROM search_documents WHERE video_id = :video_id"), {'video_id': video_id})
+
+
+def split_query(query):
+    """
+    Terms of a search query, split on whitespace; "quoted phrases" stay one term.
+
+    Returns:
+        tuple: (FTS5 MATCH expression of the terms the index can look up or None,
+                list of the shorter terms, matched with LIKE)
+    """
+    terms = [phrase or word for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query)]
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    match = ' AND '.join('"' + term.replace('"', '""') + '"' for term in indexed) or None
+    return match, short
+
+
+def _like_pattern(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _highlight(snippet):
+    """Escape a snippet for HTML and turn the hit markers into <mark> tags"""
+    return html.escape(snippet).replace(_HIT_START, '<mark>').replace(_HIT_END, '</mark>')
+
+
+def _short_snippet(document_text, terms, width=60):
+    """Snippet around the first of some terms in a text, for hits the FTS index didn't rank"""
+    lowered = document_text.lower()
+    position = min((lowered.find(term.lower()) for term in terms if term.lower() in lowered), default=0)
+    start, end = max(position - width, 0), position + width
+    snippet = ('…' if start else '') + document_text[start:end] + ('…' if end < len(document_text) else '')
+    for term in terms:
+        snippet = re.sub(re.escape(term), lambda m: _HIT_START + m.group(0) + _HIT_END, snippet, flags=re.IGNORECASE)
+    return snippet
+
+
+def search(connection, query, limit=20, kinds=None, video_id=None, language=None):
+    """
+    Find the documents matching every term of a query, best first.
+
+    Terms of three or more characters are looked up in the FTS5 index and ranked with
+    BM25; shorter ones, e.g. a two-character Chinese word, only filter the hits. A query
+    made of short terms alone scans the documents instead of using the index.
+    Ranking costs time for every match, so queries matching more than MAX_RANKED
+    documents only rank the most recently indexed ones.
+    Hits in processed texts and summaries get the time of the best matching transcript
+    window of the same video, if there is one.
+
+    Args:
+        connection (Connection): Connection to the video database
+        query (str): Words or "quoted phrases" to look for
+        limit (int, optional): Maximum number of hits. Defaults to 20.
+        kinds (list[str], optional): Only search these kinds of TEXT_KINDS
+        video_id (str, optional): Only search the texts of this video
+        language (str, optional): Only search texts in this language
+
+    Returns:
+        list[dict]: video_id, title, kind, language, start and end in seconds (None if
+                    unknown), snippet as HTML with the hits in <mark> and score
+    """
+    match, short = split_query(query)
+    if match is None and not short:
+        return []
+    params = {'limit': limit}
+    conditions = []
+    if match is not None:
+        conditions.append("search_index MATCH :match")
+        params['match'] = match
+    for i, term in enumerate(short):
+        conditions.append(f"d.text LIKE :short_{i} ESCAPE '\\'")
+        params[f'short_{i}'] = _like_pattern(term)
+    if kinds:
+        conditions.append("d.kind IN (" + ', '.join(f':kind_{i}' for i in range(len(kinds))) + ")")
+        params.update({f'kind_{i}': kind for i, kind in enumerate(kinds)})
+    if video_id:
+        conditions.append("d.video_id = :video_id")
+        params['video_id'] = video_id
+    if language:
+        conditions.append("d.language = :language")
+        params['language'] = language
+    where = ' AND '.join(conditions)
+
+    if match is not None:
+        params['max_ranked'] = MAX_RANKED
+        # matches come out of the index newest first, the oldest of the first MAX_RANKED bounds the ranking
+        rows = connection.execute(text(f"""
+            SELECT d.video_id, v.title, d.kind, d.language, d.start_time, d.end_time, d.text,
+                   snippet(search_index, 0, '{_HIT_START}', '{_HIT_END}', '…', 16) AS snippet,
+                   bm25(search_index) AS score
+            FROM search_index
+            JOIN search_documents d ON d.id = search_index.rowid
+            LEFT JOIN videos v ON v.video_id = d.video_id
+            WHERE {where} AND search_index.rowid >= coalesce((
+                SELECT search_index.rowid FROM search_index
+                JOIN search_documents d ON d.id = search_index.rowid
+                WHERE {where}
+                ORDER BY search_index.rowid DESC
+                LIMIT 1 OFFSET :max_ranked - 1
+            ), 0)
+            ORDER BY score
+            LIMIT :limit
+        """), params).mappings().all()
+    else:
+        rows = connection.execute(text(f"""
+            SELECT d.video_id, v.title, d.kind, d.language, d.start_time, d.end_time, d.text,
+                   NULL AS snippet, NULL AS score
+            FROM search_documents d
+            LEFT JOIN videos v ON v.video_id = d.video_id
+            WHERE {where}
+            ORDER BY d.video_id, d.start_time
+            LIMIT :limit
+        """), params).mappings().all()
+
+    hits = []
+    for row in rows:
+        snippet = row['snippet'] if row['snippet'] is not None else _short_snippet(row['text'], short)
+        hits.append({
+            'video_id': row['video_id'],
+            'title': row['title'],
+            'kind': row['kind'],
+            'language': row['language'],
+            'start': row['start_time'],
+            'end': row['end_time'],
+            'snippet': _highlight(snippet),
+            'score': row['score']
+        })
+    _add_transcript_times(connection, hits, match, short)
+    return hits
+
+
+def _add_transcript_times(connection, hits, match, short):
+    """Give hits outside transcripts the time of the best matching transcript window of their video"""
+    untimed = sorted({hit['video_id'] for hit in hits if hit['start'] is None})
+    if not untimed:
+        return
+    params = {f'video_{i}': video_id for i, video_id in enumerate(untimed)}
+    # the transcript windows of the videos, looked up by video_id rather than by scanning the matches
+    windows = "SELECT id FROM search_documents WHERE kind = 'transcript' AND video_id IN (" + \
+        ', '.join(f':{key}' for key in params) + ")"
+    conditions = []
+    for i, term in enumerate(short):
+        conditions.append(f"d.text LIKE :short_{i} ESCAPE '\\'")
+        params[f'short_{i}'] = _like_pattern(term)
+    if match is not None:
+        conditions += ["search_index MATCH :match", f"search_index.rowid IN ({windows})"]
+        params['match'] = match
+        source, order = "search_index JOIN search_documents d ON d.id = search_index.rowid", "bm25(search_index)"
+    else:
+        conditions.append(f"d.id IN ({windows})")
+        source, order = "search_documents d", "d.start_time"
+    rows = connection.execute(text(f"""
+        SELECT d.video_id, d.start_time, d.end_time FROM {source}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order}
+    """), params).all()
+    times = {}
+    for video_id, start, end in rows:
+        times.setdefault(video_id, (start, end))  # the first row of a video is its best
+    for hit in hits:
+        if hit['start'] is None and hit['video_id'] in times:
+            hit['start'], hit['end'] = times[hit['video_id']]
@@ -0,0 +1,336 @@
+"""Semantic search over transcript windows with a local embedding model.
+
+The documents are the transcript windows of the full-text index (`search_documents`,
+see yourtube/search.py), so every hit keeps the moment of the video it comes from. Their
+embeddings are computed on the CPU in batches by a sentence-transformers model, an
+optional dependency (`pip install 'video-curator[semantic]'`).
+
+Vectors are stored as one float16 matrix in `vectors.f16` that is memory-mapped for
+searching, so the library's vectors don't need to fit in memory twice. The row of each
+document is allocated in the `embeddings` table, whose AUTOINCREMENT key never hands
+out a row twice: several processes can index at the same time, each writing its own
+rows, and rows of documents that were deleted simply stop matching anything. Searches
+score every row with NumPy, or, once `build_clusters` ran, only the rows of the
+clusters whose centroids are closest to the query.
+"""
+import argparse
+import json
+import os
+import threading
+import numpy as np
+from sqlalchemy import text, bindparam
+from yourtube.utils import get_download_dir, load_config
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# rows scored at a time by the brute-force search, bounds its temporary float32 copy
+BLOCK_ROWS = 65536
+
+
+class Embedder:
+    """Batched sentence embeddings from a sentence-transformers model, on the CPU by default"""
+    def __init__(self, model_name=DEFAULT_MODEL, batch_size=32, device="cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError(
+                        "Semantic search needs sentence-transformers: pip install 'video-curator[semantic]'"
+                    ) from e
+                self._model = SentenceTransformer(self.model_name, device=self.device)
+            return self._model
+
+    def encode(self, texts):
+        """
+        Embed texts.
+
+        Returns:
+            np.ndarray: float32 matrix with a unit-length row per text
+        """
+        return self.model.encode(
+            list(texts), batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+
+class SemanticIndex:
+    """Memory-mapped float16 embeddings of transcript windows, with an optional coarse clustering"""
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(get_download_dir(), "embeddings")
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f16")
+        # cluster of every row plus one, 0 for rows written before the clustering
+        self.clusters_path = os.path.join(self.directory, "clusters.i32")
+        self.centroids_path = os.path.join(self.directory, "centroids.npy")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self._lock = threading.Lock()
+
+    @property
+    def meta(self):
+        """Model and dimension of the stored vectors, None before the first one is written"""
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @property
+    def dim(self):
+        return self.meta['dim'] if self.meta else None
+
+    def row_count(self):
+        """Number of rows in the vector file, including rows of deleted documents"""
+        if not self.dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 2)
+
+    def vectors(self):
+        """The vector file as a read-only (rows, dim) float16 memmap, None if it is empty"""
+        rows = self.row_count()
+        if not rows:
+            return None
+        return np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(rows, self.dim))
+
+    def centroids(self):
+        try:
+            return np.load(self.centroids_path)
+        except FileNotFoundError:
+            return None
+
+    def reset(self, connection):
+        """Forget every vector, e.g. after switching to another embedding model"""
+        connection.execute(text("DELETE FROM embeddings"))
+        for path in (self.vectors_path, self.clusters_path, self.centroids_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _write_rows(self, path, rows, values):
+        """Write the rows of a matrix into a file at the offsets of their (1-based) row numbers"""
+        row_bytes = values.shape[1] * values.itemsize
+        mode = 'r+b' if os.path.exists(path) else 'w+b'
+        with open(path, mode) as f:
+            for row, value in zip(rows, values):
+                f.seek((row - 1) * row_bytes)
+                f.write(value.tobytes())
+
+    def index_pending(self, engine, embedder, video_id=None, batch_size=256, logger=None):
+        """
+        Embed the transcript windows that have no vector yet, in batches.
+
+        Args:
+            engine (Engine): Engine of the video database
+            embedder (Embedder): Model to embed with; vectors of another model are discarded first
+            video_id (str, optional): Only embed the windows of this video
+            batch_size (int, optional): Windows embedded and written per transaction. Defaults to 256.
+            logger (logging.Logger, optional): Logger to report to, printed if not given
+
+        Returns:
+            int: Number of windows embedded
+        """
+        meta = self.meta
+        if meta is not None and meta['model'] != embedder.model_name:
+            message = f"Embedding model changed from {meta['model']} to {embedder.model_name}, re-embedding everything"
+            logger.info(message) if logger else print(message)
+            with engine.begin() as connection:
+                self.reset(connection)
+        pending = """
+            SELECT d.id, d.text FROM search_documents d
+            LEFT JOIN embeddings e ON e.document_id = d.id
+            WHERE d.kind = 'transcript' AND e.document_id IS NULL
+        """ + (" AND d.video_id = :video_id" if video_id else "") + " ORDER BY d.id LIMIT :limit"
+        embedded = 0
+        while True:
+            with engine.connect() as connection:
+                documents = connection.execute(text(pending), {'video_id': video_id, 'limit': batch_size}).all()
+            if not documents:
+                return embedded
+            vectors = embedder.encode([document_text for _, document_text in documents])
+            if self.meta is None:
+                with open(self.meta_path, 'w') as f:
+                    json.dump({'model': embedder.model_name, 'dim': int(vectors.shape[1])}, f)
+            document_ids = [document_id for document_id, _ in documents]
+            with engine.begin() as connection:
+                # the write lock of the transaction makes the allocated rows ours until the vectors are in place
+                connection.execute(
+                    text("INSERT OR IGNORE INTO embeddings (document_id) VALUES (:document_id)"),
+                    [{'document_id': document_id} for document_id in document_ids]
+                )
+                rows = dict(connection.execute(
+                    text("SELECT document_id, row FROM embeddings WHERE document_id IN :ids")
+                    .bindparams(bindparam('ids', expanding=True)),
+                    {'ids': document_ids}
+                ).all())
+                order = [rows[document_id] for document_id in document_ids]
+                with self._lock:
+                    self._write_rows(self.vectors_path, order, vectors.astype(np.float16))
+                    centroids = self.centroids()
+                    if centroids is not None:
+                        clusters = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32) + 1
+                        self._write_rows(self.clusters_path, order, clusters[:, None])
+            embedded += len(documents)
+
+    def build_clusters(self, n_clusters=None, iterations=10, sample_size=100_000, seed=0):
+        """
+        Cluster the vectors with spherical k-means, so searches only score the rows of the
+        clusters closest to the query. Rows embedded later are assigned as they are written.
+
+        Args:
+            n_clusters (int, optional): Number of clusters, about the square root of the rows by default
+            iterations (int, optional): k-means iterations. Defaults to 10.
+            sample_size (int, optional): Rows the centroids are fitted on. Defaults to 100000.
+            seed (int, optional): Seed of the sample and of the initial centroids
+
+        Returns:
+            int: Number of clusters, 0 if there is nothing to cluster
+        """
+        vectors = self.vectors()
+        if vectors is None:
+            return 0
+        rng = np.random.default_rng(seed)
+        rows = len(vectors)
+        n_clusters = min(n_clusters or max(int(np.sqrt(rows)), 1), rows)
+        sample = np.asarray(vectors[np.sort(rng.choice(rows, min(sample_size, rows), replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), n_clusters, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_clusters):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1)
+        clusters = np.concatenate([
+            np.argmax(np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32) @ centroids.T, axis=1)
+            for start in range(0, rows, BLOCK_ROWS)
+        ]).astype(np.int32) + 1
+        with self._lock:
+            clusters.tofile(self.clusters_path)
+            np.save(self.centroids_path, centroids.astype(np.float32))
+        return n_clusters
+
+    def nearest(self, vector, k=10, nprobe=None):
+        """
+        Rows closest to a query vector by cosine similarity.
+
+        Args:
+            vector (np.ndarray): Unit-length query embedding
+            k (int, optional): Number of rows. Defaults to 10.
+            nprobe (int, optional): With clusters built, only score the rows of this many
+                                    clusters closest to the query; every row if not given
+
+        Returns:
+            tuple: (1-based rows, their scores), best first
+        """
+        vectors = self.vectors()
+        if vectors is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        vector = np.asarray(vector, dtype=np.float32)
+        centroids = self.centroids()
+        if nprobe and centroids is not None and os.path.exists(self.clusters_path):
+            probed = np.argsort(centroids @ vector)[::-1][:nprobe] + 1
+            clusters = np.fromfile(self.clusters_path, dtype=np.int32)
+            clusters = np.pad(clusters, (0, max(len(vectors) - len(clusters), 0)))[:len(vectors)]
+            # rows written before the clustering have no cluster and are always scored
+            candidates = np.flatnonzero(np.isin(clusters, probed) | (clusters == 0))
+            scores = np.asarray(vectors[candidates], dtype=np.float32) @ vector
+        else:
+            candidates = None
+            scores = np.concatenate([
+                np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32) @ vector
+                for start in range(0, len(vectors), BLOCK_ROWS)
+            ])
+        k = min(k, len(scores))
+        if k == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+        return rows + 1, scores[top]
+
+    @staticmethod
+    def lookup(connection, rows, scores, limit=10):
+        """
+        The transcript windows of rows found by `nearest`, skipping rows of deleted documents.
+
+        Returns:
+            list[dict]: video_id, title, language, start and end in seconds, text and score, best first
+        """
+        if len(rows) == 0:
+            return []
+        documents = {
+            row['row']: row for row in connection.execute(
+                text("""
+                    SELECT e.row, d.video_id, v.title, d.language, d.start_time, d.end_time, d.text
+                    FROM embeddings e
+                    JOIN search_documents d ON d.id = e.document_id
+                    LEFT JOIN videos v ON v.video_id = d.video_id
+                    WHERE e.row IN :rows
+                """).bindparams(bindparam('rows', expanding=True)),
+                {'rows': [int(row) for row in rows]}
+            ).mappings()
+        }
+        hits = []
+        for row, score in zip(rows, scores):
+            document = documents.get(int(row))
+            if document is None:
+                continue
+            hits.append({
+                'video_id': document['video_id'],
+                'title': document['title'],
+                'language': document['language'],
+                'start': document['start_time'],
+                'end': document['end_time'],
+                'text': document['text'],
+                'score': float(score)
+            })
+        return hits[:limit]
+
+    def search(self, connection, vector, limit=10, nprobe=None):
+        """The transcript windows closest to a query vector, see `nearest` and `lookup`"""
+        # a few more rows than needed, some may belong to deleted documents
+        rows, scores = self.nearest(vector, k=limit * 2, nprobe=nprobe)
+        return self.lookup(connection, rows, scores, limit)
+
+
+def load_semantic_search(config):
+    """
+    The semantic index and embedder configured in `semantic_search` of the config.
+
+    Returns:
+        tuple: (SemanticIndex, Embedder), (None, None) if semantic search is disabled
+    """
+    settings = (config or {}).get("semantic_search", {})
+    if not settings.get("enabled", False):
+        return None, None
+    index = SemanticIndex(settings.get("directory"))
+    embedder = Embedder(settings.get("model", DEFAULT_MODEL), batch_size=settings.get("batch_size", 32))
+    return index, embedder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed the transcripts that aren't in the semantic index yet.")
+    parser.add_argument("--db", type=str, default=None, help="Path of the video database.")
+    parser.add_argument("--clusters", type=int, default=None, help="Cluster the vectors into this many clusters afterwards, 0 for about sqrt(rows).")
+    args = parser.parse_args()
+
+    from yourtube import Database
+    from yourtube.utils import get_db_path
+
+    config = load_config()
+    settings = config.get("semantic_search", {})
+    db = Database(db_path=args.db or get_db_path())
+    index = SemanticIndex(settings.get("directory"))
+    embedder = Embedder(settings.get("model", DEFAULT_MODEL), batch_size=settings.get("batch_size", 32))
+    print(f"Embedded {index.index_pending(db.engine, embedder)} transcript windows")
+    if args.clusters is not None:
+        print(f"Built {index.build_clusters(args.clusters or None)} clusters over {index.row_count()} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Per-channel statistics of the library, kept up to date by triggers.
+
+`channel_stats` holds one row per channel with the aggregates the dashboards and reports
+show: how many videos it has, how many are transcribed and summarized, its newest upload,
+its last processed video, the total duration of its audio and its pending jobs. Triggers
+on `videos` and `jobs` apply the difference every written row makes to the row of its
+channel, inside the transaction that writes it, so an upsert of many videos keeps the
+statistics exact without ever scanning the library and reading them is one row per
+channel. Videos without a channel id are counted under the channel id ''. Pending jobs
+of videos not in the library yet, e.g. fresh submissions, are counted under the channel
+id stored in their job state, in a row with no videos until the first one is stored.
+"""
+from sqlalchemy import text
+
+# job statuses counted as pending work
+PENDING_STATUSES = ('queued', 'processing')
+
+_PENDING = "(" + ", ".join(f"'{status}'" for status in PENDING_STATUSES) + ")"
+# the key of the channel of a video row, 'new' or 'old'
+_CHANNEL = "coalesce({row}.channel_id, '')"
+# pending jobs of the video of a row
+_VIDEO_PENDING = f"(SELECT count(*) FROM jobs WHERE jobs.video_id = {{row}}.video_id AND jobs.status IN {_PENDING})"
+# the channel id stored with a job, e.g. by /process-video before its video is in the library
+_STATE_CHANNEL = "json_extract({row}.state, '$.channel_id')"
+# the channel key of a job row: the channel of its video, else the one of its state, NULL if neither is known
+_JOB_CHANNEL = (
+    "coalesce((SELECT coalesce(channel_id, '') FROM videos WHERE videos.video_id = {row}.video_id), "
+    + _STATE_CHANNEL + ")"
+)
+# the pending jobs of the video of a video row
+_PENDING_JOBS = f"jobs.video_id = {{row}}.video_id AND jobs.status IN {_PENDING}"
+# a row left without videos and pending jobs
+_EMPTY = "video_count <= 0 AND pending_jobs <= 0"
+# the videos of the channel of a video row, written so both terms can use the channel_id index
+_SAME_CHANNEL = (
+    f"(videos.channel_id = {_CHANNEL} OR (videos.channel_id IS NULL AND {_CHANNEL} = ''))"
+)
+
+# add what a video row counts for to its channel
+_ADD_VIDEO = f"""
+    INSERT INTO channel_stats (channel_id, channel, video_count, transcribed_count, summarized_count,
+                               last_upload, last_processed, total_duration, pending_jobs)
+    VALUES ({_CHANNEL}, {{row}}.channel, 1, coalesce({{row}}.transcript, 0), coalesce({{row}}.summary, 0),
+            {{row}}.upload_date, {{row}}.process_date, coalesce({{row}}.duration, 0), {_VIDEO_PENDING})
+    ON CONFLICT (channel_id) DO UPDATE SET
+        channel = coalesce(excluded.channel, channel_stats.channel),
+        video_count = video_count + 1,
+        transcribed_count = transcribed_count + excluded.transcribed_count,
+        summarized_count = summarized_count + excluded.summarized_count,
+        last_upload = CASE WHEN last_upload IS NULL OR excluded.last_upload > last_upload
+                           THEN excluded.last_upload ELSE last_upload END,
+        last_processed = CASE WHEN last_processed IS NULL OR excluded.last_processed > last_processed
+                              THEN excluded.last_processed ELSE last_processed END,
+        total_duration = total_duration + excluded.total_duration,
+        pending_jobs = pending_jobs + excluded.pending_jobs;
+"""
+
+# take what a video row counted for off its channel; a date that was the channel's latest is
+# looked up again among the videos left, everything else is a difference
+_REMOVE_VIDEO = f"""
+    UPDATE channel_stats SET
+        channel = CASE WHEN video_count <= 1 THEN NULL ELSE channel END,
+        video_count = video_count - 1,
+        transcribed_count = transcribed_count - coalesce({{row}}.transcript, 0),
+        summarized_count = summarized_count - coalesce({{row}}.summary, 0),
+        last_upload = CASE WHEN {{row}}.upload_date >= last_upload
+                           THEN (SELECT max(upload_date) FROM videos WHERE {_SAME_CHANNEL}) ELSE last_upload END,
+        last_processed = CASE WHEN {{row}}.process_date >= last_processed
+                              THEN (SELECT max(process_date) FROM videos WHERE {_SAME_CHANNEL}) ELSE last_processed END,
+        total_duration = total_duration - coalesce({{row}}.duration, 0),
+        pending_jobs = pending_jobs - {_VIDEO_PENDING}
+    WHERE channel_id = {_CHANNEL};
+    DELETE FROM channel_stats WHERE channel_id = {_CHANNEL} AND {_EMPTY};
+"""
+
+# add one pending job row to its channel, creating the row of a channel without videos
+_ADD_JOB = f"""
+    INSERT INTO channel_stats (channel_id, channel, video_count, transcribed_count, summarized_count,
+                               total_duration, pending_jobs)
+    SELECT {_JOB_CHANNEL}, NULL, 0, 0, 0, 0, 1 WHERE {{row}}.status IN {_PENDING} AND {_JOB_CHANNEL} IS NOT NULL
+    ON CONFLICT (channel_id) DO UPDATE SET pending_jobs = pending_jobs + 1;
+"""
+
+# take one pending job row off its channel
+_REMOVE_JOB = f"""
+    UPDATE channel_stats SET pending_jobs = pending_jobs - 1
+    WHERE channel_id = {_JOB_CHANNEL} AND {{row}}.status IN {_PENDING};
+    DELETE FROM channel_stats WHERE channel_id = {_JOB_CHANNEL} AND {_EMPTY};
+"""
+
+# a video row that enters the library takes over its pending jobs from the channels of their state
+_RELEASE_STATE_JOBS = f"""
+    UPDATE channel_stats SET pending_jobs = pending_jobs - (
+        SELECT count(*) FROM jobs WHERE {_PENDING_JOBS} AND {_STATE_CHANNEL.format(row='jobs')} = channel_stats.channel_id
+    )
+    WHERE channel_id IN (SELECT {_STATE_CHANNEL.format(row='jobs')} FROM jobs WHERE {_PENDING_JOBS});
+    DELETE FROM channel_stats WHERE {_EMPTY}
+        AND channel_id IN (SELECT {_STATE_CHANNEL.format(row='jobs')} FROM jobs WHERE {_PENDING_JOBS});
+"""
+
+# the pending jobs of a video row that left the library go back to the channels of their state
+_ADOPT_STATE_JOBS = f"""
+    INSERT INTO channel_stats (channel_id, channel, video_count, transcribed_count, summarized_count,
+                               total_duration, pending_jobs)
+    SELECT {_STATE_CHANNEL.format(row='jobs')}, NULL, 0, 0, 0, 0, count(*) FROM jobs
+    WHERE {_PENDING_JOBS} AND {_STATE_CHANNEL.format(row='jobs')} IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (channel_id) DO UPDATE SET pending_jobs = pending_jobs + excluded.pending_jobs;
+"""
+
+CHANNEL_STATS_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS videos_channel_stats_ai AFTER INSERT ON videos BEGIN
+        {_RELEASE_STATE_JOBS.format(row='new')}
+        {_ADD_VIDEO.format(row='new')}
+    END""",
+    # the new row is added first, so a date that only moves forward never needs a lookup
+    f"""CREATE TRIGGER IF NOT EXISTS videos_channel_stats_au
+        AFTER UPDATE OF channel_id, channel, transcript, summary, upload_date, process_date, duration ON videos BEGIN
+        {_ADD_VIDEO.format(row='new')}
+        {_REMOVE_VIDEO.format(row='old')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS videos_channel_stats_ad AFTER DELETE ON videos BEGIN
+        {_REMOVE_VIDEO.format(row='old')}
+        {_ADOPT_STATE_JOBS.format(row='old')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS jobs_channel_stats_ai AFTER INSERT ON jobs
+        WHEN new.status IN {_PENDING} BEGIN
+        {_ADD_JOB.format(row='new')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS jobs_channel_stats_au AFTER UPDATE OF status, video_id, state ON jobs
+        WHEN (old.status IN {_PENDING} OR new.status IN {_PENDING}) AND (
+            old.video_id IS NOT new.video_id OR (old.status IN {_PENDING}) != (new.status IN {_PENDING})
+            OR {_STATE_CHANNEL.format(row='old')} IS NOT {_STATE_CHANNEL.format(row='new')}
+        ) BEGIN
+        {_REMOVE_JOB.format(row='old')}
+        {_ADD_JOB.format(row='new')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS jobs_channel_stats_ad AFTER DELETE ON jobs
+        WHEN old.status IN {_PENDING} BEGIN
+        {_REMOVE_JOB.format(row='old')}
+    END""",
+]
+
+
+def create_channel_stats(connection):
+    """Create the triggers keeping `channel_stats` up to date with `videos` and `jobs`"""
+    for statement in CHANNEL_STATS_DDL:
+        connection.execute(text(statement))
+
+
+def recreate_channel_stats(connection):
+    """Replace the triggers of an existing library by the current ones and recompute every row"""
+    triggers = connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%channel_stats%'"
+    )).scalars().all()
+    for name in triggers:
+        connection.execute(text(f'DROP TRIGGER "{name}"'))
+    create_channel_stats(connection)
+    rebuild_channel_stats(connection)
+
+
+def rebuild_channel_stats(connection):
+    """Recompute every row of `channel_stats` from the videos and jobs, e.g. to fill it for an existing library"""
+    connection.execute(text("DELETE FROM channel_stats"))
+    connection.execute(text(f"""
+        INSERT INTO channel_stats (channel_id, channel, video_count, transcribed_count, summarized_count,
+                                   last_upload, last_processed, total_duration, pending_jobs)
+        SELECT coalesce(channel_id, ''), max(channel), count(*), sum(coalesce(transcript, 0)), sum(coalesce(summary, 0)),
+               max(upload_date), max(process_date), sum(coalesce(duration, 0)), sum({_VIDEO_PENDING.format(row='videos')})
+        FROM videos GROUP BY coalesce(channel_id, '')
+    """))
+    connection.execute(text(f"""
+        INSERT INTO channel_stats (channel_id, channel, video_count, transcribed_count, summarized_count,
+                                   total_duration, pending_jobs)
+        SELECT {_STATE_CHANNEL.format(row='jobs')}, NULL, 0, 0, 0, 0, count(*) FROM jobs
+        WHERE jobs.status IN {_PENDING} AND {_STATE_CHANNEL.format(row='jobs')} IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM videos WHERE videos.video_id = jobs.video_id)
+        GROUP BY 1
+        ON CONFLICT (channel_id) DO UPDATE SET pending_jobs = pending_jobs + excluded.pending_jobs
+    """))
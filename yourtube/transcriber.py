@@ -1,10 +1,17 @@
 # transcriber.py
 import os
+import importlib
+import threading
+import time
+import types
+from contextlib import contextmanager
+import tqdm
+import numpy as np
 import whisper
 import litellm
 import ffmpeg
 from yourtube import Video
-from yourtube.utils import get_device, get_download_dir, get_llm_info
+from yourtube.utils import get_device, get_download_dir, get_llm_info, get_llm_timeout, run_ffmpeg
 from yourtube.prompts import prompt_summarize, prompt_process_fulltext
 
 # Configure litellm logging - fix the verbose setting
@@ -12,6 +19,56 @@ from yourtube.prompts import prompt_summarize, prompt_process_fulltext
 # litellm.verbose = False  # Set the verbose attribute directly
 # logging.getLogger("litellm").setLevel(logging.ERROR)  # Only show ERROR level logs
 
+_progress = threading.local()  # progress callback of the transcription running in this thread
+_progress_lock = threading.Lock()
+_progress_users = 0  # transcriptions running with the progress bar installed
+_whisper_tqdm = None  # what `whisper.transcribe` used as tqdm before it was installed
+
+
+class _WhisperProgressBar(tqdm.tqdm):
+    """The progress bar Whisper updates with every decoded window, forwarding the decoded
+    frames to the progress callback of the current thread even while the bar is hidden."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._frames = 0
+
+    def update(self, n=1):
+        self._frames += n
+        callback = getattr(_progress, "callback", None)
+        if callback:
+            callback(done=min(self._frames, self.total), total=self.total, unit="frames")
+        return super().update(n)
+
+
+@contextmanager
+def _whisper_progress(callback):
+    """
+    Report the frames Whisper decodes in this thread to `callback` while the block runs.
+
+    The progress bar is only installed in `whisper.transcribe` while at least one
+    transcription runs, and the original tqdm is put back when the last one ends, so
+    other users of Whisper see it unchanged the rest of the time.
+    """
+    global _progress_users, _whisper_tqdm
+    # `whisper.transcribe` the module, shadowed on the package by the function of the same name
+    module = importlib.import_module("whisper.transcribe")
+    with _progress_lock:
+        if _progress_users == 0:
+            _whisper_tqdm = module.tqdm
+            module.tqdm = types.SimpleNamespace(tqdm=_WhisperProgressBar)
+        _progress_users += 1
+    previous, _progress.callback = getattr(_progress, "callback", None), callback
+    try:
+        yield
+    finally:
+        _progress.callback = previous
+        with _progress_lock:
+            _progress_users -= 1
+            if _progress_users == 0:
+                module.tqdm = _whisper_tqdm
+
+
 def format_timestamp(seconds):
     """
     Convert seconds to SRT timestamp format (HH:MM:SS,mmm).
@@ -66,12 +123,12 @@ def preprocess_audio(audio_path):
     try:
         # Convert to 16kHz mono WAV
         output_path = audio_path.replace('.mp4', '.wav')
-        ffmpeg.input(audio_path).output(
+        run_ffmpeg(ffmpeg.input(audio_path).output(
             output_path, 
             ar='16000',    # Sample rate
             ac=1,          # Mono audio
             acodec='pcm_s16le'
-        ).run(overwrite_output=True, quiet=True)
+        ))
         print(f"Audio preprocessed to: {output_path}")
         return output_path
     except Exception as e:
@@ -85,10 +142,14 @@ class Transcriber:
         self.model_size = model_size
         self.device = None
         self.model = None
+        self.audio_seconds = None  # length of the audio transcribed last
+        self.warm_up_status = {'state': 'idle'}  # outcome of `warm_up`, reported by the API
+        self._model_lock = threading.RLock()  # a warm-up in the background and the pipeline share the model
         self._video_path = ""
         self._srt_path = ""
         self._txt_path = ""
         self._md_path = ""
+        self._processed_txt_path = ""
         self._video_id = None
         self._language = "zh" # default language is Chinese
         if video:
@@ -112,15 +173,60 @@ class Transcriber:
         Args:
             model_size (str, optional): Name of the Whisper model to load. Defaults to "base".
         """
-        # Try to use MPS/GPU first, fallback to CPU if there are issues
-        try:
-            self.device = get_device()
-            self.model = whisper.load_model(model_size).to(self.device)
-        except (NotImplementedError, RuntimeError):
-            print("GPU acceleration failed, falling back to CPU...")
-            self.device = "cpu"
-            self.model = whisper.load_model(model_size).to(self.device)
-    
+        with self._model_lock:
+            if self.model is not None and self.model_size == model_size:
+                return  # e.g. loaded by the warm-up
+            self.model_size = model_size
+            # Try to use MPS/GPU first, fallback to CPU if there are issues
+            try:
+                self.device = get_device()
+                self.model = whisper.load_model(model_size).to(self.device)
+            except (NotImplementedError, RuntimeError):
+                print("GPU acceleration failed, falling back to CPU...")
+                self.device = "cpu"
+                self.model = whisper.load_model(model_size).to(self.device)
+
+    def warm_up(self, model_size: str="base"):
+        """
+        Load the Whisper model and decode a few tokens of silence, so the first video doesn't
+        pay for reading the weights and for compiling and caching the kernels of the device.
+        Progress and timings are kept in `warm_up_status`.
+
+        Args:
+            model_size (str, optional): Name of the Whisper model to load. Defaults to "base".
+
+        Returns:
+            bool: True if the model is loaded and answered
+        """
+        with self._model_lock:
+            self.warm_up_status = {'state': 'loading', 'model_size': model_size}
+            try:
+                started = time.monotonic()
+                self.load_model(model_size)
+                load_seconds = time.monotonic() - started
+                self.warm_up_status = {'state': 'warming', 'model_size': model_size, 'load_seconds': round(load_seconds, 2)}
+
+                started = time.monotonic()
+                audio = whisper.pad_or_trim(np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32))
+                mel = whisper.log_mel_spectrogram(audio, self.model.dims.n_mels).to(self.model.device)
+                self.model.detect_language(mel)
+                whisper.decode(self.model, mel, whisper.DecodingOptions(
+                    language="en", sample_len=8, without_timestamps=True, fp16=self.device != "cpu"
+                ))
+                self.warm_up_status = {
+                    'state': 'ready',
+                    'model_size': model_size,
+                    'device': str(self.device),
+                    'load_seconds': round(load_seconds, 2),
+                    'inference_seconds': round(time.monotonic() - started, 2)
+                }
+                print(f"Whisper {model_size} warmed up on {self.device} in {load_seconds:.1f}s")
+                return True
+            except Exception as e:
+                self.warm_up_status = {'state': 'error', 'model_size': model_size, 'error': str(e)}
+                print(f"Error warming up the model: {e}")
+                return False
+
 
     def load_video(self, video: Video):
         """
@@ -139,13 +245,36 @@ class Transcriber:
         self._md_path = self._video_path.replace(".mp4", f".{self._language}.md")
 
 
-    def transcribe(self, video: Video):
+    def prepare_audio(self, video: Video):
+        """
+        Make sure a 16kHz mono WAV of the video exists. It does not touch the state of
+        the transcriber, so it can run while another video is being transcribed.
+
+        Args:
+            video (Video): Video object to prepare the audio of
+
+        Returns:
+            str: Path to the audio file to transcribe
+        """
+        video_path = os.path.join(self.working_dir, f"{video.video_id}.mp4")
+        # An audio-only download already produced the 16kHz mono WAV
+        processed_audio_path = video_path.replace('.mp4', '.wav')
+        if not os.path.exists(processed_audio_path):
+            # If audio processing fails, return an error
+            processed_audio_path = preprocess_audio(video_path)
+            if processed_audio_path is None:
+                print("Audio preprocessing failed, using video directly.")
+                processed_audio_path = video_path
+        return processed_audio_path
+
+    def transcribe(self, video: Video, progress_callback=None):
         """
         Transcribe video audio to text and save as SRT file.
         Includes language detection and optimized transcription settings.
 
         Args:
             video (Video): Video object to transcribe
+            progress_callback (callable, optional): Called as `progress_callback(done=, total=, unit="frames")` as the audio is decoded
 
         Returns:
             int: 0 on success, 1 on failure
@@ -155,17 +284,14 @@ class Transcriber:
         self.load_video(video)
         print("Detecting language...", end="\r", flush=True)
         
-        # If audio processing fails, return an error
-        processed_audio_path = preprocess_audio(self._video_path)
-        if processed_audio_path is None:
-            print("Audio preprocessing failed, using video directly.")
-            processed_audio_path = self._video_path
+        processed_audio_path = self.prepare_audio(video)
         
         # Use the model initialized in __init__
         model = self.model
 
         # First detect the language
         audio = whisper.load_audio(processed_audio_path)
+        self.audio_seconds = len(audio) / whisper.audio.SAMPLE_RATE
         audio = whisper.pad_or_trim(audio)
         mel = whisper.log_mel_spectrogram(audio).to(model.device)
         _, probs = model.detect_language(mel)
@@ -173,20 +299,21 @@ class Transcriber:
         print(f"Detected language: {language}")
         print("Transcribing...", end="\r", flush=True)
         try:
-            result = model.transcribe(
-                processed_audio_path,
-                task="transcribe",
-                language=language,
-                initial_prompt="以下是一段中文视频内容的转录。请使用简体中文准确转录，保持原有的语气和表达方式。" if language == "zh" else None,
-                fp16=self.device != "cpu", # Use half-precision floating point for faster processing
-                beam_size=1, # Increase beam search width (default is 1)
-                best_of=1, # Generate multiple samples and select best (default is 1)
-                temperature=0.0, # Lower temperature for more deterministic output
-                condition_on_previous_text=True, # Use previous text as condition
-                compression_ratio_threshold=2, # Prevent empty segments
-                no_speech_threshold=0.6, # Prevent empty segments
-                word_timestamps=False # Generate word-level timestamps
-            )
+            with _whisper_progress(progress_callback):
+                result = model.transcribe(
+                    processed_audio_path,
+                    task="transcribe",
+                    language=language,
+                    initial_prompt="以下是一段中文视频内容的转录。请使用简体中文准确转录，保持原有的语气和表达方式。" if language == "zh" else None,
+                    fp16=self.device != "cpu", # Use half-precision floating point for faster processing
+                    beam_size=1, # Increase beam search width (default is 1)
+                    best_of=1, # Generate multiple samples and select best (default is 1)
+                    temperature=0.0, # Lower temperature for more deterministic output
+                    condition_on_previous_text=True, # Use previous text as condition
+                    compression_ratio_threshold=2, # Prevent empty segments
+                    no_speech_threshold=0.6, # Prevent empty segments
+                    word_timestamps=False # Generate word-level timestamps
+                )
             srt_content = create_srt(result['segments'])
             with open(self._srt_path, "w", encoding="utf-8") as srt_file:
                 srt_file.write(srt_content)
@@ -211,8 +338,9 @@ class Transcriber:
         Release the loaded Whisper model from memory.
         """
         try:
-            del self.model
-            self.model = None
+            with self._model_lock:
+                del self.model
+                self.model = None
             print("Model memory released")
         except Exception as e:
             print(f"Error releasing model: {e}")
@@ -261,7 +389,7 @@ class Transcriber:
         print(f"Converted srt to txt: {self._txt_path}")
         return processed_text
     
-    def process_fulltext(self, video: Video, chunk_size: int=2000, overlap: int=200):
+    def process_fulltext(self, video: Video, chunk_size: int=2000, overlap: int=200, progress_callback=None):
         """
         Process the fulltext of the video. The purpose is to reorganize the text into a more readable format. It does the following:
         1. Read the fulltext from the txt file and divide it into chunks of 1000 tokens/words each with an overlap.
@@ -273,6 +401,7 @@ class Transcriber:
             video (Video): Video object containing file information
             chunk_size (int, optional): Size of each chunk in tokens/words. Defaults to 1000.
             overlap (int, optional): Number of tokens/words to overlap between chunks. Defaults to 200.
+            progress_callback (callable, optional): Called as `progress_callback(done=, total=, unit="chunks")` after each chunk.
             
         Returns:
             str: Processed content
@@ -312,7 +441,8 @@ class Transcriber:
                     model=f"{llm_provider}/{llm_name}",
                     api_key=api_key,
                     max_tokens=max_tokens,
-                    temperature=temperature
+                    temperature=temperature,
+                    timeout=get_llm_timeout("process_fulltext")
                 )
             except Exception as e:
                 print(f"LLM error processing chunk {i+1}: {e}")
@@ -344,6 +474,8 @@ class Transcriber:
             # Append the content (without the last paragraph) to the processed content
             processed_content += whitespace + content_to_append
             starting_text = last_paragraph
+            if progress_callback:
+                progress_callback(done=i + 1, total=len(chunks), unit="chunks")
 
         processed_content += whitespace + last_paragraph # Append the last paragraph to the processed content
         # Create a new file for the processed content
@@ -376,10 +508,10 @@ class Transcriber:
             - Uses LiteLLM to generate summary
             - Saves summary in markdown format (.md)
         """
+        self.load_video(video)
+
         # Use the processed text file if it exists, otherwise use the original text file
         txt_path = self._processed_txt_path if os.path.exists(self._processed_txt_path) else self._txt_path
-        
-        self.load_video(video)
         llm_provider, llm_name, api_key, max_tokens, temperature = get_llm_info("summarize")
 
         # Read SRT content from the file
@@ -397,7 +529,8 @@ class Transcriber:
                 model=f"{llm_provider}/{llm_name}",
                 api_key=api_key,
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                timeout=get_llm_timeout("summarize")
             )
             summary_text = response.choices[0].message.content
         except Exception as e:
@@ -1,11 +1,16 @@
+import copy
 import json
 import re
 import os
 import shutil
+import threading
+import time
+from collections import OrderedDict
 from webvtt import WebVTT
 import litellm
 import torch
 import yt_dlp
+import ffmpeg
 import logging
 
 def get_uvicorn_log_config(file_path="logs/uvicorn.log"):
@@ -87,6 +92,93 @@ def create_logger(logger_name, log_path = None, append = False, simple_fmt=False
     return logger
 
 
+_MISSING = object()
+
+class TTLCache:
+    """A small thread-safe mapping whose entries expire `ttl` seconds after being set.
+    The least recently set entry is evicted once `maxsize` entries are stored."""
+
+    def __init__(self, ttl=600, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def items(self):
+        """Unexpired (key, value) pairs, least recently set first"""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at >= now]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for expires_at, _ in self._data.values() if expires_at >= now)
+
+
+_processes = {}  # thread id -> subprocesses running on behalf of that thread
+_processes_lock = threading.Lock()
+
+
+def run_ffmpeg(stream):
+    """
+    Run an ffmpeg-python stream like `stream.run(overwrite_output=True, quiet=True)`, in a
+    subprocess registered under the calling thread so `kill_processes` can stop it.
+
+    Raises:
+        ffmpeg.Error: If ffmpeg fails or is killed
+    """
+    process = stream.run_async(overwrite_output=True, quiet=True)
+    thread_id = threading.get_ident()
+    with _processes_lock:
+        _processes.setdefault(thread_id, set()).add(process)
+    try:
+        out, err = process.communicate()
+    finally:
+        with _processes_lock:
+            _processes[thread_id].discard(process)
+            if not _processes[thread_id]:
+                del _processes[thread_id]
+    if process.returncode:
+        raise ffmpeg.Error('ffmpeg', out, err)
+    return out, err
+
+
+def kill_processes(thread_id):
+    """Kill the subprocesses started through `run_ffmpeg` by a thread. Returns how many were killed."""
+    with _processes_lock:
+        processes = list(_processes.get(thread_id, ()))
+    for process in processes:
+        process.kill()
+    return len(processes)
+
+
 def extract_youtube_id(url):
     """Extract video ID from a YouTube URL. It can be a short URL, long URL, or live URL.
     Examples:
@@ -129,6 +221,10 @@ def get_llm_info(agent):
             
     raise ValueError(f"Model {title} not found in config.json")
 
+def get_llm_timeout(agent, default=300):
+    """Get the timeout in seconds of one LLM request of an agent from config.json"""
+    return load_config().get(agent, {}).get("timeout", default)
+
 def get_device():
     """Get the device for running Whisper"""
     device = "cpu"
@@ -201,7 +297,8 @@ def rename_title(video_title, config):
             ],
             api_key=config.get("openai", {}).get("api_key"),
             max_tokens=4096,
-            temperature=0.7
+            temperature=0.7,
+            timeout=60
         )
         title = response.choices[0].message.content.strip('"').replace(" ", "_")
         print(title)
@@ -228,6 +325,11 @@ def get_db_path(path="videos.db"):
     return db_path
 
 
+# seconds a stalled network read of yt-dlp or ffmpeg may wait before the download fails,
+# work in this process can't be interrupted by the stage watchdog, see VideoProcessingQueue.check_deadlines
+SOCKET_TIMEOUT = 30
+
+
 def download_youtube_video(
         path=get_download_dir(),  # Default download path
         video_id=None, # Video ID
@@ -236,7 +338,8 @@ def download_youtube_video(
         json=True,
         subtitles=True,
         auto_subtitles=True,
-        langs=["en", "zh"]
+        langs=["en", "zh"],
+        info=None # already extracted info to reuse instead of extracting again
     ):
     
     ydl_opts = {
@@ -249,20 +352,105 @@ def download_youtube_video(
             'writeautomaticsub': auto_subtitles,  # Enable auto-generated subtitles if manual ones aren't available'
             'subtitlesformat': 'srt/vtt',
             'subtitleslangs': langs,
-            'skip_download': not video
+            'skip_download': not video,
+            'socket_timeout': SOCKET_TIMEOUT  # fail a stalled connection instead of waiting forever
         }
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         try:
-            info = ydl.extract_info(
-                url=f"https://www.youtube.com/watch?v={video_id}", 
-                download=True
-            )
+            if info is not None:
+                info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            else:
+                info = ydl.extract_info(
+                    url=f"https://www.youtube.com/watch?v={video_id}", 
+                    download=True
+                )
         except yt_dlp.utils.DownloadError as e:
             return None
     
     return info
 
+def _format_size(fmt, duration=None):
+    """Best known size in bytes of a yt-dlp format, estimated from its bitrate if needed"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and fmt.get('tbr') and duration:
+        size = fmt['tbr'] * 1000 / 8 * duration
+    return int(size or 0)
+
+
+def select_audio_format(info, min_abr=48):
+    """
+    Pick the smallest audio-only stream that is still good enough for speech recognition.
+
+    Args:
+        info (dict): yt-dlp info dict of the video
+        min_abr (int): Lowest acceptable audio bitrate in kbps, ignored if no stream reaches it
+
+    Returns:
+        dict: The selected format, or None if the video has no audio-only stream
+    """
+    duration = info.get('duration')
+    audio_formats = [
+        fmt for fmt in info.get('formats') or []
+        if fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none') and fmt.get('url')
+    ]
+    adequate = [fmt for fmt in audio_formats if (fmt.get('abr') or 0) >= min_abr] or audio_formats
+    if not adequate:
+        return None
+    return min(adequate, key=lambda fmt: (_format_size(fmt, duration) or float('inf'), fmt.get('abr') or 0))
+
+
+def download_audio_16k(info, output_path, min_abr=48):
+    """
+    Stream the smallest adequate audio-only format through ffmpeg straight into a
+    16kHz mono WAV file, so the transcription-ready audio exists when the download ends.
+
+    Args:
+        info (dict): yt-dlp info dict of the video
+        output_path (str): Path of the WAV file to write
+        min_abr (int): Lowest acceptable audio bitrate in kbps
+
+    Returns:
+        dict: Fetch statistics: format_id, bytes, bytes_saved, elapsed and latency_saved
+              (seconds, estimated from the measured throughput) compared with the default
+              'wv+ba' download followed by a separate transcoding pass.
+    """
+    audio_format = select_audio_format(info, min_abr=min_abr)
+    if audio_format is None:
+        raise ValueError(f"No audio-only stream for video {info.get('id')}")
+
+    headers = "".join(f"{key}: {value}\r\n" for key, value in (audio_format.get('http_headers') or {}).items())
+    input_args = {'headers': headers} if headers else {}
+    input_args['rw_timeout'] = SOCKET_TIMEOUT * 1_000_000  # microseconds, a stalled stream fails instead of hanging
+    start = time.monotonic()
+    run_ffmpeg(ffmpeg.input(audio_format['url'], **input_args).output(
+        output_path,
+        ar='16000',    # Sample rate
+        ac=1,          # Mono audio
+        acodec='pcm_s16le'
+    ))
+    elapsed = time.monotonic() - start
+
+    # what the default 'wv+ba' path would have fetched: worst video-only stream + best audio stream
+    duration = info.get('duration')
+    formats = info.get('formats') or []
+    video_only = [_format_size(fmt, duration) for fmt in formats if fmt.get('acodec') == 'none' and fmt.get('vcodec') not in (None, 'none')]
+    audio_only = [fmt for fmt in formats if fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none')]
+    best_audio = max(audio_only, key=lambda fmt: fmt.get('abr') or 0)
+    default_bytes = min((size for size in video_only if size), default=0) + _format_size(best_audio, duration)
+
+    fetched_bytes = _format_size(audio_format, duration)
+    bytes_saved = max(default_bytes - fetched_bytes, 0)
+    throughput = fetched_bytes / elapsed if elapsed > 0 else 0
+    return {
+        'format_id': audio_format.get('format_id'),
+        'bytes': fetched_bytes,
+        'bytes_saved': bytes_saved,
+        'elapsed': elapsed,
+        'latency_saved': bytes_saved / throughput if throughput else 0.0
+    }
+
+
 def clean_srt_file(input_file, output_file):
     """
     Clean an SRT file by keeping only subtitle entries with a single line of text.
@@ -0,0 +1,89 @@
+import argparse
+import signal
+import threading
+from yourtube import Database, Transcriber
+from yourtube.utils import load_config, get_db_path, create_logger
+from yourtube.monitor import YoutubeMonitor
+from yourtube.async_worker import VideoProcessingQueue
+from yourtube.jobs import JobStore
+from yourtube.policy import TranscriptionPolicy
+from yourtube.semantic import load_semantic_search
+
+
+def run_worker(job_store, stages, context=None, stop_event=None, poll_interval=2, logger=None, policy=None):
+    """
+    Process jobs from a job store shared with other workers until `stop_event` is set.
+
+    Jobs are claimed one at a time as the first stage has room, their leases are renewed
+    by heartbeats while they run, and jobs of workers that stopped heartbeating become
+    visible again once their lease expires.
+
+    Args:
+        job_store (JobStore): The shared job store
+        stages (list[Stage]): Pipeline stages to run every job through
+        context (dict, optional): Shared objects added to every task, e.g. the database and monitor
+        stop_event (threading.Event, optional): Set to stop the worker, runs forever if not given
+        poll_interval (float, optional): Seconds to wait before looking again when the queue is empty
+        logger (logging.Logger, optional): Logger to report to
+        policy (TranscriptionPolicy, optional): Chooses the Whisper size of each job from this worker's load,
+            its upgrades are queued in `job_store` and claimed like any other job
+    """
+    stop_event = stop_event or threading.Event()
+    queue = VideoProcessingQueue()
+    context = dict(context or {})
+    if policy is not None:
+        policy.queue, policy.job_store = queue, job_store
+        context['policy'] = policy
+    queue.start_worker(stages=stages, logger=logger, job_store=job_store, context=context, pull=True,
+                       poll_interval=poll_interval)
+    try:
+        stop_event.wait()
+    finally:
+        queue.stop_worker()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued videos from the shared job queue.")
+    parser.add_argument("--db", type=str, default=None, help="Path of the video database holding the job queue.")
+    parser.add_argument("--lease", type=float, default=None, help="Seconds a claimed job stays invisible to other workers without a heartbeat.")
+    parser.add_argument("--poll", type=float, default=None, help="Seconds to wait before looking again when the queue is empty.")
+    args = parser.parse_args()
+
+    from yourtube.main import build_pipeline_stages  # sets up the default database and config on import
+
+    config = load_config()
+    worker_config = (config or {}).get("worker", {})
+    logger = create_logger("Worker", log_path='logs/worker.log')
+
+    db = Database(db_path=args.db or get_db_path(), store_blobs=(config or {}).get("storage", {}).get("compress_artifacts", False))
+    job_store = JobStore(db, lease_seconds=args.lease or worker_config.get("lease_seconds", 60))
+    semantic_index, embedder = load_semantic_search(config)
+    context = {
+        'config': config,
+        'database': db,
+        'monitor': YoutubeMonitor(config=config, database=db),
+        'transcriber': Transcriber(config=config),
+        'semantic_index': semantic_index,
+        'embedder': embedder
+    }
+    logger.info(f"Worker {job_store.owner} pulling jobs from {db.db_path}")
+    if (config or {}).get("transcribe", {}).get("warm_up", False):
+        threading.Thread(target=context['transcriber'].warm_up, args=((config or {}).get("transcribe", {}).get("size", "base"),),
+                         name="warm-up", daemon=True).start()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    run_worker(
+        job_store,
+        build_pipeline_stages(config),
+        context=context,
+        stop_event=stop_event,
+        poll_interval=args.poll or worker_config.get("poll_interval", 2),
+        logger=logger,
+        policy=TranscriptionPolicy(config, logger=logger)
+    )
+
+
+if __name__ == '__main__':
+    main()